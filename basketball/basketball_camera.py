@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+
+# Maps where the ball is in the camera's picture to where it is on the
+# table, so the arm can move straight over it instead of stepping closer.
+#
+# The camera hangs from the arm, looking down, and turns with the arm's
+# base. So the ball's offset from the arm is found in a frame that turns
+# with the base: a homography maps the picture's (x, y) to that offset in
+# mm, which is then rotated by the base's angle (the direction of the
+# arm's XY position). The offset grows with the camera's height above the
+# ball, so offsets are stored as if seen from `reference_height`.
+#
+# Calibrating drops the ball at a known position, then watches it from a
+# pattern of arm positions around an observer pose. The homography is the
+# least squares fit of every sample, from every pose calibrated so far.
+# Poses with enough samples also get their own homography, which is used
+# while the arm is near that pose.
+
+CAMERA_MODEL_PATH = os.path.join(
+    os.path.expanduser('~'), '.uarm_projects', 'basketball_camera.json')
+
+CALIBRATION_PATTERN_SIZE = 3        # positions along each side
+CALIBRATION_PATTERN_MM = 30         # distance between positions
+CALIBRATION_SPEED = 50
+CALIBRATION_ACCELERATION = 1
+MIN_POSE_SAMPLES = 6                # for a pose to get its own homography
+MIN_SAMPLES = 4                     # for any homography at all
+
+
+def get_base_angle(pos):
+    # radians, the direction the base is turned to reach `pos`
+    return math.atan2(pos['y'], pos['x'])
+
+
+def rotate(xy, angle):
+    cos, sin = math.cos(angle), math.sin(angle)
+    return (xy[0] * cos - xy[1] * sin, xy[0] * sin + xy[1] * cos)
+
+
+def _normalize_points(points):
+    # similarity transform moving `points` to the origin with a mean
+    # distance of sqrt(2), which keeps the least squares well conditioned
+    center = points.mean(axis=0)
+    dist = np.sqrt(((points - center) ** 2).sum(axis=1)).mean()
+    scale = math.sqrt(2) / dist if dist else 1.0
+    return np.array([
+        [scale, 0, -scale * center[0]],
+        [0, scale, -scale * center[1]],
+        [0, 0, 1]])
+
+
+def fit_homography(src, dst):
+    # least squares (DLT) homography mapping each `src` (x, y) to `dst`
+    src = np.asarray(src, dtype=float)
+    dst = np.asarray(dst, dtype=float)
+    if len(src) < MIN_SAMPLES:
+        raise ValueError('Need at least 4 points, got {0}'.format(len(src)))
+    t_src = _normalize_points(src)
+    t_dst = _normalize_points(dst)
+    ones = np.ones((len(src), 1))
+    s = (t_src @ np.hstack([src, ones]).T).T
+    d = (t_dst @ np.hstack([dst, ones]).T).T
+    rows = np.zeros((len(src) * 2, 9))
+    rows[0::2, 0:3] = s
+    rows[0::2, 6:9] = -d[:, 0:1] * s
+    rows[1::2, 3:6] = s
+    rows[1::2, 6:9] = -d[:, 1:2] * s
+    h = np.linalg.svd(rows)[2][-1].reshape(3, 3)
+    h = np.linalg.inv(t_dst) @ h @ t_src
+    return h / h[2, 2]
+
+
+def apply_homography(h, points):
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    mapped = (h @ np.hstack([points, np.ones((len(points), 1))]).T).T
+    return mapped[:, :2] / mapped[:, 2:3]
+
+
+class CameraModel(object):
+
+    def __init__(self, plane_height, reference_height, samples=None):
+        # `plane_height` is the Z of the ball's center, where offsets are
+        # measured, and `reference_height` the camera Z offsets are scaled to
+        self.plane_height = plane_height
+        self.reference_height = reference_height
+        # each sample is {'camera': [x, y], 'arm': {x, y, z},
+        #                 'ball': {x, y}, 'pose': [x, y, z]}
+        self.samples = samples or []
+        self.homography = None
+        self.pose_homographies = {}
+        self.error = None
+        if self.samples:
+            self.fit()
+
+    def _height_scale(self, z):
+        return (z - self.plane_height) / (
+            self.reference_height - self.plane_height)
+
+    def _sample_offset(self, sample):
+        # ball's offset from the arm, in the base's frame, at the
+        # reference height
+        arm = sample['arm']
+        diff = (sample['ball']['x'] - arm['x'], sample['ball']['y'] - arm['y'])
+        offset = rotate(diff, -get_base_angle(arm))
+        scale = self._height_scale(arm['z'])
+        return (offset[0] / scale, offset[1] / scale)
+
+    def _fit_samples(self, samples):
+        return fit_homography(
+            [s['camera'] for s in samples],
+            [self._sample_offset(s) for s in samples])
+
+    def fit(self):
+        self.homography = self._fit_samples(self.samples)
+        by_pose = {}
+        for s in self.samples:
+            by_pose.setdefault(tuple(s['pose']), []).append(s)
+        self.pose_homographies = {
+            pose: self._fit_samples(samples)
+            for pose, samples in by_pose.items()
+            if len(samples) >= MIN_POSE_SAMPLES
+        }
+        errors = [
+            math.hypot(p['x'] - s['ball']['x'], p['y'] - s['ball']['y'])
+            for s in self.samples
+            for p in [self.to_arm(s['camera'], s['arm'])]
+        ]
+        self.error = math.sqrt(sum(e * e for e in errors) / len(errors))
+        return self.error
+
+    def add_samples(self, samples):
+        # if the samples can't be fit, the model is left as it was
+        previous = (self.samples, self.homography, self.pose_homographies,
+                    self.error)
+        self.samples = self.samples + list(samples)
+        try:
+            return self.fit()
+        except (ValueError, np.linalg.LinAlgError):
+            (self.samples, self.homography, self.pose_homographies,
+             self.error) = previous
+            raise
+
+    def _homography_near(self, arm_pos):
+        # a pose's own homography, while the arm is inside its pattern
+        radius = CALIBRATION_PATTERN_MM * CALIBRATION_PATTERN_SIZE / 2
+        best = None
+        for pose, h in self.pose_homographies.items():
+            dist = math.hypot(pose[0] - arm_pos['x'], pose[1] - arm_pos['y'])
+            if dist <= radius and abs(pose[2] - arm_pos['z']) < 1:
+                if best is None or dist < best[0]:
+                    best = (dist, h)
+        if best:
+            return best[1]
+        return self.homography
+
+    def to_arm(self, cam_pos, arm_pos):
+        # the table XY under the camera's (x, y), seen with the arm at
+        # `arm_pos`
+        if isinstance(cam_pos, dict):
+            cam_pos = (cam_pos['x'], cam_pos['y'])
+        h = self._homography_near(arm_pos)
+        offset = apply_homography(h, cam_pos)[0] * self._height_scale(
+            arm_pos['z'])
+        diff = rotate(offset, get_base_angle(arm_pos))
+        return {
+            'x': round(float(arm_pos['x'] + diff[0]), 2),
+            'y': round(float(arm_pos['y'] + diff[1]), 2)
+        }
+
+    def to_view(self, table_xy, z, cam_pos=(0.5, 0.5), iterations=4):
+        # the arm position, at height `z`, from which the camera sees
+        # `table_xy` at `cam_pos`; the base's angle depends on the answer,
+        # so it's found by repeating the guess a few times
+        arm = {'x': table_xy['x'], 'y': table_xy['y'], 'z': z}
+        for i in range(iterations):
+            seen = self.to_arm(cam_pos, arm)
+            arm['x'] += table_xy['x'] - seen['x']
+            arm['y'] += table_xy['y'] - seen['y']
+        return arm
+
+    def save(self, path=CAMERA_MODEL_PATH):
+        data = {
+            'plane_height': self.plane_height,
+            'reference_height': self.reference_height,
+            'error': self.error,
+            'samples': self.samples
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def load_camera_model(path=CAMERA_MODEL_PATH):
+    # returns None if nothing has been calibrated yet, or the saved model
+    # can't be used
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print('Ignoring camera model {0}, could not read it: {1}'.format(
+            path, e))
+        return None
+    try:
+        return CameraModel(
+            data['plane_height'], data['reference_height'], data['samples'])
+    except (KeyError, TypeError) as e:
+        print('Ignoring camera model {0}, missing {1}'.format(path, e))
+    except (ValueError, np.linalg.LinAlgError) as e:
+        print('Ignoring camera model {0}, could not fit it: {1}'.format(
+            path, e))
+    return None
+
+
+def get_calibration_pattern(pose, size=CALIBRATION_PATTERN_SIZE,
+                            step=CALIBRATION_PATTERN_MM):
+    half = (size - 1) / 2
+    return [
+        {'x': pose['x'] + (i - half) * step,
+         'y': pose['y'] + (j - half) * step,
+         'z': pose['z']}
+        for i in range(size) for j in range(size)
+    ]
+
+
+def collect_samples(bot, camera, pose, ball_height, read_ball,
+                    wait_for_ready=input):
+    # the ball must be held by the suction cup; it's dropped under the
+    # observer `pose`, then watched from each position in the pattern
+    wait_for_ready('Attach the ball to the suction cup, then ENTER')
+    bot.push_settings()
+    bot.move_to(**pose).wait_for_arrival()
+    bot.move_to(z=ball_height).wait_for_arrival()
+    bot.pump(False, sleep=1)
+    ball = {'x': pose['x'], 'y': pose['y']}
+    samples = []
+    bot.speed(CALIBRATION_SPEED).acceleration(CALIBRATION_ACCELERATION)
+    bot.move_to(**pose).wait_for_arrival()
+    for pos in get_calibration_pattern(pose):
+        if not bot.can_move_to(**pos):
+            continue
+        bot.move_to(**pos).wait_for_arrival()
+        cam_data = read_ball(camera, captured_after=time.monotonic())
+        if not cam_data:
+            continue
+        samples.append({
+            'camera': [cam_data['position']['x'], cam_data['position']['y']],
+            'arm': dict(bot.position),
+            'ball': ball,
+            'pose': [pose['x'], pose['y'], pose['z']]
+        })
+    bot.move_to(**pose).wait_for_arrival()
+    bot.pop_settings()
+    return samples
+
+
+def calibrate(bot, camera, pose, ball_height, read_ball, model=None,
+              wait_for_ready=input):
+    # adds a pattern of samples at `pose` to `model` (or a new one), refits
+    # and saves it, returning the model; if that fails, `model` is returned
+    # unchanged
+    samples = collect_samples(
+        bot, camera, pose, ball_height, read_ball, wait_for_ready)
+    if len(samples) < MIN_SAMPLES:
+        print('Camera saw the ball from {0} positions, need {1}; '
+              'keeping the previous model'.format(len(samples), MIN_SAMPLES))
+        return model
+    new_model = model or CameraModel(ball_height, pose['z'])
+    try:
+        new_model.add_samples(samples)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        print('Could not fit the camera model ({0}); '
+              'keeping the previous model'.format(e))
+        return model
+    model = new_model
+    model.save()
+    print('Camera model fit to {0} samples, {1:.2f}mm RMS error'.format(
+        len(model.samples), model.error))
+    return model
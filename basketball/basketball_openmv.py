@@ -1,4 +1,4 @@
-import sensor, math, json
+import sensor, json, struct, pyb, utime
 
 sensor.reset()
 sensor.set_pixformat(sensor.RGB565)
@@ -23,28 +23,100 @@ area_thresh = square_size_min * square_size_min # min size of bounding box
 pix_thresh = int(area_thresh * 0.25)            # min number of pixels
 
 movement_thresh = w * 0.015         # max number of pixels before it's considerate to have moved
-still_frames_count = 0              # keep count of number of "still" readings
 still_frames_thresh = 20            # this many "still" readings means it's really still
-prev_blob = []
+still_frame = 0                     # numbers each reading of the ball
 
 
-def get_max_movement(prev_blobs, new_blob):
-    max_movement = 0
-    for b in prev_blobs:
-        x_diff = b.cx() - new_blob.cx()
-        y_diff = b.cy() - new_blob.cy()
-        movement = math.sqrt(math.pow(x_diff, 2) + math.pow(y_diff, 2))
-        if movement > max_movement:
-            max_movement = movement
-    return max_movement
+class WindowExtreme(object):
+    # smallest (or largest) of the last `size` values, in amortized O(1)
+    # per value: a monotonic queue, dropping every value that a newer one
+    # beats, since it can't be the extreme again before leaving the window
+    def __init__(self, size, largest):
+        self.size = size
+        self.largest = largest
+        self.frames = [0] * size
+        self.values = [0] * size
+        self.head = 0
+        self.count = 0
 
+    def add(self, frame, value):
+        while self.count:
+            last = (self.head + self.count - 1) % self.size
+            if self.largest:
+                if self.values[last] > value:
+                    break
+            elif self.values[last] < value:
+                break
+            self.count -= 1
+        if self.count and self.frames[self.head] <= frame - self.size:
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+        tail = (self.head + self.count) % self.size
+        self.frames[tail] = frame
+        self.values[tail] = value
+        self.count += 1
 
-while(True):
-    img = sensor.snapshot()
-    img.lens_corr(1.8)
-    img.rotation_corr(z_rotation=90)
+    def get(self):
+        return self.values[self.head]
+
+
+# the ball's newest position and the `still_frames_thresh` before it
+still_window = still_frames_thresh + 1
+still_min_x = WindowExtreme(still_window, False)
+still_max_x = WindowExtreme(still_window, True)
+still_min_y = WindowExtreme(still_window, False)
+still_max_y = WindowExtreme(still_window, True)
+
+# once the ball is found, only search a window around where it should be
+# next, falling back to the whole image if it's not there
+track_window_scale = 2.5            # window size, relative to the ball's size
+track_history = 4                   # positions kept to predict the next one
+track_x = [0] * track_history       # ring buffer of the ball's last positions
+track_y = [0] * track_history
+track_idx = 0
+track_len = 0
+track_size = 0                      # ball's size when last seen, 0 if lost
+
+# the host can ask for compact binary frames instead of JSON lines
+# NOTE: must match the layout in `utils/openmv_protocol.py`
+usb = pyb.USB_VCP()
+binary_mode = False
+
+# the host can also ask to only be sent frames when something changes,
+# plus a heartbeat frame so it knows the camera is still running
+event_mode = False
+event_heartbeat_ms = 1000
+last_event_key = None
+last_event_ms = 0
+BINARY_SYNC = b'\xa5\x5a'
+BINARY_TYPE_BALL = 2
+BINARY_FLAG_EMPTY = 1 << 0
+BINARY_FLAG_MOVING = 1 << 1
+BINARY_POSITION_SCALE = 10000
+
+# every frame is stamped, so the host can tell how old a reading is
+frame_seq = 0
+
+
+def is_moving(blob):
+    # moving if the box around its last `still_frames_thresh` positions
+    # (and this one) is too big, compared squared so there's no sqrt
+    global still_frame
+    x, y = blob.cx(), blob.cy()
+    still_frame += 1
+    still_min_x.add(still_frame, x)
+    still_max_x.add(still_frame, x)
+    still_min_y.add(still_frame, y)
+    still_max_y.add(still_frame, y)
+    x_diff = still_max_x.get() - still_min_x.get()
+    y_diff = still_max_y.get() - still_min_y.get()
+    return (x_diff * x_diff) + (y_diff * y_diff) >= movement_thresh * movement_thresh
+
+
+def find_square_blob(img, roi=None):
     blobs = img.find_blobs(
         blob_color_thresh,
+        roi=roi or (0, 0, img.width(), img.height()),
         pixels_threshold=pix_thresh,
         area_threshold=area_thresh,
         merge=False)
@@ -55,10 +127,127 @@ while(True):
         is_right_size = b.w() > square_size_min and b.w() < square_size_max
         if is_square and is_right_size:
             square_blob = b
+    return square_blob
+
+
+def get_track_roi(img):
+    # window around where the ball should be, from its last positions
+    if not track_size:
+        return None
+    newest = (track_idx - 1) % track_history
+    oldest = (track_idx - track_len) % track_history
+    frames = track_len - 1
+    x_speed = 0
+    y_speed = 0
+    if frames:
+        x_speed = (track_x[newest] - track_x[oldest]) / frames
+        y_speed = (track_y[newest] - track_y[oldest]) / frames
+    half = int((track_size * track_window_scale / 2) + max(abs(x_speed), abs(y_speed)))
+    x = int(track_x[newest] + x_speed)
+    y = int(track_y[newest] + y_speed)
+    x_min = max(x - half, 0)
+    y_min = max(y - half, 0)
+    x_max = min(x + half, img.width())
+    y_max = min(y + half, img.height())
+    if x_max - x_min <= square_size_min or y_max - y_min <= square_size_min:
+        return None
+    return (x_min, y_min, x_max - x_min, y_max - y_min)
+
+
+def add_track_position(blob):
+    global track_idx, track_len, track_size
+    track_x[track_idx] = blob.cx()
+    track_y[track_idx] = blob.cy()
+    track_idx = (track_idx + 1) % track_history
+    track_len = min(track_len + 1, track_history)
+    track_size = max(blob.w(), blob.h())
+
+
+def lose_track():
+    global track_len, track_size
+    track_len = 0
+    track_size = 0
+
+
+def crc16(data):
+    crc = 0
+    for b in data:
+        crc ^= b << 8
+        for i in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+    return crc
+
+
+def check_protocol_request():
+    global binary_mode, event_mode, last_event_key
+    if not usb.any():
+        return
+    cmd = usb.read()
+    # requests can arrive together, and the last one of each kind wins
+    if cmd.rfind(b'BIN') > cmd.rfind(b'JSON'):
+        binary_mode = True
+    elif b'JSON' in cmd:
+        binary_mode = False
+    if cmd.rfind(b'EVENTS') > cmd.rfind(b'FRAMES'):
+        event_mode = True
+        last_event_key = None # always send the current state first
+    elif b'FRAMES' in cmd:
+        event_mode = False
+
+
+def should_send(event_key, capture_ms):
+    global last_event_key, last_event_ms
+    if not event_mode:
+        return True
+    changed = event_key != last_event_key
+    if not changed and utime.ticks_diff(capture_ms, last_event_ms) < event_heartbeat_ms:
+        return False
+    last_event_key = event_key
+    last_event_ms = capture_ms
+    return True
+
+
+def send_binary_data(data):
+    flags = 0
+    if data['empty']:
+        flags |= BINARY_FLAG_EMPTY
+    if data['moving']:
+        flags |= BINARY_FLAG_MOVING
+    payload = struct.pack(
+        '<BHHII', flags,
+        int(round(data['position']['x'] * BINARY_POSITION_SCALE)),
+        int(round(data['position']['y'] * BINARY_POSITION_SCALE)),
+        data['seq'], data['time'])
+    body = bytes([BINARY_TYPE_BALL, len(payload)]) + payload
+    usb.write(BINARY_SYNC + body + struct.pack('<H', crc16(body)))
+
+
+while(True):
+    check_protocol_request()
+    img = sensor.snapshot()
+    capture_ms = utime.ticks_ms()
+    frame_seq += 1
+    img.lens_corr(1.8)
+    img.rotation_corr(z_rotation=90)
+    square_blob = None
+    roi = get_track_roi(img)
+    if roi:
+        square_blob = find_square_blob(img, roi)
+    if not square_blob:
+        square_blob = find_square_blob(img)
+    if square_blob:
+        add_track_position(square_blob)
+    else:
+        lose_track()
     data = {
         'empty': True,
         'position': {'x': 0, 'y': 0},
-        'moving': False
+        'moving': False,
+        'seq': frame_seq,
+        'time': capture_ms
     }
     if square_blob:
         img.draw_rectangle(square_blob.rect())
@@ -66,14 +255,15 @@ while(True):
         # convert to relative position (0.0-1.0)
         data['position']['x'] = round(float(square_blob.cx() / img.width()), 2)
         data['position']['y'] = round(float(square_blob.cy() / img.height()), 2)
-        data['moving'] = True
-        movement = get_max_movement(prev_blob, square_blob)
-        if abs(movement) < movement_thresh:
-            data['moving'] = False
-        prev_blob.append(square_blob)
-        if len(prev_blob) > still_frames_thresh:
-            start_idx = len(prev_blob) - still_frames_thresh
-            prev_blob = prev_blob[start_idx:]
+        data['moving'] = is_moving(square_blob)
+    event_key = (
+        data['empty'], data['moving'],
+        data['position']['x'], data['position']['y'])
+    if not should_send(event_key, capture_ms):
+        continue
+    if binary_mode:
+        send_binary_data(data)
+        continue
     data_str = json.dumps(data)
     print(data_str)
 
@@ -0,0 +1,94 @@
+import math
+import time
+
+
+# Decides which observer pose to look from next, while searching for the
+# ball. Instead of going around the poses in order, each pose's chance of
+# seeing the ball is weighed against how long it takes to get there, and
+# the pose with the best chance per second is visited next.
+#
+# A pose's chance comes from a heat map of where the ball has been found
+# before, which fades with a half life of `half_life` seconds so it follows
+# the table as it changes. A pose just seen empty has little chance of
+# having the ball now, rising back over `refill_time` seconds (the ball
+# might roll there), so empty poses aren't looked at again right away.
+# Once the ball is thrown, it could be anywhere again.
+
+
+class PoseScheduler(object):
+
+    def __init__(self, poses, speed, half_life=120.0, refill_time=60.0,
+                 prior=0.5, visit_time=0.3):
+        # `speed` is the arm's speed between poses (mm/sec), `prior` the
+        # heat every pose has, even where the ball's never been found, and
+        # `visit_time` the seconds spent at a pose besides travelling there
+        # (speeding up, slowing down, reading the camera)
+        self.poses = poses
+        self.speed = speed
+        self.half_life = half_life
+        self.refill_time = refill_time
+        self.prior = prior
+        self.visit_time = visit_time
+        self.heat = [0.0 for p in poses]
+        self._heat_time = None
+        self.seen_empty = [None for p in poses]
+        self.visits = 0
+        self.finds = 0
+
+    def _decay(self, now):
+        if self._heat_time is not None:
+            fade = math.pow(0.5, (now - self._heat_time) / self.half_life)
+            self.heat = [h * fade for h in self.heat]
+        self._heat_time = now
+
+    def travel_time(self, idx, pos=None):
+        if not pos:
+            return self.visit_time
+        pose = self.poses[idx]
+        dist = math.sqrt(sum(
+            math.pow(pose[ax] - pos[ax], 2) for ax in 'xyz'))
+        return (dist / self.speed) + self.visit_time
+
+    def probabilities(self, now=None):
+        # each pose's chance of seeing the ball, if it's been seen before
+        if now is None:
+            now = time.monotonic()
+        self._decay(now)
+        weights = []
+        for heat, empty_time in zip(self.heat, self.seen_empty):
+            w = heat + self.prior
+            if empty_time is not None:
+                w *= 1.0 - math.exp(-(now - empty_time) / self.refill_time)
+            weights.append(w)
+        total = sum(self.heat) + (self.prior * len(self.poses))
+        return [w / total for w in weights]
+
+    def order(self, pos=None, now=None):
+        # pose indexes, best chance per second of travel first
+        probs = self.probabilities(now)
+        rates = [
+            p / self.travel_time(i, pos) for i, p in enumerate(probs)]
+        return sorted(range(len(self.poses)), key=lambda i: -rates[i])
+
+    def next_pose(self, pos=None, now=None):
+        # the pose to visit next, when the arm is at `pos`
+        return self.order(pos, now)[0]
+
+    def found(self, idx, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._decay(now)
+        self.heat[idx] += 1.0
+        self.seen_empty[idx] = None
+        self.visits += 1
+        self.finds += 1
+
+    def empty(self, idx, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.seen_empty[idx] = now
+        self.visits += 1
+
+    def ball_released(self):
+        # the ball's back on the table, so no pose is known to be empty
+        self.seen_empty = [None for p in self.poses]
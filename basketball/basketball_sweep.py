@@ -0,0 +1,321 @@
+import argparse
+import concurrent.futures
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+from basketball_moves import DEFAULT_SPEC, HOOP_COORD, SPEC_LIST
+from basketball_moves import UARM_MAX_SPEED
+
+
+# Finds throwing specs (see `basketball_moves.py`) for any hoop position
+# without the arm, by simulating thousands of candidate throws.
+#
+# The arm is modeled moving in a straight line from `start_pos` to
+# `end_pos` with a trapezoidal speed profile (accelerate, cruise, then
+# decelerate), and the ball flying freely from wherever it is when the
+# pump lets go of it. A throw scores if the ball comes down through the
+# hoop's height within `hoop_radius` of its center.
+#
+# Candidates are laid out around the hoop (the direction they come from,
+# how far away they start and end, how high, how hard and when they let
+# go), so the same sweep works wherever the hoop is. The grid is split
+# across a process pool, and each process scores its share with NumPy.
+# Every candidate is also scored with its release a little early and a
+# little late, and ranked by its worst miss, so the best specs are the
+# ones that still score with the timing jitter of a real arm.
+
+THROW_MODEL = {
+    # mm/sec^2 for each unit passed to `bot.acceleration()`, and mm/sec
+    # for each unit passed to `bot.speed()`, since the wrapper doesn't say
+    # (`UArmMotionQueue` leaves the conversion to the wrapper too); these,
+    # and `release_lag`, were picked so the hand-tuned `fast_down_center`
+    # throw scores (see `fit_model()`, which can refit them as more specs
+    # are tuned)
+    'acceleration_scale': 500.0,
+    'speed_scale': 2.0,
+    # seconds from `bot.pump(False)` until the ball leaves the cup
+    'release_lag': 0.03,
+    'gravity': 9810.0,
+    'hoop_radius': 40.0,
+    'release_jitter': 0.01
+}
+
+# rough reach of the arm, check the results with `robot.can_move_to()`
+WORKSPACE = {
+    'min_radius': 110.0,
+    'max_radius': 330.0,
+    'min_z': 20.0,
+    'max_z': 220.0
+}
+
+# every combination of these is a candidate
+SWEEP_GRID = {
+    'bearing': list(np.arange(0, 360, 10)),         # degrees, hoop to start
+    'start_distance': [150, 200, 250, 300],         # mm, from the hoop
+    'start_z': [40, 50, 60],
+    'end_distance': [0, 25, 50, 75, 100],           # mm, before the hoop
+    'end_offset': [-20, 0, 20],                     # mm, to the side
+    'end_height': [0, 10, 20, 30, 40, 50],          # mm, above the hoop
+    'acceleration': [10, 15, 20, 25],
+    'release_delay': list(np.arange(0.05, 0.40, 0.01))
+}
+SWEEP_KEYS = list(SWEEP_GRID.keys())
+SWEEP_CHUNK_SIZE = 200000
+
+# the model's unknowns that `fit_model()` tries
+FIT_GRID = {
+    'acceleration_scale': [100, 200, 300, 500, 700, 1000, 1500, 2000],
+    'speed_scale': [1.0, 1.5, 2.0, 3.0, 4.0],
+    'release_lag': [0.0, 0.01, 0.02, 0.03, 0.04, 0.05]
+}
+
+
+def get_motion(distance, speed, acceleration, t):
+    # distance travelled and speed at time `t`, for a trapezoidal move
+    t_accel = np.minimum(speed / acceleration, np.sqrt(distance / acceleration))
+    peak = acceleration * t_accel
+    d_accel = 0.5 * acceleration * t_accel * t_accel
+    t_cruise = (distance - (2 * d_accel)) / np.maximum(peak, 1e-9)
+    t_end = (2 * t_accel) + t_cruise
+    t_decel = t_end - t
+    s = np.where(
+        t < t_accel, 0.5 * acceleration * t * t,
+        np.where(
+            t < t_accel + t_cruise, d_accel + peak * (t - t_accel),
+            np.where(
+                t < t_end,
+                distance - 0.5 * acceleration * t_decel * t_decel,
+                distance)))
+    v = np.where(
+        t < t_accel, acceleration * t,
+        np.where(
+            t < t_accel + t_cruise, peak,
+            np.where(t < t_end, acceleration * t_decel, 0.0)))
+    return np.clip(s, 0, distance), np.maximum(v, 0), t_end
+
+
+def get_move_time(start, end, speed, acceleration, model=THROW_MODEL):
+    diff = end - start
+    return get_motion(
+        np.sqrt((diff * diff).sum(axis=1)), speed * model['speed_scale'],
+        acceleration * model['acceleration_scale'], 0.0)[2]
+
+
+def get_landing(start, end, speed, acceleration, release_delay, wait,
+                hoop_z, model=THROW_MODEL):
+    # where (x, y) each ball comes down through the hoop's height, and
+    # whether it does at all; `start` and `end` are (N, 3) arrays, the rest
+    # are (N,) arrays or scalars
+    diff = end - start
+    distance = np.sqrt((diff * diff).sum(axis=1))
+    direction = diff / np.maximum(distance, 1e-9)[:, None]
+    accel = acceleration * model['acceleration_scale']
+    s, v, t_end = get_motion(
+        distance, speed * model['speed_scale'], accel,
+        release_delay + model['release_lag'])
+    if np.any(wait):
+        # waiting for the arm to arrive, the ball is dropped from `end`
+        release = np.where(wait, t_end + release_delay, release_delay)
+        s, v, t_end = get_motion(
+            distance, speed * model['speed_scale'], accel,
+            release + model['release_lag'])
+    pos = start + (direction * s[:, None])
+    vel = direction * v[:, None]
+    # solve z(t) = hoop's z, coming down
+    g = model['gravity']
+    dz = pos[:, 2] - hoop_z
+    disc = (vel[:, 2] * vel[:, 2]) + (2 * g * dz)
+    t = (vel[:, 2] + np.sqrt(np.maximum(disc, 0))) / g
+    x = pos[:, 0] + (vel[:, 0] * t)
+    y = pos[:, 1] + (vel[:, 1] * t)
+    return x, y, (disc >= 0) & (t > 0)
+
+
+def score_throws(start, end, speed, acceleration, release_delay, wait, hoop,
+                 model=THROW_MODEL):
+    # how far (mm) from the hoop's center each ball comes down, inf if it
+    # never comes down through the hoop's height
+    x, y, lands = get_landing(
+        start, end, speed, acceleration, release_delay, wait, hoop['z'],
+        model)
+    miss = np.hypot(x - hoop['x'], y - hoop['y'])
+    return np.where(lands, miss, np.inf)
+
+
+def is_reachable(pos):
+    radius = np.hypot(pos[:, 0], pos[:, 1])
+    return ((radius >= WORKSPACE['min_radius'])
+            & (radius <= WORKSPACE['max_radius'])
+            & (pos[:, 2] >= WORKSPACE['min_z'])
+            & (pos[:, 2] <= WORKSPACE['max_z']))
+
+
+def is_path_reachable(start, end):
+    # the closest the straight line between them comes to the base
+    diff = end[:, :2] - start[:, :2]
+    length = np.maximum((diff * diff).sum(axis=1), 1e-9)
+    t = np.clip(-(start[:, :2] * diff).sum(axis=1) / length, 0, 1)
+    closest = start[:, :2] + (diff * t[:, None])
+    return (is_reachable(start) & is_reachable(end)
+            & (np.hypot(closest[:, 0], closest[:, 1])
+               >= WORKSPACE['min_radius']))
+
+
+def get_candidates(hoop, grid, first, last):
+    # the candidates numbered `first` to `last` in the grid, as arrays
+    shape = [len(grid[k]) for k in SWEEP_KEYS]
+    idxs = np.unravel_index(np.arange(first, last), shape)
+    c = {k: np.asarray(grid[k], dtype=float)[i] for k, i in zip(SWEEP_KEYS, idxs)}
+    bearing = np.radians(c['bearing'])
+    away = np.stack([np.cos(bearing), np.sin(bearing)], axis=1)
+    side = np.stack([-away[:, 1], away[:, 0]], axis=1)
+    hoop_xy = np.array([hoop['x'], hoop['y']], dtype=float)
+    start = np.empty((len(bearing), 3))
+    start[:, :2] = hoop_xy + (away * c['start_distance'][:, None])
+    start[:, 2] = c['start_z']
+    end = np.empty((len(bearing), 3))
+    end[:, :2] = hoop_xy + (away * c['end_distance'][:, None]) + (
+        side * c['end_offset'][:, None])
+    end[:, 2] = hoop['z'] + c['end_height']
+    return start, end, c['acceleration'], c['release_delay']
+
+
+def sweep_chunk(hoop, grid, model, speed, first, last, top):
+    # scores one share of the grid, returning its `top` best candidates
+    # that score, as (worst miss, miss, start, end, acceleration,
+    # release_delay)
+    start, end, accel, delay = get_candidates(hoop, grid, first, last)
+    # letting go after the arm stops is a drop, not a throw
+    move_time = get_move_time(start, end, speed, accel, model)
+    ok = is_path_reachable(start, end) & (
+        delay + model['release_lag'] + model['release_jitter'] < move_time)
+    start, end, accel, delay = start[ok], end[ok], accel[ok], delay[ok]
+    if not len(start):
+        return []
+    misses = [
+        score_throws(start, end, speed, accel, delay + jitter, False, hoop,
+                     model)
+        for jitter in (-model['release_jitter'], 0, model['release_jitter'])
+    ]
+    worst = np.max(misses, axis=0)
+    best = np.argsort(worst, kind='stable')[:top]
+    return [
+        (float(worst[i]), float(misses[1][i]), start[i].tolist(),
+         end[i].tolist(), float(accel[i]), float(delay[i]))
+        for i in best if worst[i] <= model['hoop_radius']
+    ]
+
+
+def sweep(hoop=HOOP_COORD, grid=SWEEP_GRID, model=THROW_MODEL,
+          speed=UARM_MAX_SPEED, top=20, workers=None,
+          chunk_size=SWEEP_CHUNK_SIZE):
+    # returns the `top` best specs for `hoop`, best first, each with its
+    # predicted 'miss' and 'worst_miss' (with release jitter) in mm
+    total = int(np.prod([len(grid[k]) for k in SWEEP_KEYS]))
+    chunks = [
+        (i, min(i + chunk_size, total)) for i in range(0, total, chunk_size)]
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(sweep_chunk, hoop, grid, model, speed, a, b, top)
+            for a, b in chunks]
+        for f in concurrent.futures.as_completed(futures):
+            results.extend(f.result())
+    results.sort(key=lambda r: (r[0], r[1]))
+    # only the best timing for each path
+    specs = {}
+    for r in results:
+        path = (tuple(r[2]), tuple(r[3]))
+        if path not in specs:
+            specs[path] = to_spec(r, speed)
+    return list(specs.values())[:top], total
+
+
+def to_spec(result, speed):
+    worst, miss, start, end, accel, delay = result
+    spec = copy.deepcopy(DEFAULT_SPEC)
+    spec['start_pos'] = {ax: round(v, 1) for ax, v in zip('xyz', start)}
+    spec['end_pos'] = {ax: round(v, 1) for ax, v in zip('xyz', end)}
+    spec['speed'] = speed
+    spec['acceleration'] = accel
+    spec['release_delay'] = round(delay, 3)
+    spec['miss'] = round(miss, 1)
+    spec['worst_miss'] = round(worst, 1)
+    return spec
+
+
+def score_spec(spec, hoop=HOOP_COORD, model=THROW_MODEL, start_pos=None):
+    # predicted miss (mm) of one spec; specs without a `start_pos` start
+    # from wherever the arm is, so one must be given
+    start = spec['start_pos'] or start_pos
+    if not start or not spec['end_pos']:
+        return None
+    return float(score_throws(
+        np.array([[start[ax] for ax in 'xyz']], dtype=float),
+        np.array([[spec['end_pos'][ax] for ax in 'xyz']], dtype=float),
+        spec['speed'], spec['acceleration'], spec['release_delay'],
+        bool(spec.get('wait')), hoop, model)[0])
+
+
+def fit_model(specs=SPEC_LIST, hoop=HOOP_COORD, model=THROW_MODEL,
+              grid=FIT_GRID):
+    # the model, with the unknowns from `grid` that best predict `specs`
+    # (throws known to score) scoring, and its worst predicted miss
+    specs = [spec for spec in specs if spec['start_pos'] and spec['end_pos']]
+    if not specs:
+        return model, None
+    best = (None, model)
+    for accel in grid['acceleration_scale']:
+        for speed in grid['speed_scale']:
+            for lag in grid['release_lag']:
+                m = dict(model, acceleration_scale=accel, speed_scale=speed,
+                         release_lag=lag)
+                worst = max(score_spec(spec, hoop, m) for spec in specs)
+                if best[0] is None or worst < best[0]:
+                    best = (worst, m)
+    return best[1], best[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Find throwing specs for a hoop, by simulating them')
+    parser.add_argument('--hoop', type=float, nargs=3, metavar=('X', 'Y', 'Z'),
+                        default=[HOOP_COORD[ax] for ax in 'xyz'])
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None,
+                        help='save the ranked specs to this JSON file')
+    parser.add_argument('--fit', action='store_true',
+                        help='first refit the model to the current specs')
+    args = parser.parse_args()
+    hoop = dict(zip('xyz', args.hoop))
+    model = THROW_MODEL
+    if args.fit:
+        model, worst = fit_model()
+        print('Model fit to the current specs ({0}mm worst miss): {1}'.format(
+            round(worst, 1), model))
+
+    print('Current specs, predicted miss (mm):')
+    for i, spec in enumerate(SPEC_LIST):
+        miss = score_spec(spec, hoop, model, start_pos=spec['end_pos'])
+        print('  {0}: {1}'.format(i, 'n/a' if miss is None else round(miss, 1)))
+
+    start_time = time.perf_counter()
+    specs, total = sweep(
+        hoop, model=model, top=args.top, workers=args.workers)
+    elapsed = time.perf_counter() - start_time
+    print('Scored {0} candidates in {1:.1f}s ({2} workers)'.format(
+        total, elapsed, args.workers or os.cpu_count()))
+    for spec in specs:
+        print('  miss={0}mm (worst {1}mm) start={2} end={3} accel={4} '
+              'release_delay={5}'.format(
+                  spec['miss'], spec['worst_miss'], spec['start_pos'],
+                  spec['end_pos'], spec['acceleration'], spec['release_delay']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(specs, f, indent=2)
+        print('Saved to', args.output)
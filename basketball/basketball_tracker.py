@@ -0,0 +1,177 @@
+import math
+import time
+
+
+# Follows the ball across camera frames with a Kalman filter, which smooths
+# its position and estimates its velocity. The filter's model has the ball
+# slowing down the way a rolling ball does (its speed decays with a time
+# constant of `rest_time`), so it also predicts where the ball will come to
+# rest. It decides the ball is still once it's confident the speed is below
+# `still_speed`, instead of waiting out the camera's own 20-frame `moving`
+# window.
+#
+# Positions can be in any units, as long as the settings use the same ones:
+# the camera's relative (0.0-1.0) coordinates while the arm holds still, or
+# table mm from a calibrated `CameraModel`, which stay valid while the arm
+# moves. `noise` is how far apart readings of a still ball are,
+# `max_speed` is how fast it might be rolling when first seen, and
+# `max_accel` is how much its slowing down can differ from the model.
+
+TRACKER_CAMERA_SETTINGS = {
+    'noise': 0.005,
+    'still_speed': 0.08,
+    'max_speed': 3.0,
+    'max_accel': 0.1
+}
+TRACKER_MM_SETTINGS = {
+    'noise': 0.5,
+    'still_speed': 8.0,
+    'max_speed': 300.0,
+    'max_accel': 10.0
+}
+
+
+class _AxisFilter(object):
+    # position and velocity along one axis, with their covariance
+
+    def __init__(self, position, noise, max_speed):
+        self.position = position
+        self.velocity = 0.0
+        self.cov = [[noise * noise, 0.0], [0.0, max_speed * max_speed]]
+
+    def predict(self, dt, rest_time, accel_var):
+        decay = math.exp(-dt / rest_time)
+        travel = rest_time * (1.0 - decay)
+        self.position += self.velocity * travel
+        self.velocity *= decay
+        (p00, p01), (p10, p11) = self.cov
+        # F * P * F^T, with F = [[1, travel], [0, decay]]
+        p00, p01, p10, p11 = (
+            p00 + travel * (p10 + p01) + travel * travel * p11,
+            decay * (p01 + travel * p11),
+            decay * (p10 + travel * p11),
+            decay * decay * p11)
+        # plus the unmodeled acceleration
+        self.cov = [
+            [p00 + accel_var * dt ** 3 / 3, p01 + accel_var * dt ** 2 / 2],
+            [p10 + accel_var * dt ** 2 / 2, p11 + accel_var * dt]]
+
+    def correct(self, measured, noise_var):
+        (p00, p01), (p10, p11) = self.cov
+        s = p00 + noise_var
+        k0, k1 = p00 / s, p10 / s
+        residual = measured - self.position
+        self.position += k0 * residual
+        self.velocity += k1 * residual
+        self.cov = [
+            [(1 - k0) * p00, (1 - k0) * p01],
+            [p10 - k1 * p00, p11 - k1 * p01]]
+
+
+class BallTracker(object):
+
+    def __init__(self, noise=0.005, still_speed=0.08, max_speed=3.0,
+                 max_accel=0.1, rest_time=0.4, still_confidence=0.9,
+                 still_updates=2, max_misses=3):
+        self.noise = noise
+        self.still_speed = still_speed
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+        self.rest_time = rest_time
+        self.still_confidence = still_confidence
+        self.still_updates = still_updates
+        self.max_misses = max_misses
+        self.reset()
+
+    def reset(self):
+        self._axes = None
+        self.updates = 0
+        self.still_count = 0
+        self.misses = 0
+        self._last_time = None
+
+    @property
+    def position(self):
+        if not self._axes:
+            return None
+        return {ax: f.position for ax, f in self._axes.items()}
+
+    @property
+    def velocity(self):
+        if not self._axes:
+            return {'x': 0.0, 'y': 0.0}
+        return {ax: f.velocity for ax, f in self._axes.items()}
+
+    @property
+    def speed(self):
+        v = self.velocity
+        return math.hypot(v['x'], v['y'])
+
+    @property
+    def speed_stdev(self):
+        if not self._axes:
+            return self.max_speed
+        return math.sqrt(max(f.cov[1][1] for f in self._axes.values()))
+
+    @property
+    def confidence(self):
+        # 0.0 to 1.0, how likely it is that the ball is slower than
+        # `still_speed`, from the speed and how uncertain it is
+        if self.updates < 2:
+            return 0.0
+        stdev = max(self.speed_stdev, 1e-9)
+        z = (self.still_speed - self.speed) / stdev
+        return 0.5 * (1.0 + math.erf(z / math.sqrt(2)))
+
+    @property
+    def is_still(self):
+        return self.still_count >= self.still_updates
+
+    @property
+    def is_lost(self):
+        return self.misses > self.max_misses
+
+    @property
+    def rest_position(self):
+        # where the ball will stop, if it keeps slowing down like it is
+        if not self._axes:
+            return None
+        return {
+            ax: f.position + (f.velocity * self.rest_time)
+            for ax, f in self._axes.items()
+        }
+
+    def miss(self):
+        # the ball wasn't seen in a frame, returns True once it's lost
+        self.misses += 1
+        if self.is_lost:
+            misses = self.misses
+            self.reset()
+            self.misses = misses
+        return self.is_lost
+
+    def update(self, position, capture_time=None):
+        if capture_time is None:
+            capture_time = time.monotonic()
+        self.misses = 0
+        if not self._axes:
+            self._axes = {
+                ax: _AxisFilter(float(position[ax]), self.noise, self.max_speed)
+                for ax in 'xy'
+            }
+            self._last_time = capture_time
+            self.updates = 1
+            return self
+        dt = capture_time - self._last_time
+        if dt <= 0:
+            return self # the same frame twice
+        self._last_time = capture_time
+        self.updates += 1
+        for ax, f in self._axes.items():
+            f.predict(dt, self.rest_time, self.max_accel * self.max_accel)
+            f.correct(position[ax], self.noise * self.noise)
+        if self.confidence >= self.still_confidence:
+            self.still_count += 1
+        else:
+            self.still_count = 0
+        return self
@@ -8,24 +8,68 @@ import serial
 from uarm import uarm_create, uarm_scan_and_connect
 
 sys.path.append('..')
-from utils import openmv_port
+from utils import openmv_port, uarm_motion_queue
 
 from basketball_moves import get_random_throwing_spec, get_throwing_spec
 from basketball_moves import throw_ball, show_off
 from basketball_moves import HOOP_COORD
+import basketball_camera
+from basketball_search import PoseScheduler
+from basketball_tracker import BallTracker
+from basketball_tracker import TRACKER_CAMERA_SETTINGS, TRACKER_MM_SETTINGS
+
+
+# position where the camera can observe the most area
+x_start = 135
+x_end = x_start + 65
+y_offset = 120
+z_height = 140
+observer_poses = [
+    {'x': x_start + 5, 'y': 0, 'z': z_height},
+    {'x': x_start, 'y': y_offset / 2, 'z': z_height},
+    {'x': x_start, 'y': y_offset + 20, 'z': z_height},
+    {'x': x_end, 'y': y_offset + 20, 'z': z_height},
+    {'x': x_end, 'y': y_offset / 2, 'z': z_height},
+    {'x': x_end, 'y': 0, 'z': z_height},
+    {'x': x_end, 'y': -y_offset / 2, 'z': z_height},
+    {'x': x_start, 'y': -y_offset / 2, 'z': z_height}
+]
+observer_speed = 300
+observer_acceleration = 5
+cam_to_mm = {'x': 131.57894736842104, 'y': 84.74576271186442}
+
+# touches around 39, presses hard around 34
+ball_height = 36
+
+
+def shuffle_on_ball(bot, shuffle_step, motion_queue=None):
+    # wiggle around a square, to get the suction cup to seal
+    moves = [
+        {'x': -shuffle_step / 2, 'y': -shuffle_step / 2},
+        {'x': shuffle_step},
+        {'y': shuffle_step},
+        {'x': -shuffle_step},
+        {'y': -shuffle_step},
+        {'x': shuffle_step / 2, 'y': shuffle_step / 2}
+    ]
+    if motion_queue:
+        # streamed, without a round trip per move
+        for m in moves:
+            motion_queue.move_relative(**m)
+        motion_queue.wait_for_arrival()
+        return
+    for m in moves:
+        bot.move_relative(**m)
 
 
-def pick_up_ball(bot, ball_pos, hover=20, shuffle_step=3):
+def pick_up_ball(bot, ball_pos, hover=20, shuffle_step=3, motion_queue=None):
     bot.push_settings()
     hover_pos = ball_pos.copy()
     hover_pos['z'] += hover
     bot.move_to(**hover_pos).move_to(**ball_pos).wait_for_arrival()
     bot.pump(True)
     if shuffle_step:
-        bot.move_relative(x=-shuffle_step / 2, y=-shuffle_step / 2)
-        bot.move_relative(x=shuffle_step).move_relative(y=shuffle_step)
-        bot.move_relative(x=-shuffle_step).move_relative(y=-shuffle_step)
-        bot.move_relative(x=shuffle_step / 2, y=shuffle_step / 2)
+        shuffle_on_ball(bot, shuffle_step, motion_queue)
     bot.move_to(**hover_pos).wait_for_arrival()
     bot.pop_settings()
 
@@ -35,9 +79,10 @@ def check_if_picked_up(bot, bot_pos):
     bot.speed(300).acceleration(5)
     bot.move_to(**bot_pos).wait_for_arrival()
     bot.pop_settings()
+    arrival_time = time.monotonic()
     picked_up = True
     for i in range(3):
-        cam_data = camera.read_json()
+        cam_data = camera.read_json(captured_after=arrival_time)
         if not cam_data['empty']:
             picked_up = False
             break
@@ -54,27 +99,52 @@ def drop_ball(bot, drop_pos):
     bot.pop_settings()
 
 
-def wait_for_still_position(camera, data, timeout=None, retries=3):
+def get_ball_tracker(bot, camera_model=None):
+    # returns a tracker, and how to get a frame's position for it; with a
+    # calibrated camera the ball is tracked on the table, in mm
+    if camera_model:
+        def _get_position(d):
+            return camera_model.to_arm(d['position'], bot.position)
+        return BallTracker(**TRACKER_MM_SETTINGS), _get_position
+    return BallTracker(**TRACKER_CAMERA_SETTINGS), lambda d: d['position']
+
+
+def wait_for_still_position(camera, data, timeout=None, retries=3,
+                            tracker=None, get_position=None,
+                            captured_after=None):
     print('wait_for_still_position')
-    if retries == 0:
+    if retries == 0 or data['empty']:
+        return None
+    if not data['moving']:
+        return data
+    # block until the ball either stops or disappears
+    if timeout:
+        timeout *= retries
+    if tracker:
+        # stop as soon as either the tracker or the camera says it's still
+        def _is_settled(d):
+            if d['empty']:
+                return tracker.miss()
+            tracker.update(get_position(d), d.get('capture_time'))
+            return tracker.is_still or not d['moving']
+        data = camera.wait_for(
+            _is_settled, timeout=timeout, captured_after=captured_after)
+    else:
+        data = camera.wait_for(
+            lambda d: d['empty'] or not d['moving'], timeout=timeout)
+    if not data or data['empty']:
         return None
-    start_time = time.time()
-    while data['moving'] or data['empty']:
-        if data['empty']:
-            return wait_for_still_position(camera, data, timeout=timeout, retries=retries - 1)
-        if timeout and time.time() - start_time > timeout:
-            return wait_for_still_position(camera, data, timeout=timeout, retries=retries - 1)
-        data = camera.read_json()
     return data
 
 
-def get_visible_ball(camera, retries=3):
+def get_visible_ball(camera, retries=3, captured_after=None):
     print('get_visible_ball')
     if retries == 0:
         return None
-    data = camera.read_json()
+    data = camera.read_json(captured_after=captured_after)
     if data['empty']:
-        return get_visible_ball(camera, retries=retries - 1)
+        return get_visible_ball(
+            camera, retries=retries - 1, captured_after=captured_after)
     return data
 
 
@@ -91,8 +161,8 @@ def get_camera_to_mm_multiplier(bot, camera):
     rel_cam_data = {}
     for ax in 'xy':
         bot.move_relative(**{ax: mm_test}).wait_for_arrival()
-        time.sleep(0.25)
-        rel_cam_data[ax] = get_visible_ball(camera)
+        rel_cam_data[ax] = get_visible_ball(
+            camera, captured_after=time.monotonic())
         bot.move_relative(**{ax: -mm_test}).wait_for_arrival()
     bot.pop_settings()
     if not rel_cam_data['x'] or not rel_cam_data['y']:
@@ -108,8 +178,44 @@ def get_camera_to_mm_multiplier(bot, camera):
     return cam_to_mm
 
 
-def hover_near_ball(bot, camera, cam_to_mm):
+def approach_rolling_ball(bot, camera, camera_model, tracker, min_updates=3):
+    # while the ball is still rolling, move to watch where it's going to
+    # stop, instead of waiting for it to stop first
+    print('approach_rolling_ball')
+    pos = bot.position
+
+    def _has_estimate(d):
+        if d['empty']:
+            return tracker.miss()
+        tracker.update(
+            camera_model.to_arm(d['position'], pos), d.get('capture_time'))
+        return tracker.is_still or tracker.updates >= min_updates
+
+    data = camera.wait_for(_has_estimate, captured_after=time.monotonic())
+    if not data or data['empty'] or tracker.is_still:
+        return
+    target = camera_model.to_view(tracker.rest_position, pos['z'])
+    if bot.can_move_to(**target):
+        bot.move_to(**target).wait_for_arrival()
+
+
+def hover_over_ball(bot, camera, camera_model):
+    # one move, straight to where the calibrated camera sees the ball
+    cam_data = get_visible_ball(camera, captured_after=time.monotonic())
+    if not cam_data:
+        return False
+    pos = bot.position
+    ball_xy = camera_model.to_arm(cam_data['position'], pos)
+    if not bot.can_move_to(z=pos['z'], **ball_xy):
+        return False
+    bot.move_to(**ball_xy)
+    return True
+
+
+def hover_near_ball(bot, camera, cam_to_mm, camera_model=None):
     print('hover_near_ball')
+    if camera_model:
+        return hover_over_ball(bot, camera, camera_model)
 
     target = {
         'x': 0.2,
@@ -119,7 +225,7 @@ def hover_near_ball(bot, camera, cam_to_mm):
     current_pos = None
 
     def _get_cam_pos():
-        cam_data = get_visible_ball(camera)
+        cam_data = get_visible_ball(camera, captured_after=time.monotonic())
         if not cam_data:
             return None
         return cam_data['position']
@@ -173,6 +279,51 @@ def hover_near_ball(bot, camera, cam_to_mm):
     return True
 
 
+def run_automatically(bot, camera, observer_poses, cam_to_mm, ball_height,
+                      camera_model=None, motion_queue=None):
+    scheduler = PoseScheduler(observer_poses, observer_speed)
+    while True:
+        # look from wherever the ball is most likely to be seen soonest
+        obs_pos_idx = scheduler.next_pose(bot.position)
+        obs_pos = observer_poses[obs_pos_idx]
+        bot.push_settings()
+        bot.speed(observer_speed).acceleration(observer_acceleration)
+        bot.move_to(**obs_pos).wait_for_arrival()
+        bot.pop_settings()
+        # time.sleep(1)
+        # continue
+        # see if there's a visible ball
+        cam_data = get_visible_ball(camera, captured_after=time.monotonic())
+        if not cam_data:
+            scheduler.empty(obs_pos_idx)
+            continue
+        scheduler.found(obs_pos_idx)
+        tracker, get_position = get_ball_tracker(bot, camera_model)
+        if camera_model and cam_data['moving']:
+            approach_rolling_ball(bot, camera, camera_model, tracker)
+        # wait for it to be still
+        cam_data = wait_for_still_position(
+            camera, cam_data, tracker=tracker, get_position=get_position,
+            captured_after=time.monotonic())
+        if not cam_data:
+            continue
+        if hover_near_ball(bot, camera, cam_to_mm, camera_model):
+            # move down to test
+            ball_pos = bot.position
+            ball_pos['z'] = ball_height
+            # pickup the ball
+            pick_up_ball(bot, ball_pos, motion_queue=motion_queue)
+            # check with the camera it's picked up
+            did_pick_up = True
+            # did_pick_up = check_if_picked_up(bot, obs_pos)
+            # drop it
+            if did_pick_up:
+                show_off(bot)
+                spec = get_throwing_spec(1)
+                throw_ball(bot, spec)
+                scheduler.ball_released()
+
+
 
 
 '''
@@ -198,34 +349,19 @@ Overview:
 
 if __name__ == "__main__":
 
-    # position where the camera can observe the most area
-    x_start = 135
-    x_end = x_start + 65
-    y_offset = 120
-    z_height = 140
-    observer_poses = [
-        {'x': x_start + 5, 'y': 0, 'z': z_height},
-        {'x': x_start, 'y': y_offset / 2, 'z': z_height},
-        {'x': x_start, 'y': y_offset + 20, 'z': z_height},
-        {'x': x_end, 'y': y_offset + 20, 'z': z_height},
-        {'x': x_end, 'y': y_offset / 2, 'z': z_height},
-        {'x': x_end, 'y': 0, 'z': z_height},
-        {'x': x_end, 'y': -y_offset / 2, 'z': z_height},
-        {'x': x_start, 'y': -y_offset / 2, 'z': z_height}
-    ]
-    cam_to_mm = {'x': 131.57894736842104, 'y': 84.74576271186442}
-
-    # touches around 39, presses hard around 34
-    ball_height = 36
-
     camera = openmv_port.OpenMVPort(verbose=True)
+    camera.find_port()
 
     robot = uarm_scan_and_connect();
     # robot = uarm_create(simulate=True);
     atexit.register(robot.sleep)
+    motion_queue = uarm_motion_queue.UArmMotionQueue(robot)
 
     input_msg = 'Type any letter then ENTER to {0}: '
 
+    # from the last calibration, or None to step closer to the ball instead
+    camera_model = basketball_camera.load_camera_model()
+
     if input(input_msg.format('home')):
         robot.home()
 
@@ -235,7 +371,7 @@ if __name__ == "__main__":
         robot.move_to(**pos).wait_for_arrival()
         pump_status = False
         while True:
-            res = input('m=MOVE, t=TEST_MM, f=FOLLOW, g=SHOWOFF, sN=TEST_SPEC, p=PUMP, h=HOOP: ')
+            res = input('m=MOVE, t=TEST_MM, c=CALIBRATE, f=FOLLOW, g=SHOWOFF, sN=TEST_SPEC, p=PUMP, h=HOOP: ')
             if res == 'h':
                 robot.move_to(**HOOP_COORD).wait_for_arrival()
                 pump_status = False
@@ -254,8 +390,13 @@ if __name__ == "__main__":
             if res == 't':
                 cam_to_mm = get_camera_to_mm_multiplier(robot, camera)
                 print(cam_to_mm)
+            if res == 'c':
+                pump_status = False
+                camera_model = basketball_camera.calibrate(
+                    robot, camera, pos, ball_height, get_visible_ball,
+                    model=camera_model)
             if res == 'f':
-                if hover_near_ball(robot, camera, cam_to_mm):
+                if hover_near_ball(robot, camera, cam_to_mm, camera_model):
                     # move down to test
                     robot.move_to(z=ball_height)
                     time.sleep(1)
@@ -275,38 +416,6 @@ if __name__ == "__main__":
                 robot.move_to(**pos).wait_for_arrival()
 
     if input(input_msg.format('run automatically')):
-        obs_pos_idx = -1
-        while True:
-            # iterate through the different observer poses
-            obs_pos_idx += 1
-            if obs_pos_idx >= len(observer_poses):
-                obs_pos_idx = 0
-            obs_pos = observer_poses[obs_pos_idx]
-            robot.push_settings()
-            robot.speed(300).acceleration(5)
-            robot.move_to(**obs_pos).wait_for_arrival()
-            robot.pop_settings()
-            # time.sleep(1)
-            # continue
-            # see if there's a visible ball
-            cam_data = get_visible_ball(camera)
-            if not cam_data:
-                continue
-            # wait for it to be still
-            cam_data = wait_for_still_position(camera, cam_data)
-            if not cam_data:
-                continue
-            if hover_near_ball(robot, camera, cam_to_mm):
-                # move down to test
-                ball_pos = robot.position
-                ball_pos['z'] = ball_height
-                # pickup the ball
-                pick_up_ball(robot, ball_pos)
-                # check with the camera it's picked up
-                did_pick_up = True
-                # did_pick_up = check_if_picked_up(robot, obs_pos)
-                # drop it
-                if did_pick_up:
-                    show_off(robot)
-                    spec = get_throwing_spec(1)
-                    throw_ball(robot, spec)
+        run_automatically(
+            robot, camera, observer_poses, cam_to_mm, ball_height,
+            camera_model=camera_model, motion_queue=motion_queue)
@@ -0,0 +1,368 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+from uarm import uarm_create
+
+# the repository's root, so this runs from any folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+for project in ['tictactoe', 'basketball', 'knife']:
+    sys.path.append(os.path.join(ROOT, project))
+from utils.benchmark import BenchmarkFinished, CountingBot, PhaseTimer
+from utils.benchmark import compare_results, get_git_commit
+from utils.benchmark import load_results, save_result
+
+import tictactoe_uarm
+import basketball_uarm
+import knife_uarm
+
+
+# next to this script, whichever folder it's run from
+DEFAULT_RESULTS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.jsonl')
+
+tictactoe_phases = [
+    'observe_grid',
+    'monitor_grid',
+    'draw_playing_grid',
+    'get_region_to_draw',
+    'draw_mark_on_region',
+    'draw_end_of_game',
+    'draw_shapes',
+    'run_program'
+]
+
+basketball_phases = [
+    'get_visible_ball',
+    'wait_for_still_position',
+    'hover_near_ball',
+    'pick_up_ball',
+    'show_off',
+    'throw_ball'
+]
+
+knife_phases = [
+    'play_knife_game',
+    'move_to_finger_coordinate'
+]
+
+
+# stands in for module attributes that didn't exist before being replaced
+_missing = object()
+
+
+class SimTicTacToeCamera(object):
+    # Pretends to be the tic-tac-toe camera. It sees whatever the arm
+    # draws, and plays a random mark for the user each time it's their turn.
+
+    def __init__(self, module, num_games, frame_interval=0):
+        self._m = module
+        self._num_games = num_games
+        self._frame_interval = frame_interval
+        self.games = 0
+        self.turns = 0
+        self._originals = []
+        self._clear()
+        # the camera learns what was drawn by watching the drawing functions
+        draw_grid = module.draw_playing_grid
+        draw_mark = module.draw_mark_on_region
+
+        def _draw_playing_grid(bot):
+            draw_grid(bot)
+            self._grid_drawn = True
+
+        def _draw_mark_on_region(bot, region_idx, mark):
+            draw_mark(bot, region_idx, mark)
+            self._board[region_idx] = module.uarm_mark
+            self._user_due = True
+            self.turns += 1
+
+        self._replace('draw_playing_grid', _draw_playing_grid)
+        self._replace('draw_mark_on_region', _draw_mark_on_region)
+
+    def _replace(self, name, function):
+        self._originals.append((name, getattr(self._m, name)))
+        setattr(self._m, name, function)
+
+    def restore(self):
+        # puts back the module's own functions
+        for name, original in reversed(self._originals):
+            setattr(self._m, name, original)
+        self._originals = []
+
+    def _clear(self):
+        self._grid_drawn = False
+        self._board = self._m.game_engine.new_board()
+        self._user_due = False
+
+    def _is_game_over(self):
+        return self._board.winner() or self._board.is_full()
+
+    def _frame(self):
+        if self._frame_interval:
+            time.sleep(self._frame_interval)
+        if self._user_due and not self._is_game_over():
+            user_idx = random.choice(self._board.empties())
+            self._board[user_idx] = self._m.user_mark
+            self._user_due = False
+        return {
+            'empty': not self._grid_drawn,
+            'moving': False,
+            'regions': self._board.to_camera(),
+            'capture_time': time.monotonic()
+        }
+
+    def read_json(self, retries=3, newer_than=None, captured_after=None):
+        return self._frame()
+
+    def wait_for(self, predicate, timeout=None, captured_after=None, retries=3):
+        if self._is_game_over():
+            # the game is waiting for a fresh sheet of paper
+            self.games += 1
+            if self.games >= self._num_games:
+                raise BenchmarkFinished('Played {0} games'.format(self.games))
+            self._clear()
+            return self._frame()
+        while True:
+            frame = self._frame()
+            if predicate(frame):
+                return frame
+
+
+class SimBallCamera(object):
+    # Pretends to be the basketball camera, looking down from the arm. The
+    # ball is only visible while it's inside the camera's view, rolls for a
+    # few frames after landing, and disappears while the arm is holding it.
+
+    def __init__(self, module, bot, num_throws, frame_interval=0,
+                 moving_frames=3, ball_area=None):
+        self._m = module
+        self._bot = bot
+        self._num_throws = num_throws
+        self._frame_interval = frame_interval
+        self._moving_frames = moving_frames
+        self._ball_area = ball_area or {'x': (140, 200), 'y': (-60, 140)}
+        # the camera position the arm tries to center the ball at
+        self._target = {'x': 0.2, 'y': 0.5}
+        self.throws = 0
+        self._ball = None
+        self._moving = 0
+        self._originals = []
+        self._place_ball()
+        pick_up_ball = module.pick_up_ball
+        throw_ball = module.throw_ball
+
+        def _pick_up_ball(bot, ball_pos, *args, **kwargs):
+            pick_up_ball(bot, ball_pos, *args, **kwargs)
+            self._ball = None
+
+        def _throw_ball(bot, spec):
+            throw_ball(bot, spec)
+            self.throws += 1
+            if self.throws >= self._num_throws:
+                raise BenchmarkFinished('Threw {0} times'.format(self.throws))
+            self._place_ball()
+
+        self._replace('pick_up_ball', _pick_up_ball)
+        self._replace('throw_ball', _throw_ball)
+        # `check_if_picked_up()` reads the module's camera
+        self._replace('camera', self)
+
+    def _replace(self, name, value):
+        # the module only has a camera while it runs as a script
+        self._originals.append((name, getattr(self._m, name, _missing)))
+        setattr(self._m, name, value)
+
+    def restore(self):
+        # puts back the module's own functions, and its camera
+        for name, original in reversed(self._originals):
+            if original is _missing:
+                delattr(self._m, name)
+            else:
+                setattr(self._m, name, original)
+        self._originals = []
+
+    def _place_ball(self):
+        self._ball = {
+            ax: random.uniform(*self._ball_area[ax]) for ax in 'xy'}
+        self._moving = self._moving_frames
+
+    def _frame(self):
+        if self._frame_interval:
+            time.sleep(self._frame_interval)
+        data = {
+            'empty': True,
+            'moving': False,
+            'position': {'x': 0, 'y': 0},
+            'capture_time': time.monotonic()
+        }
+        if not self._ball:
+            return data
+        # `hover_near_ball()` finishes with a 20mm step along X
+        arm = self._bot.tracked_position
+        position = {
+            ax: self._target[ax] - (
+                arm[ax] - self._ball[ax] + (20 if ax == 'x' else 0)
+            ) / self._m.cam_to_mm[ax]
+            for ax in 'xy'
+        }
+        if not all([0 <= position[ax] <= 1 for ax in 'xy']):
+            return data
+        data['empty'] = False
+        data['moving'] = self._moving > 0
+        data['position'] = position
+        self._moving = max(self._moving - 1, 0)
+        return data
+
+    def read_json(self, retries=3, newer_than=None, captured_after=None):
+        return self._frame()
+
+    def wait_for(self, predicate, timeout=None, captured_after=None, retries=3):
+        for i in range(self._moving_frames + 1):
+            data = self._frame()
+            if predicate(data):
+                return data
+        return None
+
+
+def run_tictactoe(bot, timer, args):
+    m = tictactoe_uarm
+    for name in tictactoe_phases:
+        timer.wrap(m, name)
+    camera = SimTicTacToeCamera(m, args.cycles, args.frame_interval)
+    m.reset_uarm(bot)
+    try:
+        m.auto_mode(bot, camera)
+    except BenchmarkFinished:
+        pass
+    finally:
+        camera.restore()
+    return camera.turns, 'turns'
+
+
+def run_basketball(bot, timer, args):
+    m = basketball_uarm
+    for name in basketball_phases:
+        timer.wrap(m, name)
+    camera = SimBallCamera(m, bot, args.cycles, args.frame_interval)
+    try:
+        m.run_automatically(
+            bot, camera, m.observer_poses, m.cam_to_mm, m.ball_height)
+    except BenchmarkFinished:
+        pass
+    finally:
+        camera.restore()
+    return camera.throws, 'throws'
+
+
+def run_knife(bot, timer, args):
+    m = knife_uarm
+    for name in knife_phases:
+        timer.wrap(m, name)
+    bot.rotate_to(m.wrist_centered_angle)
+    for i in range(args.cycles):
+        # without the pauses meant for the person playing along
+        m.play_knife_game(
+            bot, wait_for_ready=lambda msg: None, ready_pause=0,
+            finish_pause=0)
+    # each game stabs every finger gap going out, and all but one coming back
+    strikes = args.cycles * ((2 * len(m.finger_coords)) - 1)
+    return strikes, 'strikes'
+
+
+projects = {
+    'tictactoe': (run_tictactoe, 60),
+    'basketball': (run_basketball, 60),
+    'knife': (run_knife, 1)
+}
+
+
+def run_benchmark(name, args):
+    run, per_seconds = projects[name]
+    timer = PhaseTimer()
+    bot = CountingBot(uarm_create(simulate=True), timer=timer)
+    start = time.perf_counter()
+    try:
+        count, unit = run(bot, timer, args)
+    finally:
+        elapsed = time.perf_counter() - start
+        timer.restore()
+    return {
+        'name': name,
+        'time': datetime.datetime.now().isoformat(),
+        'commit': get_git_commit(ROOT),
+        'seed': args.seed,
+        'cycles': args.cycles,
+        'elapsed': round(elapsed, 4),
+        'count': count,
+        'unit': unit,
+        'rate': round(count * per_seconds / elapsed, 4) if elapsed else None,
+        'rate_unit': '{0}/{1}'.format(unit, 'min' if per_seconds == 60 else 'sec'),
+        'commands': bot.commands,
+        'commands_per_cycle': round(bot.commands / count, 2) if count else None,
+        'calls': dict(bot.calls),
+        'phases': timer.as_dict()
+    }
+
+
+def print_result(result, previous=None):
+    print('\n{0} @ {1}'.format(result['name'], result['commit']))
+    # the simulated arm arrives as soon as it's told to move, so this is
+    # how fast the host-side code goes, not how fast the real arm plays
+    print('  host-side only, the simulated arm takes no time to move')
+    print('  {0} {1} in {2:.3f}s -> {3} {4}'.format(
+        result['count'], result['unit'], result['elapsed'],
+        result['rate'], result['rate_unit']))
+    print('  {0} serial commands, {1} per {2}'.format(
+        result['commands'], result['commands_per_cycle'], result['unit'][:-1]))
+    phases = sorted(
+        result['phases'].items(), key=lambda p: p[1]['total'], reverse=True)
+    for name, p in phases:
+        if not p['calls']:
+            continue
+        print('  {0:<28} n={1:<5} total={2:.3f}s mean={3:.2f}ms cmds={4}'.format(
+            name, p['calls'], p['total'], p['mean'] * 1000, p['commands']))
+    if previous:
+        print('  compared to {0} @ {1}:'.format(
+            previous['time'], previous['commit']))
+        for metric in ['rate', 'commands_per_cycle']:
+            change = compare_results(previous, result, metric)
+            if change is not None:
+                print('    {0:<20} {1} -> {2} ({3:+.1f}%)'.format(
+                    metric, previous[metric], result[metric], change))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Time the projects against a simulated uArm and camera')
+    parser.add_argument(
+        'projects', nargs='*',
+        help='any of {0}, defaults to all of them'.format(
+            ', '.join(projects.keys())))
+    parser.add_argument(
+        '--cycles', type=int, default=5,
+        help='games (tictactoe, knife) or throws (basketball) to run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--frame-interval', type=float, default=0,
+        help='seconds each simulated camera frame takes to arrive')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_PATH)
+    parser.add_argument(
+        '--no-save', action='store_true',
+        help='do not append these results to the results file')
+    args = parser.parse_args()
+    for name in args.projects:
+        if name not in projects:
+            parser.error('Unknown project: {0}'.format(name))
+
+    for name in args.projects or list(projects.keys()):
+        random.seed(args.seed)
+        result = run_benchmark(name, args)
+        history = load_results(args.results, name=name)
+        print_result(result, previous=history[-1] if history else None)
+        if not args.no_save:
+            save_result(args.results, result)
@@ -5,13 +5,17 @@ import time
 from uarm import uarm_create, uarm_scan_and_connect
 
 sys.path.append('..')
-from utils import openmv_port
+from utils import openmv_port, uarm_motion_queue
 
 wrist_centered_angle = 100
 
 move_speed = 600
 move_acceleration = 20
 
+# seconds to hold still before and after stabbing, for the person playing
+ready_pause = 2
+finish_pause = 3
+
 knife_height = 19
 hover_height = knife_height + 25
 middle_knuckle = {'x': 200, 'y': 10, 'z': knife_height + 150}
@@ -25,18 +29,58 @@ finger_coords = [
 ]
 
 
-def move_to_finger_coordinate(bot, pos):
-    hover_now = robot.position
+def move_to_finger_coordinate(bot, pos, motion_queue=None):
+    if motion_queue:
+        hover_now = motion_queue.position.copy()
+    else:
+        hover_now = bot.position
     hover_now['z'] = max(hover_now['z'], hover_height, pos['z'])
     hover_target = pos.copy()
     hover_target['z'] = hover_now['z']
-    robot.move_to(**hover_now).move_to(**hover_target).move_to(**pos)
+    if motion_queue:
+        for p in [hover_now, hover_target, pos]:
+            motion_queue.move_to(**p)
+        return
+    bot.move_to(**hover_now).move_to(**hover_target).move_to(**pos)
+
+
+def stab_fingers(bot, motion_queue=None):
+    # streaming the moves through a `UArmMotionQueue` keeps the firmware's
+    # buffer full, instead of a round trip per move
+    if motion_queue:
+        motion_queue.position = dict(bot.position)
+    for i in range(1, len(finger_coords)):
+        move_to_finger_coordinate(bot, finger_coords[i], motion_queue)
+    for i in range(len(finger_coords) - 2, -1, -1):
+        move_to_finger_coordinate(bot, finger_coords[i], motion_queue)
+    if motion_queue:
+        # the wrapper didn't see these moves
+        motion_queue.wait_for_arrival()
+
+
+def play_knife_game(bot, wait_for_ready=input, motion_queue=None,
+                    ready_pause=ready_pause, finish_pause=finish_pause):
+    bot.push_settings()
+    bot.speed(100).acceleration(1)
+    bot.push_settings()
+    move_to_finger_coordinate(bot, middle_knuckle)
+    wait_for_ready('Ready?')
+    move_to_finger_coordinate(bot, finger_coords[0])
+    bot.wait_for_arrival()
+    time.sleep(ready_pause)
+    bot.speed(move_speed).acceleration(move_acceleration)
+    stab_fingers(bot, motion_queue)
+    time.sleep(finish_pause)
+    bot.pop_settings()
+    move_to_finger_coordinate(bot, middle_knuckle)
+    bot.pop_settings()
 
 
 if __name__ == "__main__":
 
     robot = uarm_scan_and_connect()
     atexit.register(robot.sleep)
+    motion_queue = uarm_motion_queue.UArmMotionQueue(robot)
 
     robot.rotate_to(wrist_centered_angle)
 
@@ -58,23 +102,7 @@ if __name__ == "__main__":
                 move_to_finger_coordinate(robot, middle_knuckle)
                 continue
             if res.lower() == 'a':
-                robot.push_settings()
-                robot.speed(100).acceleration(1)
-                robot.push_settings()
-                move_to_finger_coordinate(robot, middle_knuckle)
-                input('Ready?')
-                move_to_finger_coordinate(robot, finger_coords[0])
-                robot.wait_for_arrival()
-                time.sleep(2)
-                robot.speed(move_speed).acceleration(move_acceleration)
-                for i in range(1, len(finger_coords)):
-                    move_to_finger_coordinate(robot, finger_coords[i])
-                for i in range(len(finger_coords) - 2, -1, -1):
-                    move_to_finger_coordinate(robot, finger_coords[i])
-                time.sleep(3)
-                robot.pop_settings()
-                move_to_finger_coordinate(robot, middle_knuckle)
-                robot.pop_settings()
+                play_knife_game(robot, motion_queue=motion_queue)
                 continue
             else:
                 try:
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from tictactoe_regions import get_crop_roi
+from utils.openmv_host import run_script
+from utils.openmv_protocol import FrameDecoder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRAME_WIDTH = 320
+FRAME_HEIGHT = 240
+
+PAPER = 200
+INK = 20
+
+
+class CameraOutput(object):
+    # stdout for `run_script()`, keeping printed lines and binary frames in
+    # the order the camera sent them
+    def __init__(self):
+        self.data = bytearray()
+        self.buffer = self
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.data += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def run_camera(script, frames, tmp_path, requests=(), output=None):
+    # runs a camera script over `frames`, returning what it sent, decoded;
+    # the raw bytes are kept in `output`, when one is given
+    path = str(tmp_path / 'frames.npy')
+    np.save(path, np.stack(frames))
+    if output is None:
+        output = CameraOutput()
+    run_script(os.path.join(ROOT, script), path, requests=list(requests),
+               output=output)
+    decoder = FrameDecoder()
+    decoder.feed(bytes(output.data))
+    frames = list(decoder.frames())
+    assert decoder.crc_errors == 0
+    return frames
+
+
+def ball_frame(x, y, size=40, color=(220, 60, 30), background=120):
+    # an RGB picture with a square "ball" centered at (x, y)
+    frame = np.full((FRAME_HEIGHT, FRAME_WIDTH, 3), background, dtype=np.uint8)
+    half = size // 2
+    frame[y - half:y + half, x - half:x + half] = color
+    return frame
+
+
+def blank_frame():
+    return np.full((FRAME_HEIGHT, FRAME_WIDTH), PAPER, dtype=np.uint8)
+
+
+def grid_frame(marks, hand_y=None):
+    # a grayscale picture of crosses drawn in the regions `marks`, and
+    # maybe a hand passing over the paper
+    frame = blank_frame()
+    x, y, w, h = get_crop_roi(FRAME_WIDTH, FRAME_HEIGHT)
+    for m in marks:
+        center_x = x + ((m % 3) + 0.5) * w / 3
+        center_y = y + ((m // 3) + 0.5) * h / 3
+        for t in range(-15, 16):
+            row = int(center_y + t)
+            for col in (int(center_x + t), int(center_x - t)):
+                frame[row, col - 1:col + 2] = INK
+    if hand_y is not None:
+        frame[hand_y:hand_y + 80, 100:180] = 60
+    return frame
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# the projects import their own modules by name, and `utils` as a package
+# from the repository's root, the same as when run from their folders
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [ROOT] + [
+        os.path.join(ROOT, project)
+        for project in ['tictactoe', 'basketball', 'knife']]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
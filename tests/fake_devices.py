@@ -0,0 +1,30 @@
+import os
+import pty
+import threading
+import time
+
+
+class FakePort(object):
+    # a pty standing in for a serial port, with a thread playing the device
+    def __init__(self, reply=None):
+        self._reply = reply
+        self._master, self._slave = pty.openpty()
+        self.device = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while self._running:
+            if self._reply:
+                os.write(self._master, self._reply)
+            time.sleep(0.02)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._running = False
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+import basketball_camera
+from basketball_camera import CameraModel
+
+POSE = {'x': 200.0, 'y': 0.0, 'z': 150.0}
+BALL_HEIGHT = 20.0
+
+
+def get_samples(num_samples, pose=POSE):
+    # a camera that sees the ball's offset from the arm, scaled
+    pattern = basketball_camera.get_calibration_pattern(pose)[:num_samples]
+    ball = {'x': pose['x'], 'y': pose['y']}
+    return [{
+        'camera': [0.5 + (ball['x'] - p['x']) / 200,
+                   0.5 + (ball['y'] - p['y']) / 200],
+        'arm': p,
+        'ball': ball,
+        'pose': [pose['x'], pose['y'], pose['z']]
+    } for p in pattern]
+
+
+def calibrate(monkeypatch, samples, model=None):
+    monkeypatch.setattr(
+        basketball_camera, 'collect_samples', lambda *args: samples)
+    saved = []
+    monkeypatch.setattr(CameraModel, 'save', lambda self: saved.append(self))
+    model = basketball_camera.calibrate(
+        None, None, POSE, BALL_HEIGHT, None, model=model)
+    return model, saved
+
+
+def test_calibrate_fits_and_saves(monkeypatch):
+    model, saved = calibrate(monkeypatch, get_samples(9))
+    assert saved == [model]
+    assert len(model.samples) == 9
+    assert model.error is not None
+
+
+def test_calibrate_with_too_few_samples_keeps_model(monkeypatch, capsys):
+    model, saved = calibrate(monkeypatch, get_samples(3))
+    assert model is None
+    assert saved == []
+    assert 'need 4' in capsys.readouterr().out
+
+    previous = CameraModel(BALL_HEIGHT, POSE['z'], get_samples(9))
+    model, saved = calibrate(monkeypatch, get_samples(2), model=previous)
+    assert model is previous
+    assert len(model.samples) == 9
+    assert saved == []
+
+
+def test_failed_fit_leaves_model_unchanged():
+    model = CameraModel(BALL_HEIGHT, POSE['z'], get_samples(9))
+    homography = model.homography
+    bad = get_samples(4)
+    for s in bad:
+        s['camera'] = [float('nan'), float('nan')]
+    with pytest.raises((ValueError, basketball_camera.np.linalg.LinAlgError)):
+        model.add_samples(bad)
+    assert len(model.samples) == 9
+    assert model.homography is homography
+
+
+def test_load_camera_model_says_why(tmp_path, capsys):
+    path = str(tmp_path / 'camera.json')
+    assert basketball_camera.load_camera_model(path) is None
+    assert capsys.readouterr().out == ''
+
+    with open(path, 'w') as f:
+        json.dump({'plane_height': BALL_HEIGHT, 'reference_height': POSE['z'],
+                   'samples': get_samples(3)}, f)
+    assert basketball_camera.load_camera_model(path) is None
+    assert 'at least 4 points' in capsys.readouterr().out
+
+    with open(path, 'w') as f:
+        json.dump({'plane_height': BALL_HEIGHT, 'reference_height': POSE['z'],
+                   'samples': get_samples(9)}, f)
+    assert len(basketball_camera.load_camera_model(path).samples) == 9
@@ -0,0 +1,34 @@
+from camera_frames import ball_frame, run_camera
+
+SCRIPT = 'basketball/basketball_openmv.py'
+
+
+def get_moving(frames, tmp_path):
+    sent = run_camera(SCRIPT, frames, tmp_path)
+    assert len(sent) == len(frames)
+    assert not any(f['empty'] for f in sent)
+    return [f['moving'] for f in sent]
+
+
+def test_still_ball_is_never_moving(tmp_path):
+    frames = [ball_frame(160 + (i % 2), 120) for i in range(30)]
+    assert not any(get_moving(frames, tmp_path))
+
+
+def test_slow_drift_is_moving(tmp_path):
+    # 1px a frame never jumps, but adds up over the stillness window
+    frames = [ball_frame(160, 120)] * 5
+    frames += [ball_frame(160 + i, 120) for i in range(1, 41)]
+    moving = get_moving(frames, tmp_path)
+    assert not any(moving[:5])
+    assert all(moving[15:45])
+
+
+def test_moving_until_still_for_the_window(tmp_path):
+    frames = [ball_frame(130 + 6 * i, 120) for i in range(8)]
+    frames += [ball_frame(172, 120)] * 30
+    moving = get_moving(frames, tmp_path)
+    assert all(moving[1:8])
+    # still for 20 readings after the last move, then not moving anymore
+    assert all(moving[8:27])
+    assert not any(moving[28:])
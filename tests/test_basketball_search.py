@@ -0,0 +1,109 @@
+import math
+
+import pytest
+
+from basketball_search import PoseScheduler
+
+SPEED = 100.0
+
+
+def get_poses(num_poses=6, radius=150.0):
+    # observer poses around the arm, like `observer_poses`
+    return [{
+        'x': radius * math.cos(math.pi * i / (num_poses - 1)),
+        'y': radius * math.sin(math.pi * i / (num_poses - 1)),
+        'z': 150.0} for i in range(num_poses)]
+
+
+def test_nearest_pose_first_without_history():
+    poses = get_poses()
+    scheduler = PoseScheduler(poses, SPEED)
+    for idx, pose in enumerate(poses):
+        order = scheduler.order(pose, now=0.0)
+        assert order[0] == idx
+        # then further and further away
+        times = [scheduler.travel_time(i, pose) for i in order]
+        assert times == sorted(times)
+    # without a position, every pose is as good as another
+    assert scheduler.order(now=0.0) == list(range(len(poses)))
+
+
+def test_probabilities_add_up_without_empty_poses():
+    scheduler = PoseScheduler(get_poses(), SPEED)
+    scheduler.found(2, now=0.0)
+    scheduler.found(2, now=1.0)
+    scheduler.found(4, now=2.0)
+    assert sum(scheduler.probabilities(now=3.0)) == pytest.approx(1.0)
+
+
+def test_found_pose_worth_the_travel():
+    poses = get_poses()
+    scheduler = PoseScheduler(poses, SPEED)
+    scheduler.found(len(poses) - 1, now=0.0)
+    # the far pose where the ball turned up once isn't worth the trip yet
+    assert scheduler.next_pose(poses[0], now=1.0) == 0
+    for i in range(10):
+        scheduler.found(len(poses) - 1, now=float(i))
+    # but is once the ball keeps turning up there
+    assert scheduler.next_pose(poses[0], now=10.0) == len(poses) - 1
+    assert (scheduler.visits, scheduler.finds) == (11, 11)
+
+
+def test_heat_halves_every_half_life():
+    scheduler = PoseScheduler(get_poses(), SPEED, half_life=10.0)
+    scheduler.found(3, now=0.0)
+    scheduler.probabilities(now=10.0)
+    assert scheduler.heat[3] == pytest.approx(0.5)
+    scheduler.probabilities(now=30.0)
+    assert scheduler.heat[3] == pytest.approx(0.125)
+
+
+def test_empty_poses_retire_then_refill():
+    poses = get_poses()
+    # the heat map doesn't fade here, to only see the refill
+    scheduler = PoseScheduler(
+        poses, SPEED, half_life=1e9, refill_time=60.0)
+    scheduler.found(1, now=0.0)
+    scheduler.empty(1, now=10.0)
+    # just seen empty, it's the last place to look, even being the closest
+    assert scheduler.probabilities(now=10.0)[1] == 0.0
+    assert scheduler.order(poses[1], now=10.0)[-1] == 1
+    # coming back as the ball might have rolled there
+    chances = [scheduler.probabilities(now=10.0 + t)[1]
+               for t in (1.0, 30.0, 60.0, 600.0)]
+    assert chances == sorted(chances)
+    full = scheduler.probabilities(now=1000.0)[1]
+    assert chances[2] == pytest.approx(full * (1 - math.exp(-1)), rel=0.01)
+    assert scheduler.next_pose(poses[1], now=1000.0) == 1
+
+
+def test_search_visits_every_pose_before_repeating():
+    poses = get_poses(8)
+    scheduler = PoseScheduler(poses, SPEED)
+    pos = poses[3]
+    now = 0.0
+    visited = []
+    for i in range(len(poses)):
+        idx = scheduler.next_pose(pos, now=now)
+        now += scheduler.travel_time(idx, pos)
+        pos = poses[idx]
+        scheduler.empty(idx, now=now)
+        visited.append(idx)
+    assert sorted(visited) == list(range(len(poses)))
+    # and the first one seen empty is the next to look at again
+    assert scheduler.next_pose(pos, now=now) == visited[0]
+
+
+def test_ball_released_clears_empty_poses():
+    poses = get_poses()
+    scheduler = PoseScheduler(poses, SPEED)
+    for i in range(len(poses)):
+        scheduler.empty(i, now=0.0)
+    assert not any(scheduler.probabilities(now=0.0))
+    scheduler.ball_released()
+    assert scheduler.probabilities(now=0.0) == pytest.approx(
+        [1.0 / len(poses)] * len(poses))
+    # finding the ball at a pose also means it's no longer empty
+    scheduler.empty(2, now=1.0)
+    scheduler.found(2, now=1.0)
+    assert scheduler.seen_empty[2] is None
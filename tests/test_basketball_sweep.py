@@ -0,0 +1,126 @@
+import copy
+import math
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def s():
+    # `basketball_moves` takes the arm's top speed from the wrapper
+    pytest.importorskip('uarm')
+    import basketball_sweep
+    return basketball_sweep
+
+
+def closed_form(distance, speed, acceleration, t):
+    # the textbook trapezoid, or triangle when it can't reach `speed`
+    t_accel = speed / acceleration
+    if acceleration * t_accel * t_accel > distance:
+        t_accel = math.sqrt(distance / acceleration)
+        peak = acceleration * t_accel
+        t_end = 2 * t_accel
+        t_cruise = 0.0
+    else:
+        peak = speed
+        t_cruise = (distance / speed) - t_accel
+        t_end = (2 * t_accel) + t_cruise
+    if t <= 0:
+        return 0.0, 0.0, t_end
+    if t < t_accel:
+        return 0.5 * acceleration * t * t, acceleration * t, t_end
+    d_accel = 0.5 * acceleration * t_accel * t_accel
+    if t < t_accel + t_cruise:
+        return d_accel + (peak * (t - t_accel)), peak, t_end
+    if t < t_end:
+        left = t_end - t
+        return distance - (0.5 * acceleration * left * left), \
+            acceleration * left, t_end
+    return distance, 0.0, t_end
+
+
+@pytest.mark.parametrize('distance, speed, acceleration', [
+    (300.0, 400.0, 4000.0),     # trapezoid
+    (300.0, 1200.0, 10000.0),   # trapezoid, short cruise
+    (100.0, 1200.0, 4000.0),    # triangle, never reaches `speed`
+    (40.0, 200.0, 1000.0)])     # exactly reaches `speed`, then slows
+def test_motion_matches_closed_form(s, distance, speed, acceleration):
+    t_end = closed_form(distance, speed, acceleration, 0)[2]
+    times = np.linspace(0, t_end * 1.2, 97)
+    dist, vel, end = s.get_motion(distance, speed, acceleration, times)
+    assert end == pytest.approx(t_end)
+    for t, d, v in zip(times, dist, vel):
+        expected_d, expected_v, _ = closed_form(
+            distance, speed, acceleration, t)
+        assert d == pytest.approx(expected_d, abs=1e-6)
+        assert v == pytest.approx(expected_v, abs=1e-6)
+
+
+def test_motion_is_broadcast_over_moves(s):
+    distance = np.array([300.0, 100.0, 40.0])
+    speed = np.array([400.0, 1200.0, 200.0])
+    acceleration = np.array([4000.0, 4000.0, 1000.0])
+    dist, vel, end = s.get_motion(distance, speed, acceleration, 0.1)
+    for i in range(3):
+        d, v, e = closed_form(distance[i], speed[i], acceleration[i], 0.1)
+        assert (dist[i], vel[i], end[i]) == pytest.approx((d, v, e))
+
+
+HOOP = {'x': 200.0, 'y': -200.0, 'z': 140.0}
+TRUE_MODEL = {
+    'acceleration_scale': 300.0, 'speed_scale': 3.0, 'release_lag': 0.02}
+
+
+def make_spec(s, start, end, speed, acceleration, release_delay, model):
+    # a spec that scores under `model`, moved so its ball lands right in
+    # the hoop (throws look the same anywhere on the table)
+    spec = copy.deepcopy(s.DEFAULT_SPEC)
+    spec.update(speed=speed, acceleration=acceleration,
+                release_delay=release_delay)
+    start, end = np.array([start], dtype=float), np.array([end], dtype=float)
+    x, y, lands = s.get_landing(
+        start, end, speed, acceleration, release_delay, False, HOOP['z'],
+        model)
+    assert lands[0]
+    shift = np.array([HOOP['x'] - x[0], HOOP['y'] - y[0], 0.0])
+    spec['start_pos'] = dict(zip('xyz', (start[0] + shift).tolist()))
+    spec['end_pos'] = dict(zip('xyz', (end[0] + shift).tolist()))
+    assert s.score_spec(spec, HOOP, model) == pytest.approx(0, abs=1e-6)
+    return spec
+
+
+def test_fit_model_recovers_known_parameters(s):
+    model = dict(s.THROW_MODEL, **TRUE_MODEL)
+    for key, value in TRUE_MODEL.items():
+        assert value in s.FIT_GRID[key]
+        assert value != s.THROW_MODEL[key]
+    specs = [
+        make_spec(s, (150, 50, 50), (205, -150, 170), 400, 15, 0.3, model),
+        make_spec(s, (300, 0, 40), (220, -160, 160), 200, 20, 0.36, model),
+        make_spec(s, (100, -250, 60), (180, -190, 180), 400, 10, 0.3, model),
+        make_spec(s, (250, 100, 50), (210, -120, 150), 200, 10, 0.5, model)]
+    fit, worst = s.fit_model(specs, HOOP, s.THROW_MODEL)
+    assert worst == pytest.approx(0, abs=1e-6)
+    for key, value in TRUE_MODEL.items():
+        assert fit[key] == value
+    # and the rest of the model is left as it was
+    for key in ('gravity', 'hoop_radius', 'release_jitter'):
+        assert fit[key] == s.THROW_MODEL[key]
+
+
+def test_fit_model_without_usable_specs(s):
+    spec = copy.deepcopy(s.DEFAULT_SPEC)
+    spec['start_pos'] = None
+    assert s.fit_model([spec], HOOP) == (s.THROW_MODEL, None)
+
+
+def test_score_throws_agrees_with_landing(s):
+    start = np.array([[150.0, 50.0, 50.0], [150.0, 50.0, 50.0]])
+    end = np.array([[205.0, -150.0, 170.0], [205.0, -150.0, 100.0]])
+    x, y, lands = s.get_landing(start, end, 400, 15, 0.3, False, HOOP['z'])
+    miss = s.score_throws(start, end, 400, 15, 0.3, False, HOOP)
+    assert miss[0] == pytest.approx(
+        math.hypot(x[0] - HOOP['x'], y[0] - HOOP['y']))
+    # a throw that never rises to the hoop's height can't score
+    assert not lands[1]
+    assert miss[1] == np.inf
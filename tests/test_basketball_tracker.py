@@ -0,0 +1,127 @@
+import math
+import random
+
+import pytest
+
+from basketball_tracker import BallTracker, _AxisFilter
+
+FPS = 30.0
+NOISE = 0.005
+# far longer than any track, so the ball isn't expected to slow down
+NO_DECAY = 1e9
+
+
+def track(tracker, get_position, num_frames, seed=0):
+    # feeds noisy readings of `get_position(t)` to the tracker, returning
+    # the time of the last one
+    rng = random.Random(seed)
+    for i in range(num_frames):
+        t = i / FPS
+        p = get_position(t)
+        tracker.update({
+            'x': p['x'] + rng.gauss(0, NOISE),
+            'y': p['y'] + rng.gauss(0, NOISE)}, t)
+    return t
+
+
+@pytest.mark.parametrize('vx, vy', [(0.3, 0.0), (0.5, -0.5), (-1.0, 0.2)])
+def test_converges_on_constant_velocity(vx, vy):
+    tracker = BallTracker(rest_time=NO_DECAY)
+
+    def get_position(t):
+        return {'x': 0.5 + vx * t, 'y': 0.5 + vy * t}
+
+    t = track(tracker, get_position, 90)
+    truth = get_position(t)
+    # within the filter's own uncertainty, which has settled
+    assert tracker.speed_stdev < 0.05
+    for ax, v in [('x', vx), ('y', vy)]:
+        assert tracker.position[ax] == pytest.approx(
+            truth[ax], abs=2 * NOISE)
+        assert tracker.velocity[ax] == pytest.approx(
+            v, abs=2 * tracker.speed_stdev)
+    assert not tracker.is_still
+
+
+def test_never_still_while_rolling_on():
+    # a ball that doesn't slow down like the model expects is still
+    # followed, and never taken for still
+    tracker = BallTracker()
+    for i in range(90):
+        t = i / FPS
+        x = 0.2 + (0.3 * t)
+        tracker.update({'x': x, 'y': 0.5}, t)
+        assert not tracker.is_still
+        assert tracker.position['x'] == pytest.approx(x, abs=0.02)
+
+
+def test_converges_on_a_slowing_ball():
+    # a ball rolling to a stop just like the model expects
+    tracker = BallTracker()
+    v0 = 1.0
+    rest_x = 0.2 + v0 * tracker.rest_time
+
+    def get_position(t):
+        decay = math.exp(-t / tracker.rest_time)
+        return {'x': 0.2 + v0 * tracker.rest_time * (1.0 - decay), 'y': 0.5}
+
+    still_at = None
+    for i in range(60):
+        t = i / FPS
+        track_speed = v0 * math.exp(-t / tracker.rest_time)
+        tracker.update(get_position(t), t)
+        if i >= 10:
+            assert tracker.velocity['x'] == pytest.approx(
+                track_speed, abs=0.05)
+            assert tracker.rest_position['x'] == pytest.approx(
+                rest_x, abs=0.02)
+        if tracker.is_still and still_at is None:
+            still_at = track_speed
+    # decided once slower than `still_speed`, well before it stopped
+    assert still_at is not None
+    assert still_at < tracker.still_speed
+
+
+def test_predictions_decay_with_rest_time():
+    rest_time = 0.4
+    f = _AxisFilter(0.0, NOISE, 3.0)
+    f.velocity = 1.0
+    f.predict(rest_time, rest_time, 0.0)
+    assert f.velocity == pytest.approx(math.exp(-1))
+    assert f.position == pytest.approx(rest_time * (1 - math.exp(-1)))
+    # predicting in two steps lands where one step does
+    a = _AxisFilter(0.0, NOISE, 3.0)
+    b = _AxisFilter(0.0, NOISE, 3.0)
+    a.velocity = b.velocity = 1.0
+    a.predict(0.3, rest_time, 0.0)
+    b.predict(0.1, rest_time, 0.0)
+    b.predict(0.2, rest_time, 0.0)
+    assert (a.position, a.velocity) == pytest.approx((b.position, b.velocity))
+    for row_a, row_b in zip(a.cov, b.cov):
+        assert row_a == pytest.approx(row_b)
+    # and stops at the rest position, however long it's predicted for
+    f = _AxisFilter(0.0, NOISE, 3.0)
+    f.velocity = 1.0
+    f.predict(100 * rest_time, rest_time, 0.0)
+    assert f.position == pytest.approx(rest_time)
+    assert f.velocity == pytest.approx(0.0)
+
+
+def test_still_ball():
+    tracker = BallTracker()
+    track(tracker, lambda t: {'x': 0.4, 'y': 0.6}, 10)
+    assert tracker.is_still
+    assert tracker.confidence >= tracker.still_confidence
+    assert tracker.rest_position['x'] == pytest.approx(0.4, abs=4 * NOISE)
+
+
+def test_lost_after_max_misses():
+    tracker = BallTracker(max_misses=2)
+    tracker.update({'x': 0.5, 'y': 0.5}, 0.0)
+    assert not tracker.miss()
+    assert not tracker.miss()
+    assert tracker.miss()
+    assert tracker.position is None
+    tracker.update({'x': 0.5, 'y': 0.5}, 1.0)
+    assert not tracker.is_lost
+    assert tracker.updates == 1
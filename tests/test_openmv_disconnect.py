@@ -0,0 +1,69 @@
+import asyncio
+import os
+import time
+
+import pytest
+import serial
+
+from utils import openmv_protocol
+from utils.openmv_mux import MuxCamera, OpenMVMultiplexer
+from utils.openmv_port_async import AsyncOpenMVPort
+
+FRAME = {'empty': True, 'moving': False, 'regions': []}
+
+
+class PipeSerial(object):
+    # the read end of a pipe, which reads zero bytes once the writer closes,
+    # the same as a serial port whose device went away
+    def __init__(self):
+        self._read, self.writer = os.pipe()
+        os.set_blocking(self._read, False)
+
+    def fileno(self):
+        return self._read
+
+    def close(self):
+        os.close(self._read)
+
+
+def test_async_port_fails_on_eof():
+    async def run():
+        port = AsyncOpenMVPort(port='pipe', timeout=5)
+        port._loop = asyncio.get_running_loop()
+        port._serial = PipeSerial()
+        port._loop.add_reader(port._serial.fileno(), port._on_readable)
+        os.write(port._serial.writer,
+                 openmv_protocol.encode_tictactoe(FRAME))
+        assert await port.read_json() == FRAME
+        os.close(port._serial.writer)
+        started = time.monotonic()
+        with pytest.raises(serial.SerialException):
+            await port.read_json()
+        # failed straight away, instead of timing out while busy-spinning
+        assert time.monotonic() - started < 1
+        assert not port._loop.remove_reader(port._serial.fileno())
+        port._serial.close()
+    asyncio.run(run())
+
+
+def test_mux_camera_fails_on_eof():
+    mux = OpenMVMultiplexer()
+    camera = MuxCamera('pipe', 'pipe', timeout=5)
+    camera._serial = PipeSerial()
+    mux._cameras[camera.name] = camera
+    mux._queue_change(('add', camera))
+    mux.start()
+    try:
+        os.write(camera._serial.writer,
+                 openmv_protocol.encode_tictactoe(FRAME))
+        assert camera.read_json()['empty']
+        os.close(camera._serial.writer)
+        started = time.monotonic()
+        with pytest.raises(serial.SerialException):
+            camera.read_json(newer_than=camera.frame_id)
+        assert time.monotonic() - started < 1
+        # no longer watched, so the selector doesn't wake up for it
+        with pytest.raises(KeyError):
+            mux._selector.get_key(camera.fileno())
+    finally:
+        mux.close()
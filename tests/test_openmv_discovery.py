@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from fake_devices import FakePort
+from utils import openmv_discovery, openmv_protocol
+from utils.openmv_port import OpenMVPort
+
+PROBE_TIMEOUT = 0.3
+
+
+def camera():
+    return FakePort(openmv_protocol.encode_tictactoe(
+        {'empty': True, 'moving': False, 'regions': []}))
+
+
+def silent():
+    return FakePort()
+
+
+def wrong_device():
+    return FakePort(b'ok V10 E22 some other device\r\n')
+
+
+@pytest.mark.parametrize('make_port, found', [
+    (camera, True), (silent, False), (wrong_device, False)])
+def test_probe_port(make_port, found):
+    with make_port() as port:
+        assert openmv_discovery.probe_port(
+            port.device, timeout=PROBE_TIMEOUT) == found
+
+
+def test_probe_missing_port():
+    assert not openmv_discovery.probe_port(
+        '/dev/does-not-exist', timeout=PROBE_TIMEOUT)
+
+
+def test_discover_finds_camera_among_others(tmp_path):
+    cache_path = str(tmp_path / 'openmv_port.json')
+    with silent() as a, wrong_device() as b, camera() as c:
+        device = openmv_discovery.discover_camera_port(
+            candidates=[a.device, b.device, c.device],
+            cache_path=cache_path, timeout=PROBE_TIMEOUT)
+        assert device == c.device
+        assert openmv_discovery.load_cached_identity(
+            cache_path)['device'] == c.device
+        # the cached port is tried first, and needs no other candidates,
+        # as long as it's the kind of port asked for (ptys have no USB ids)
+        assert openmv_discovery.discover_camera_port(
+            candidates=[], vid=None, pid=None, cache_path=cache_path,
+            timeout=PROBE_TIMEOUT) == c.device
+        with pytest.raises(RuntimeError):
+            openmv_discovery.discover_camera_port(
+                candidates=[], cache_path=cache_path, timeout=PROBE_TIMEOUT)
+
+
+def test_cache_only_used_for_the_camera_asked_for(tmp_path):
+    cache_path = str(tmp_path / 'openmv_port.json')
+    with camera() as a, camera() as b:
+        openmv_discovery.save_cached_identity(
+            {'device': a.device, 'serial_number': 'A'}, cache_path)
+        found = openmv_discovery.discover_camera_port(
+            candidates=[b.device], vid=None, pid=None, serial_number='B',
+            cache_path=cache_path, timeout=PROBE_TIMEOUT)
+        assert found == b.device
+        openmv_discovery.save_cached_identity(
+            {'device': a.device, 'serial_number': 'A'}, cache_path)
+        found = openmv_discovery.discover_camera_port(
+            candidates=[b.device], vid=None, pid=None, serial_number='A',
+            cache_path=cache_path, timeout=PROBE_TIMEOUT)
+        assert found == a.device
+
+
+def test_discover_without_camera_raises(tmp_path):
+    with silent() as a, wrong_device() as b:
+        with pytest.raises(RuntimeError):
+            openmv_discovery.discover_camera_port(
+                candidates=[a.device, b.device],
+                cache_path=str(tmp_path / 'openmv_port.json'),
+                timeout=PROBE_TIMEOUT)
+
+
+def test_port_only_probes_when_asked(tmp_path):
+    started = time.monotonic()
+    port = OpenMVPort()
+    assert port.port is None
+    assert time.monotonic() - started < PROBE_TIMEOUT
+    with camera() as c:
+        assert port.find_port(
+            candidates=[c.device], cache_path=str(tmp_path / 'cache.json'),
+            timeout=PROBE_TIMEOUT) == c.device
+    assert port.port == c.device
@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+
+import pytest
+
+from fake_devices import FakePort
+from utils.openmv_port import OpenMVPort
+from utils.openmv_recorder import load_recording
+
+FRAME = {'empty': False, 'position': {'x': 0.5, 'y': 0.25}, 'moving': False}
+
+
+def camera():
+    return FakePort(json.dumps(FRAME).encode() + b'\n')
+
+
+def test_stream_read_without_timeout():
+    with camera() as c:
+        port = OpenMVPort(port=c.device, timeout=None, stream=True)
+        try:
+            assert port.read_json()['position'] == FRAME['position']
+            assert port.read_json(newer_than=port.frame_id)['empty'] is False
+        finally:
+            port.stop_stream()
+
+
+@pytest.mark.parametrize('protocol', ['json', 'binary'])
+def test_read_without_timeout(protocol):
+    with camera() as c:
+        port = OpenMVPort(port=c.device, timeout=None, protocol=protocol)
+        data = port.read_json(captured_after=time.monotonic())
+        assert data['position'] == FRAME['position']
+        assert port.wait_for(lambda frame: True, timeout=1)['empty'] is False
+
+
+def test_stream_wait_for_without_timeout():
+    with camera() as c:
+        port = OpenMVPort(port=c.device, timeout=None, stream=True)
+        try:
+            assert port.wait_for(
+                lambda frame: not frame['empty'], timeout=1) is not None
+            assert port.wait_for(lambda frame: False, timeout=0.1) is None
+        finally:
+            port.stop_stream()
+
+
+def test_close_stops_stream_on_silent_camera():
+    with FakePort() as c:
+        port = OpenMVPort(port=c.device, timeout=None, stream=True)
+        port.start_stream()
+        closer = threading.Thread(target=port.close, daemon=True)
+        closer.start()
+        closer.join(2)
+        assert not closer.is_alive()
+        assert not port.is_streaming
+
+
+def test_close_closes_recorder(tmp_path):
+    path = str(tmp_path / 'recording.txt')
+    with camera() as c:
+        port = OpenMVPort(port=c.device, record_path=path)
+        port.read_json()
+        port.read_json()
+        recorder = port._recorder
+        port.close()
+    assert recorder._file.closed
+    assert len(load_recording(path)) >= 2
@@ -0,0 +1,162 @@
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from camera_frames import (
+    CameraOutput, ball_frame, blank_frame, grid_frame, run_camera)
+from utils import openmv_protocol
+from utils.openmv_protocol import FrameDecoder
+
+
+def decode(data):
+    decoder = FrameDecoder()
+    decoder.feed(data)
+    frames = list(decoder.frames())
+    assert decoder.crc_errors == 0
+    return frames
+
+
+@pytest.mark.parametrize('num_regions', [9, 16])
+def test_tictactoe_regions_round_trip(num_regions):
+    rand = random.Random(num_regions)
+    data = {
+        'empty': False,
+        'moving': True,
+        'regions': [rand.random() < 0.5 for i in range(num_regions)],
+        'seq': 12,
+        'time': 3456
+    }
+    frames = decode(openmv_protocol.encode_tictactoe(data))
+    assert frames == [data]
+
+
+def test_tictactoe_without_regions_round_trip():
+    data = {'empty': True, 'moving': False, 'regions': []}
+    assert decode(openmv_protocol.encode_tictactoe(data)) == [data]
+
+
+def test_tictactoe_too_many_regions():
+    data = {'empty': False, 'moving': False, 'regions': [True] * 17}
+    with pytest.raises(ValueError):
+        openmv_protocol.encode_tictactoe(data)
+
+
+def test_tictactoe_camera_frame_decodes():
+    # laid out the way `tictactoe_openmv.py` sends it, for a 4x4 board
+    regions = [i % 3 == 0 for i in range(16)]
+    bitmap = sum(1 << i for i, filled in enumerate(regions) if filled)
+    payload = struct.pack(
+        '<BBHII', openmv_protocol.OPENMV_PROTOCOL_FLAG_REGIONS, 16, bitmap,
+        7, 89)
+    frame = openmv_protocol.encode_frame(
+        openmv_protocol.OPENMV_PROTOCOL_TYPE_TICTACTOE, payload)
+    assert decode(frame) == [{
+        'empty': False, 'moving': False, 'regions': regions,
+        'seq': 7, 'time': 89
+    }]
+
+
+TICTACTOE_SCRIPT = 'tictactoe/tictactoe_openmv.py'
+BALL_SCRIPT = 'basketball/basketball_openmv.py'
+EVENT_HEARTBEAT_MS = 1000
+
+
+def tictactoe_frames():
+    frames = [blank_frame()] * 3 + [grid_frame([0, 4])] * 12
+    frames += [grid_frame([0, 4], hand_y=10 + (20 * i)) for i in range(3)]
+    return frames + [grid_frame([0, 4, 8])] * 12
+
+
+def ball_frames():
+    frames = [ball_frame(130 + (7 * i), 120) for i in range(8)]
+    frames += [ball_frame(179, 123)] * 25
+    # positions the host rounds up when packing them, e.g. 0.57
+    frames += [ball_frame(176, 140)] * 3 + [ball_frame(200, 100)] * 3
+    no_ball = np.full_like(frames[0], 120)
+    return frames + [no_ball] * 3 + [ball_frame(150, 101)] * 3
+
+
+def tictactoe_event_key(frame):
+    return (frame['empty'], frame['moving'], tuple(frame['regions']))
+
+
+def ball_event_key(frame):
+    return (frame['empty'], frame['moving'],
+            frame['position']['x'], frame['position']['y'])
+
+
+CAMERAS = [
+    (TICTACTOE_SCRIPT, tictactoe_frames, tictactoe_event_key),
+    (BALL_SCRIPT, ball_frames, ball_event_key)]
+ENCODERS = {
+    TICTACTOE_SCRIPT: openmv_protocol.encode_tictactoe,
+    BALL_SCRIPT: openmv_protocol.encode_ball}
+
+
+def without_time(frame):
+    # the capture time is the host's clock, so differs between runs
+    return {k: v for k, v in frame.items() if k != 'time'}
+
+
+@pytest.mark.parametrize('script, get_frames, event_key', CAMERAS)
+def test_camera_binary_frames_match_json(tmp_path, script, get_frames,
+                                         event_key):
+    frames = get_frames()
+    sent_json = run_camera(script, frames, tmp_path)
+    output = CameraOutput()
+    sent_binary = run_camera(
+        script, frames, tmp_path, requests=[b'BIN'], output=output)
+    # only binary frames were sent, byte for byte what the host would
+    # encode, and they hold the same readings
+    encode = ENCODERS[script]
+    assert bytes(output.data) == b''.join(encode(f) for f in sent_binary)
+    assert len(sent_binary) == len(sent_json) == len(frames)
+    assert [f['seq'] for f in sent_binary] == list(range(1, len(frames) + 1))
+    assert [without_time(f) for f in sent_binary] == [
+        without_time(f) for f in sent_json]
+    # the readings change during the run, so more than one kind was sent
+    assert len(set(event_key(f) for f in sent_binary)) > 2
+
+
+@pytest.mark.parametrize('script, get_frames, event_key', CAMERAS)
+def test_camera_binary_events(tmp_path, script, get_frames, event_key):
+    frames = get_frames()
+    every = run_camera(script, frames, tmp_path)
+    events = run_camera(
+        script, frames, tmp_path, requests=[b'BIN', b'EVENTS'])
+    # every change is sent
+    sent_seqs = set(f['seq'] for f in events)
+    prev = None
+    for f in every:
+        if event_key(f) != prev:
+            assert f['seq'] in sent_seqs
+        prev = event_key(f)
+    # and otherwise, only a heartbeat to show the camera's still there
+    assert len(events) < len(every)
+    by_seq = {f['seq']: without_time(f) for f in every}
+    for a, b in zip(events, events[1:]):
+        assert without_time(b) == by_seq[b['seq']]
+        if event_key(a) == event_key(b):
+            assert b['time'] - a['time'] >= EVENT_HEARTBEAT_MS
+
+
+@pytest.mark.parametrize('script, get_frames, event_key', CAMERAS)
+@pytest.mark.parametrize('requests, binary, num_sent', [
+    ([b'BIN', b'JSON'], False, 5), ([b'JSON', b'BIN'], True, 5),
+    ([b'EVENTS', b'FRAMES'], False, 5), ([b'FRAMES', b'BIN', b'EVENTS'],
+                                          True, None)])
+def test_camera_last_request_wins(tmp_path, script, get_frames, event_key,
+                                  requests, binary, num_sent):
+    # requests that arrive together are read at once, before the first frame
+    frames = get_frames()[-5:]
+    output = CameraOutput()
+    sent = run_camera(script, frames, tmp_path, requests, output=output)
+    encode = ENCODERS[script]
+    assert (bytes(output.data) == b''.join(encode(f) for f in sent)) == binary
+    if num_sent is None:
+        # only changes, and some of these frames look the same
+        assert len(sent) < len(frames)
+    else:
+        assert len(sent) == num_sent
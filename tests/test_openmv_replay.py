@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from utils.openmv_port import OpenMVPort
+from utils.openmv_replay import OpenMVReplayPort
+
+
+def recording(num_frames=5, period=0.05):
+    return [(i * period, {'empty': False, 'moving': False, 'seq': i})
+            for i in range(num_frames)]
+
+
+def test_timeout_defaults_like_the_port():
+    port = OpenMVReplayPort(frames=recording())
+    assert port.timeout == OpenMVPort(port=None).timeout == 2
+
+
+def test_fast_read_skips_frames_already_seen():
+    port = OpenMVReplayPort(frames=recording(), speed=None)
+    assert port.read_json()['seq'] == 0
+    # frames up to the `newer_than` frame_id are gone, like in real time
+    assert port.read_json(newer_than=3)['seq'] == 3
+    assert port.frame_id == 4
+    # and older ones don't come back
+    assert port.read_json(newer_than=1)['seq'] == 4
+
+
+def test_fast_read_past_the_end():
+    port = OpenMVReplayPort(frames=recording(), speed=None)
+    with pytest.raises(RuntimeError, match='no data'):
+        port.read_json(newer_than=5)
+    port = OpenMVReplayPort(frames=recording(), speed=None, loop=True)
+    assert port.read_json(newer_than=6)['seq'] == 1
+
+
+def test_fast_read_waits_for_captured_after():
+    port = OpenMVReplayPort(frames=recording(), speed=None)
+    captured_after = time.monotonic() + 0.1
+    data = port.read_json(captured_after=captured_after)
+    assert data['capture_time'] >= captured_after
+    # but not for longer than the camera would
+    port = OpenMVReplayPort(frames=recording(), speed=None, timeout=0.05)
+    with pytest.raises(RuntimeError, match='new enough'):
+        port.read_json(captured_after=time.monotonic() + 1)
+
+
+def test_fast_wait_for_tests_every_frame():
+    port = OpenMVReplayPort(frames=recording(), speed=None)
+    seen = []
+
+    def predicate(frame):
+        seen.append(frame['seq'])
+        return frame['seq'] == 3
+
+    assert port.wait_for(predicate, timeout=1)['seq'] == 3
+    assert seen == [0, 1, 2, 3]
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+pytest.importorskip('uarm')
+import tictactoe_uarm as t
+
+
+CENTER = {'x': 200.0, 'y': 10.0, 'z': 30.0}
+TOLERANCES = [0.05, 0.1, 0.25, 0.5, 1.0]
+
+
+@pytest.mark.parametrize('radius', [2.0, 5.0, 9.0, 20.0, 60.0])
+def test_circles_stay_within_tolerance(radius):
+    counts = []
+    for tolerance in TOLERANCES:
+        points = t.get_circle_coords(CENTER, radius, tolerance=tolerance)
+        assert t.get_arc_deviation(CENTER, radius, points) <= tolerance
+        counts.append(len(points))
+    # looser tolerances never need more points
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] > counts[-1]
+
+
+@pytest.mark.parametrize('happy', [True, False])
+def test_mouth_arc_stays_within_tolerance(happy):
+    mouth_radius = t.play_grid['square_size'] * 0.3 * 0.6
+    start, end = 0, math.pi
+    if not happy:
+        start, end = end, start
+    counts = []
+    for tolerance in TOLERANCES:
+        points = t.get_circle_coords(
+            CENTER, mouth_radius, start_rad=start, end_rad=end,
+            tolerance=tolerance)
+        assert t.get_arc_deviation(CENTER, mouth_radius, points) <= tolerance
+        # half a circle, ending where it should
+        assert points[-1]['x'] == pytest.approx(
+            CENTER['x'] + mouth_radius * math.sin(start + math.pi), abs=1e-6)
+        counts.append(len(points))
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] > counts[-1]
+
+
+def test_default_tolerance_is_arc_tolerance():
+    radius = 9.0
+    points = t.get_circle_coords(CENTER, radius)
+    assert t.get_arc_deviation(CENTER, radius, points) <= t.arc_tolerance
@@ -0,0 +1,164 @@
+import itertools
+import random
+
+import pytest
+
+import tictactoe_board
+from tictactoe_board import (
+    Board, EMPTY, NUM_SQUARES, PLAYERS, camera_to_mask, mask_to_camera,
+    popcount)
+
+# the list-based board this replaced, kept as a reference
+old_winning_sequences = [
+    (0, 1, 2), # top
+    (0, 4, 8), # cross
+    (0, 3, 6), # left
+    (1, 4, 7), # center-vertical
+    (2, 5, 8), # right
+    (2, 4, 6), # cross
+    (3, 4, 5), # center-horizontal
+    (6, 7, 8)  # bottom
+]
+
+
+def old_get_winner_indices(regions):
+    for idx, m in enumerate(regions):
+        for seq in old_winning_sequences:
+            if idx == seq[0] and m != EMPTY:
+                matches = sum([1 if regions[i] == m else 0 for i in seq])
+                if matches == len(seq):
+                    return seq
+    return None
+
+
+def old_get_number_mismatch(old_regions, new_regions):
+    return sum(
+        1 for old, new in zip(old_regions, new_regions) if not old and new)
+
+
+def old_convert_camera_regions(old_regions, new_regions, user_mark):
+    converted_regions = []
+    for i, v in enumerate(old_regions):
+        if new_regions[i]:
+            if old_regions[i] != EMPTY:
+                converted_regions.append(int(old_regions[i]))
+            else:
+                converted_regions.append(user_mark)
+        else:
+            converted_regions.append(EMPTY)
+    return converted_regions
+
+
+ALL_MARKS = [list(m) for m in itertools.product(
+    [EMPTY] + list(PLAYERS), repeat=NUM_SQUARES)]
+
+
+@pytest.mark.parametrize('size, win_length, num_lines', [
+    (3, 3, 8), (4, 4, 10), (4, 3, 24), (5, 4, 28)])
+def test_every_line_wins(size, win_length, num_lines):
+    lines = tictactoe_board.get_win_lines(size, win_length)
+    assert len(lines) == num_lines
+    assert len(set(lines)) == num_lines
+    for line in lines:
+        for player in PLAYERS:
+            board = Board(size=size, win_length=win_length)
+            for idx in line[:-1]:
+                board[idx] = player
+            assert board.winner() is None
+            board[line[-1]] = player
+            assert board.winner() == (player, line)
+            assert board.winning_line() == line
+
+
+def test_win_length_larger_than_board():
+    with pytest.raises(ValueError):
+        tictactoe_board.get_win_lines(3, 4)
+
+
+def test_move_and_undo_round_trip():
+    rng = random.Random(0)
+    for size in (3, 4):
+        board = Board(size=size)
+        for game in range(50):
+            history = []
+            for idx in rng.sample(board.empties(), board.num_squares):
+                before = (board.copy(), board.key())
+                player = PLAYERS[len(history) % 2]
+                count = board.count(player)
+                board[idx] = player
+                assert board[idx] == player
+                assert board.count(player) == count + 1
+                history.append((idx, before))
+            for idx, (copy, key) in reversed(history):
+                board[idx] = EMPTY
+                assert board == copy
+                assert board.key() == key
+            assert board.is_empty()
+            assert board.key() == 0
+
+
+def test_regions_off_the_board():
+    board = Board()
+    with pytest.raises(IndexError):
+        board[NUM_SQUARES]
+    with pytest.raises(IndexError):
+        board[-1] = PLAYERS[0]
+    with pytest.raises(ValueError):
+        Board.from_marks([EMPTY] * 8)
+
+
+def test_parity_with_list_board():
+    for marks in ALL_MARKS:
+        board = Board.from_marks(marks)
+        assert board.to_marks() == marks
+        assert list(board) == marks
+        assert board.key() == sum(m * (3 ** i) for i, m in enumerate(marks))
+        assert board.is_full() == (EMPTY not in marks)
+        assert board.is_empty() == (set(marks) == {EMPTY})
+        assert board.empties() == [
+            i for i, m in enumerate(marks) if m == EMPTY]
+        assert board.to_camera() == [m != EMPTY for m in marks]
+        old = old_get_winner_indices(marks)
+        win = board.winner()
+        if old is None:
+            assert win is None
+            continue
+        player, line = win
+        assert all(marks[i] == player for i in line)
+        complete = [
+            seq for seq in old_winning_sequences
+            if marks[seq[0]] != EMPTY and
+            marks[seq[0]] == marks[seq[1]] == marks[seq[2]]]
+        if len(complete) == 1:
+            # with two lines done at once, either one is a fine answer
+            assert line == old
+
+
+def test_camera_parity_with_list_board():
+    rng = random.Random(1)
+    for marks in rng.sample(ALL_MARKS, 2000):
+        board = Board.from_marks(marks)
+        regions = [rng.random() < 0.5 for i in range(NUM_SQUARES)]
+        camera_mask = camera_to_mask(regions)
+        assert mask_to_camera(camera_mask) == regions
+        assert popcount(board.added(camera_mask)) == old_get_number_mismatch(
+            marks, regions)
+        assert popcount(board.removed(camera_mask)) == sum(
+            1 for m, r in zip(marks, regions) if m != EMPTY and not r)
+
+
+def test_camera_regions_convert_like_list_board():
+    pytest.importorskip('uarm')
+    import tictactoe_uarm
+    rng = random.Random(2)
+    for marks in rng.sample(ALL_MARKS, 2000):
+        board = Board.from_marks(marks)
+        regions = [rng.random() < 0.5 for i in range(NUM_SQUARES)]
+        assert tictactoe_uarm.get_number_mismatch(
+            board, regions) == old_get_number_mismatch(marks, regions)
+        converted = tictactoe_uarm.convert_camera_regions(
+            board, regions, tictactoe_uarm.user_mark)
+        assert converted.to_marks() == old_convert_camera_regions(
+            marks, regions, tictactoe_uarm.user_mark)
+        assert tictactoe_uarm.get_winner_indices(converted) == (
+            converted.winning_line())
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+import tictactoe_solver as solver
+from tictactoe_board import Board, EMPTY, NUM_SQUARES, PLAYERS
+from tictactoe_engine import GameEngine, WIN_SCORE
+
+# long enough that a 3x3 search always runs to the end
+SOLVE_BUDGET_SEC = 60
+
+
+def get_reachable():
+    # every (board, player to move) of an unfinished 3x3 game, either
+    # player going first
+    positions = {}
+
+    def visit(board, player):
+        key = (tuple(board), player)
+        if key in positions:
+            return
+        if solver.get_winner(board) is not None or EMPTY not in board:
+            return
+        positions[key] = list(board)
+        for i in range(NUM_SQUARES):
+            if board[i] == EMPTY:
+                board[i] = player
+                visit(board, solver.other_player(player))
+                board[i] = EMPTY
+
+    for first in PLAYERS:
+        visit([EMPTY] * NUM_SQUARES, first)
+    return positions
+
+
+def expected_score(marks, player):
+    # the solver scores a position by how many regions are left empty when
+    # it ends, the engine by how many moves it takes to get there
+    value = solver.perfect_play_table._value(list(marks), player)
+    empties = marks.count(EMPTY)
+    if value > 0:
+        return WIN_SCORE - empties + value
+    if value < 0:
+        return -WIN_SCORE + empties + value
+    return 0
+
+
+def test_engine_matches_solver_on_every_reachable_position():
+    engine = GameEngine()
+    for (key, player), marks in get_reachable().items():
+        move, score, depth = engine.search(
+            Board.from_marks(marks), player, time_budget=SOLVE_BUDGET_SEC,
+            tie_break=False)
+        assert move in solver.perfect_play_table.best_moves(marks, player), (
+            marks, player)
+        assert score == expected_score(marks, player), (marks, player)
+
+
+def test_engine_prefers_the_fastest_win():
+    # X can win now at 4, or later with a fork at 2 or 6
+    marks = [1, 2, 0,
+             0, 0, 0,
+             0, 2, 1]
+    engine = GameEngine()
+    move, score, depth = engine.search(
+        Board.from_marks(marks), 1, time_budget=SOLVE_BUDGET_SEC)
+    assert move == 4
+    assert score == WIN_SCORE
+    assert depth == 1
+    # no win now, but a fork at 4 wins on X's next move
+    marks = [1, 2, 1,
+             0, 0, 0,
+             0, 2, 0]
+    move, score, depth = engine.search(
+        Board.from_marks(marks), 1, time_budget=SOLVE_BUDGET_SEC)
+    assert move == 4
+    assert score == WIN_SCORE - 2
+
+
+def test_engine_reuses_its_table_without_missing_quicker_wins():
+    # an earlier search leaves slower wins in the table, which mustn't stop
+    # a later search before it finds a quicker one
+    engine = GameEngine()
+    marks = [2, 1, 0,
+             2, 0, 0,
+             1, 0, 0]
+    engine.search(Board.from_marks([2, 1, 0, 2, 0, 1, 0, 0, 0]), 1,
+                  time_budget=SOLVE_BUDGET_SEC, tie_break=False)
+    move, score, depth = engine.search(
+        Board.from_marks(marks), 1, time_budget=SOLVE_BUDGET_SEC,
+        tie_break=False)
+    assert move in solver.perfect_play_table.best_moves(marks, 1)
+    assert score == WIN_SCORE - 2
+
+
+def test_engine_keeps_to_its_time_budget_on_4x4():
+    engine = GameEngine(size=4)
+    board = engine.new_board()
+    budget = 0.2
+    started = time.perf_counter()
+    move, score, depth = engine.search(board, 1, time_budget=budget)
+    elapsed = time.perf_counter() - started
+    assert elapsed < budget + 0.1
+    # 4x4 can't be solved in that time, but a move is still chosen
+    assert move in board.empties()
+    assert 1 <= depth < board.num_squares
+    assert engine.best_move(engine.new_board(), 1, time_budget=budget) in (
+        board.empties())
+
+
+def test_engine_with_no_moves_left():
+    engine = GameEngine()
+    assert engine.search(Board.from_marks([1, 1, 1, 2, 2, 0, 0, 0, 0]), 2) == (
+        None, None, 0)
+    full = Board.from_marks([1, 2, 1, 1, 2, 2, 2, 1, 1])
+    assert engine.best_move(full, 1) is None
+
+
+@pytest.mark.parametrize('player', PLAYERS)
+def test_engine_takes_a_win_on_4x4(player):
+    engine = GameEngine(size=4)
+    board = engine.new_board()
+    for i in (0, 1, 2):
+        board[i] = player
+    for i in (4, 5, 6):
+        board[i] = solver.other_player(player)
+    assert engine.best_move(board, player, time_budget=1.0) == 3
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from camera_frames import (
+    FRAME_HEIGHT, FRAME_WIDTH, INK, blank_frame, grid_frame, run_camera)
+from tictactoe_regions import RegionClassifier
+
+SCRIPT = 'tictactoe/tictactoe_openmv.py'
+
+
+def get_filled(state):
+    return [i for i, filled in enumerate(state['regions']) if filled]
+
+
+@pytest.mark.parametrize('first, second', [
+    ([0, 4], [0, 4, 8]), ([1, 3, 5, 7], [1, 2, 3, 5, 7]),
+    ([4], [4, 6]), (list(range(9)), list(range(9)))])
+def test_camera_matches_region_classifier(tmp_path, first, second):
+    frames = [blank_frame()] * 3
+    frames += [grid_frame(first)] * 14
+    frames += [grid_frame(first, hand_y=10 + (20 * i)) for i in range(5)]
+    frames += [grid_frame(second)] * 14
+    sent = run_camera(SCRIPT, frames, tmp_path)
+    expected = RegionClassifier().classify(np.stack(frames))
+    assert len(sent) == len(expected) == len(frames)
+    for i, (s, e) in enumerate(zip(sent, expected)):
+        assert s['seq'] == i + 1
+        assert (s['empty'], s['moving'], s['regions']) == (
+            e['empty'], e['moving'], e['regions']), i
+    # and both saw what was drawn, once the paper was still for long enough
+    assert all(s['empty'] for s in sent[:3])
+    still = [s for s in sent if not s['empty'] and not s['moving']]
+    assert still
+    assert {tuple(get_filled(s)) for s in still[:4]} == {tuple(first)}
+    assert get_filled(sent[-1]) == second
+
+
+def speckled_frame(rng, num_dots=25):
+    # small dots all over the paper, many near the edges of regions, so
+    # any difference in where the regions are changes which are filled
+    frame = blank_frame()
+    for i in range(num_dots):
+        x = rng.randint(30, FRAME_WIDTH - 30)
+        y = rng.randint(30, FRAME_HEIGHT - 30)
+        frame[y:y + 3, x:x + 3] = INK
+    return frame
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_camera_matches_region_classifier_near_region_edges(tmp_path, seed):
+    rng = np.random.RandomState(seed)
+    frames = []
+    for i in range(4):
+        frames += [speckled_frame(rng)] * 12
+    sent = run_camera(SCRIPT, frames, tmp_path)
+    expected = RegionClassifier().classify(np.stack(frames))
+    for i, (s, e) in enumerate(zip(sent, expected)):
+        assert (s['empty'], s['moving'], s['regions']) == (
+            e['empty'], e['moving'], e['regions']), i
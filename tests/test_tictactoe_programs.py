@@ -0,0 +1,47 @@
+import pytest
+
+import tictactoe_programs
+from tictactoe_programs import MotionProgram, ProgramCache
+
+
+def test_translate_and_join():
+    a = MotionProgram(((0, 0, 10, False), (1, 2, 0, True)), 1, 3.0)
+    b = tictactoe_programs.translate_program(a, (5, -5))
+    assert b.moves == ((5, -5, 10, False), (6, -3, 0, True))
+    assert (b.strokes, b.saved_distance) == (1, 3.0)
+    joined = tictactoe_programs.join_programs([a, b])
+    assert joined.moves == a.moves + b.moves
+    assert (joined.strokes, joined.saved_distance) == (2, 6.0)
+
+
+@pytest.fixture
+def t(monkeypatch):
+    pytest.importorskip('uarm')
+    import tictactoe_uarm
+    monkeypatch.setattr(tictactoe_uarm, 'program_cache', ProgramCache())
+    return tictactoe_uarm
+
+
+def test_face_is_cached_once_for_every_region(t):
+    first = t.get_face_program(0, True)
+    for idx in list(range(1, t.num_squares)) + [None]:
+        program = t.get_face_program(idx, True)
+        a = t.get_face_location(0)
+        b = t.get_face_location(idx)
+        expected = tictactoe_programs.translate_program(
+            first, (b['x'] - a['x'], b['y'] - a['y']))
+        assert len(program.moves) == len(expected.moves)
+        for move, expected_move in zip(program.moves, expected.moves):
+            assert move == pytest.approx(expected_move)
+    assert t.program_cache.misses == 1
+    t.get_face_program(0, False)
+    assert t.program_cache.misses == 2
+
+
+def test_region_locations_are_updated_on_a_hit(t):
+    t.get_drawing_program(('mark', 0, 'x'), lambda: [t.get_mark_coords(0, 'x')])
+    expected = [loc.copy() for loc in t.region_locations]
+    t.region_locations[0]['x'] += 50
+    t.get_drawing_program(('mark', 0, 'x'), lambda: [t.get_mark_coords(0, 'x')])
+    assert t.program_cache.hits == 1
+    assert t.region_locations == expected
@@ -0,0 +1,96 @@
+import pytest
+
+import tictactoe_solver as solver
+from tictactoe_board import EMPTY, NUM_SQUARES, PLAYERS
+
+
+def get_reachable():
+    # every (board, player to move) of an unfinished game, either player
+    # going first
+    positions = {}
+
+    def visit(board, player):
+        key = (tuple(board), player)
+        if key in positions:
+            return
+        if solver.get_winner(board) is not None or EMPTY not in board:
+            return
+        positions[key] = list(board)
+        for i in range(NUM_SQUARES):
+            if board[i] == EMPTY:
+                board[i] = player
+                visit(board, solver.other_player(player))
+                board[i] = EMPTY
+
+    for first in PLAYERS:
+        visit([EMPTY] * NUM_SQUARES, first)
+    return positions
+
+
+REACHABLE = get_reachable()
+
+
+def count_losses(board, player, solver_player):
+    # plays every best move for the solver against every reply, returning
+    # how many of those games the solver lost
+    winner = solver.get_winner(board)
+    if winner is not None:
+        return int(winner != solver_player)
+    if EMPTY not in board:
+        return 0
+    if player == solver_player:
+        moves = solver.perfect_play_table.best_moves(board, player)
+        assert moves
+    else:
+        moves = [i for i in range(NUM_SQUARES) if board[i] == EMPTY]
+    losses = 0
+    for i in moves:
+        board[i] = player
+        losses += count_losses(
+            board, solver.other_player(player), solver_player)
+        board[i] = EMPTY
+    return losses
+
+
+@pytest.mark.parametrize('solver_player', PLAYERS)
+@pytest.mark.parametrize('first', PLAYERS)
+def test_solver_never_loses(solver_player, first):
+    assert count_losses([EMPTY] * NUM_SQUARES, first, solver_player) == 0
+
+
+def test_solver_takes_a_win_and_blocks_a_loss():
+    board = [1, 1, 0,
+             2, 2, 0,
+             0, 0, 0]
+    assert solver.perfect_play_table.best_moves(board, 1) == [2]
+    assert solver.perfect_play_table.best_moves(board, 2) == [5]
+    board = [1, 1, 0,
+             0, 2, 0,
+             0, 0, 0]
+    assert solver.perfect_play_table.best_moves(board, 2) == [2]
+
+
+def test_symmetric_positions_get_symmetric_moves():
+    table = solver.perfect_play_table
+    for (key, player), board in REACHABLE.items():
+        best = set(table.best_moves(board, player))
+        for sym in solver.SYMMETRIES:
+            # `permuted[i] = board[sym[i]]`, so a move at `sym[i]` on the
+            # board is a move at `i` on the permuted one
+            permuted = [board[sym[i]] for i in range(NUM_SQUARES)]
+            expected = {i for i in range(NUM_SQUARES) if sym[i] in best}
+            assert set(table.best_moves(permuted, player)) == expected
+
+
+def test_every_reachable_position_is_in_the_table():
+    for (key, player), board in REACHABLE.items():
+        assert solver.perfect_play_table._tables[player][
+            solver.encode(board)]
+
+
+def test_get_best_move_without_tie_break_is_the_first_best():
+    board = [EMPTY] * NUM_SQUARES
+    best = solver.perfect_play_table.best_moves(board, 1)
+    assert solver.get_best_move(board, 1, tie_break=False) == best[0]
+    assert solver.get_best_move(board, 1) in best
+    assert solver.get_best_move([1, 1, 1, 2, 2, 0, 0, 0, 0], 2) is None
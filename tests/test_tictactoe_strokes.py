@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+import tictactoe_strokes
+from tictactoe_strokes import JOIN_DISTANCE, plan_strokes
+
+HOVER_HEIGHT = 5
+PAPER_Z = 23
+
+
+def point(x, y, drawing=True):
+    return {'x': x, 'y': y, 'z': PAPER_Z, 'drawing': drawing}
+
+
+def random_shapes(rng, num_shapes):
+    # shapes of a few separate strokes each, with pen-up points between
+    shapes = []
+    for s in range(num_shapes):
+        points = []
+        for i in range(rng.randint(1, 3)):
+            x, y = rng.uniform(100, 200), rng.uniform(-60, 60)
+            points.append(point(x, y, drawing=False))
+            for j in range(rng.randint(2, 5)):
+                x += rng.uniform(-10, 10)
+                y += rng.uniform(-10, 10)
+                points.append(point(round(x, 3), round(y, 3)))
+        shapes.append(points)
+    return shapes
+
+
+def get_travel(strokes, order, start):
+    total = 0
+    pos = start
+    for item in order:
+        begin, end = tictactoe_strokes._ends(strokes, item)
+        total += tictactoe_strokes._travel(pos, begin)
+        pos = end
+    return total
+
+
+def get_segments(points):
+    # every pen-down line drawn, in either direction
+    segments = []
+    for a, b in zip(points, points[1:]):
+        if a.get('drawing') and b.get('drawing'):
+            a, b = (a['x'], a['y']), (b['x'], b['y'])
+            segments.append(tuple(sorted([a, b])))
+    return sorted(segments)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_2opt_is_never_longer_than_greedy(seed):
+    rng = random.Random(seed)
+    strokes = []
+    for points in random_shapes(rng, 6):
+        strokes += tictactoe_strokes.split_strokes(points)
+    start = point(145, 0, drawing=False)
+    greedy = tictactoe_strokes._order_greedy(strokes, start)
+    improved = tictactoe_strokes._improve_2opt(strokes, list(greedy), start)
+    assert sorted(i for i, rev in improved) == list(range(len(strokes)))
+    assert get_travel(strokes, improved, start) <= (
+        get_travel(strokes, greedy, start) + 1e-9)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_every_stroke_is_drawn_once(seed):
+    rng = random.Random(seed)
+    shapes = random_shapes(rng, 5)
+    planned, report = plan_strokes(
+        shapes, HOVER_HEIGHT, start=point(145, 0, drawing=False))
+    drawn = []
+    for points in shapes:
+        drawn += points
+    assert get_segments(planned) == get_segments(drawn)
+    assert report['strokes'] == sum(
+        len(tictactoe_strokes.split_strokes(points)) for points in shapes)
+    assert report['pen_up_after'] <= report['pen_up_before'] + 1e-9
+    # the input isn't changed
+    assert shapes == random_shapes(random.Random(seed), 5)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_pen_lifts_between_strokes(seed):
+    rng = random.Random(seed)
+    planned, report = plan_strokes(
+        random_shapes(rng, 5), HOVER_HEIGHT,
+        start=point(145, 0, drawing=False))
+    assert planned[0].get('drawing') and planned[-1].get('drawing')
+    i = 0
+    while i < len(planned):
+        if planned[i].get('drawing'):
+            i += 1
+            continue
+        # a lift above the last stroke's end, then a hover above the next
+        # stroke's start, and nothing in between
+        prev, up, over, down = planned[i - 1:i + 3]
+        assert not over.get('drawing') and down.get('drawing')
+        for hover, below in [(up, prev), (over, down)]:
+            assert (hover['x'], hover['y']) == (below['x'], below['y'])
+            assert hover['z'] == below['z'] + HOVER_HEIGHT
+        assert tictactoe_strokes.get_distance(prev, down) > JOIN_DISTANCE
+        i += 2
+
+
+def test_touching_strokes_are_drawn_without_lifting():
+    # an L drawn as two strokes meeting at a corner, the second one
+    # drawn backwards
+    shapes = [
+        [point(0, 0, drawing=False), point(0, 0), point(10, 0)],
+        [point(10, 10, drawing=False), point(10, 10), point(10, 0)]]
+    planned, report = plan_strokes(
+        shapes, HOVER_HEIGHT, start=point(0, 0, drawing=False))
+    assert all(p.get('drawing') for p in planned)
+    assert [(p['x'], p['y']) for p in planned] == [(0, 0), (10, 0), (10, 10)]
+    assert report['strokes'] == 2
+    assert report['saved_distance'] > 0
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from utils.openmv_replay import OpenMVReplayPort
+
+# the arm arrives between the 3rd and 4th frames
+FRAME_PERIOD = 0.05
+TRAVEL_TIME = 0.125
+
+A = [True, False, False, False, True, False, False, False, False]
+B = [True, False, False, False, True, False, False, False, True]
+
+
+@pytest.fixture
+def t():
+    pytest.importorskip('uarm')
+    import tictactoe_uarm
+    return tictactoe_uarm
+
+
+class TravellingBot(object):
+    # takes a while to reach the observer position, like the arm
+
+    def __init__(self, error=None):
+        self.error = error
+        self.arrival = None
+
+    def move_to(self, **kwargs):
+        if self.error:
+            raise self.error
+
+    def rotate_to(self, angle):
+        pass
+
+    def wait_for_arrival(self):
+        time.sleep(TRAVEL_TIME)
+        self.arrival = time.monotonic()
+
+
+def replay(states):
+    # a camera sending `states` (a list of regions, or None while moving)
+    # every FRAME_PERIOD seconds, in real time
+    frames = []
+    for i, regions in enumerate(states):
+        frames.append((i * FRAME_PERIOD, {
+            'empty': False,
+            'moving': regions is None,
+            'regions': regions or [],
+            'seq': i
+        }))
+    return OpenMVReplayPort(frames=frames, speed=1.0)
+
+
+def test_observe_grid_waits_for_frames_after_arrival(t):
+    # agreeing frames on the way there don't count, only the ones after it
+    bot = TravellingBot()
+    state = t.observe_grid(bot, replay([A] * 3 + [B] * 6), num_frames=3)
+    assert state['regions'] == B
+    assert state['seq'] == 5
+    assert state['capture_time'] >= bot.arrival
+
+
+@pytest.mark.parametrize('num_frames, seq', [(1, 3), (2, 4), (3, 7), (4, 8)])
+def test_observe_grid_stops_after_num_frames_agree(t, num_frames, seq):
+    states = [None] * 3 + [A, A, B, B, B, B, B]
+    state = t.observe_grid(TravellingBot(), replay(states), num_frames)
+    assert state['seq'] == seq
+    assert state['regions'] == states[seq]
+
+
+def test_observe_grid_returns_movement_after_arrival(t):
+    # there's nothing to agree on while something moves over the paper
+    state = t.observe_grid(
+        TravellingBot(), replay([A] * 3 + [None] + [B] * 5), num_frames=2)
+    assert state['moving']
+    assert state['seq'] == 3
+
+
+def test_observe_grid_uses_observe_frames_by_default(t, monkeypatch):
+    monkeypatch.setattr(t, 'observe_frames', 3)
+    states = [None] * 3 + [A, A, B, B, B, B, B]
+    assert t.observe_grid(TravellingBot(), replay(states))['seq'] == 7
+
+
+def test_observe_grid_raises_if_the_arm_fails(t):
+    with pytest.raises(RuntimeError, match='stalled'):
+        t.observe_grid(
+            TravellingBot(error=RuntimeError('stalled')), replay([A] * 10))
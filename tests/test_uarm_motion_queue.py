@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from utils.uarm_loopback import UArmLoopback
+from utils.uarm_motion_queue import UArmCommandPort, UArmMotionQueue
+
+
+def get_program(num_moves=40):
+    return [
+        {'x': 150 + (i % 10), 'y': -20 + i, 'z': 40 + (i % 2) * 10}
+        for i in range(num_moves)
+    ]
+
+
+def test_streams_program_in_order():
+    program = get_program()
+    with UArmLoopback(buffer_size=4, command_time=0.002,
+                      reply_delay=0.002) as arm:
+        with UArmCommandPort(arm.port) as port:
+            queue = UArmMotionQueue(port, in_flight=4, feed_per_speed=60)
+            for p in program:
+                queue.move_to(speed=100, **p)
+            queue.drain()
+    assert arm.commands == [
+        'G0 X{x:.2f} Y{y:.2f} Z{z:.2f} F6000'.format(**p) for p in program]
+    assert queue.counters['sent'] == len(program)
+    assert queue.counters['acked'] == len(program)
+    assert queue.counters['out_of_order'] == 0
+    assert queue.num_in_flight == 0
+
+
+def test_queue_depth_is_bounded():
+    with UArmLoopback(buffer_size=3, command_time=0.005) as arm:
+        with UArmCommandPort(arm.port) as port:
+            queue = UArmMotionQueue(port, in_flight=3)
+            for p in get_program(30):
+                queue.move_to(**p)
+            queue.drain()
+    assert queue.counters['max_in_flight'] == 3
+    assert queue.counters['full_waits'] > 0
+    assert arm.max_buffered <= 3
+
+
+def test_failed_command_raises():
+    with UArmLoopback(fail_on='Y-5.00') as arm:
+        with UArmCommandPort(arm.port) as port:
+            queue = UArmMotionQueue(port, in_flight=2)
+            with pytest.raises(RuntimeError, match='E22'):
+                for p in get_program(30):
+                    queue.move_to(**p)
+                queue.drain()
+
+
+class ArrivingBot(object):
+    # the parts of the wrapper `wait_for_arrival()` uses, over a loopback
+    def __init__(self, port):
+        self._port = port
+        self.calls = []
+        self.position = None
+
+    def send_cmd_async(self, msg, callback=None):
+        self.calls.append(msg)
+        return self._port.send_cmd_async(msg, callback=callback)
+
+    def speed(self, speed):
+        self.calls.append('speed {0}'.format(speed))
+        return self
+
+    def wait_for_arrival(self):
+        self.calls.append('wait_for_arrival')
+
+    def update_position(self):
+        self.calls.append('update_position')
+        self.position = {'x': 1.0, 'y': 2.0, 'z': 3.0}
+
+
+def test_position_is_read_after_arrival():
+    with UArmLoopback() as arm:
+        with UArmCommandPort(arm.port) as port:
+            bot = ArrivingBot(port)
+            queue = UArmMotionQueue(bot)
+            queue.move_relative(x=5)
+            queue.wait_for_arrival()
+    assert bot.calls[-2:] == ['wait_for_arrival', 'update_position']
+    assert queue.position == bot.position
+
+
+def test_speed_is_set_through_the_wrapper():
+    with UArmLoopback(command_time=0.002) as arm:
+        with UArmCommandPort(arm.port) as port:
+            bot = ArrivingBot(port)
+            queue = UArmMotionQueue(bot, in_flight=4)
+            program = get_program(6)
+            for i, p in enumerate(program):
+                queue.move_to(speed=100 if i < 3 else 50, **p)
+            queue.drain()
+    # no feed rates of its own, and each speed lands after the moves
+    # queued before it
+    assert not any(' F' in c for c in arm.commands)
+    moves = ['G0 X{x:.2f} Y{y:.2f} Z{z:.2f}'.format(**p) for p in program]
+    expected = []
+    for i, move in enumerate(moves):
+        expected += ['speed {0}'.format(100 if i < 3 else 50), move]
+    assert bot.calls == expected
+
+
+def test_replies_are_not_blocked_by_sending():
+    # a wrapper that hands over each reply on its own thread, and waits for
+    # it, before `send_cmd_async()` returns
+    class BlockingBot(object):
+        def send_cmd_async(self, msg, callback=None):
+            replier = threading.Thread(target=callback, args=('ok',))
+            replier.start()
+            replier.join(1)
+            assert not replier.is_alive()
+
+    queue = UArmMotionQueue(BlockingBot(), in_flight=2)
+    for p in get_program(5):
+        queue.move_to(**p)
+    queue.drain()
+    assert queue.counters['acked'] == 5
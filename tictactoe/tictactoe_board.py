@@ -0,0 +1,213 @@
+# Bitboard for tic-tac-toe, on a 3x3 board by default or any NxN board.
+#
+# Each player's marks are kept as a bit mask (bit N is region N, where 0
+# is top-left and the last is bottom-right, row by row), so win checks and
+# comparisons with the camera's regions are only a few integer operations.
+
+BOARD_SIZE = 3
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+EMPTY = 0
+PLAYERS = (1, 2)
+
+FULL_MASK = (1 << NUM_SQUARES) - 1
+
+
+def get_win_lines(size, win_length=None):
+    # every row, column and diagonal run of `win_length` regions
+    if win_length is None:
+        win_length = size
+    if win_length > size:
+        raise ValueError('Win length {0} is larger than board size {1}'.format(
+            win_length, size))
+    lines = []
+    for row in range(size):
+        for col in range(size):
+            for d_row, d_col in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                end_row = row + (d_row * (win_length - 1))
+                end_col = col + (d_col * (win_length - 1))
+                if end_row >= size or end_col < 0 or end_col >= size:
+                    continue
+                lines.append(tuple(
+                    ((row + (d_row * i)) * size) + col + (d_col * i)
+                    for i in range(win_length)))
+    return tuple(lines)
+
+
+def indices_to_mask(indices):
+    mask = 0
+    for i in indices:
+        mask |= (1 << i)
+    return mask
+
+
+def mask_to_indices(mask, num_squares=NUM_SQUARES):
+    return [i for i in range(num_squares) if mask & (1 << i)]
+
+
+WIN_LINES = get_win_lines(BOARD_SIZE)
+WIN_MASKS = tuple(indices_to_mask(line) for line in WIN_LINES)
+
+# lookup tables for every possible 3x3 mask
+POPCOUNT = tuple(bin(m).count('1') for m in range(FULL_MASK + 1))
+_BASE3 = tuple(
+    sum(3 ** i for i in mask_to_indices(m)) for m in range(FULL_MASK + 1))
+
+_win_masks_cache = {(BOARD_SIZE, BOARD_SIZE): (WIN_LINES, WIN_MASKS)}
+
+
+def get_win_masks(size, win_length=None):
+    # returns (lines, masks), only generated once for each board shape
+    if win_length is None:
+        win_length = size
+    if (size, win_length) not in _win_masks_cache:
+        lines = get_win_lines(size, win_length)
+        masks = tuple(indices_to_mask(line) for line in lines)
+        _win_masks_cache[(size, win_length)] = (lines, masks)
+    return _win_masks_cache[(size, win_length)]
+
+
+def popcount(mask):
+    if mask <= FULL_MASK:
+        return POPCOUNT[mask]
+    return bin(mask).count('1')
+
+
+def camera_to_mask(regions, num_squares=NUM_SQUARES):
+    # the camera's regions are a list of booleans, True if drawn on
+    if len(regions) != num_squares:
+        raise RuntimeError(
+            'Expected {0} regions, got {1}'.format(num_squares, len(regions)))
+    mask = 0
+    for i, drawn in enumerate(regions):
+        if drawn:
+            mask |= (1 << i)
+    return mask
+
+
+def mask_to_camera(mask, num_squares=NUM_SQUARES):
+    return [bool(mask & (1 << i)) for i in range(num_squares)]
+
+
+class Board(object):
+
+    def __init__(self, masks=None, size=BOARD_SIZE, win_length=None):
+        self.size = size
+        self.win_length = win_length or size
+        self.num_squares = size * size
+        self.full_mask = (1 << self.num_squares) - 1
+        self.win_lines, self.win_masks = get_win_masks(size, self.win_length)
+        self.masks = {p: 0 for p in PLAYERS}
+        if masks:
+            self.masks.update(masks)
+
+    @classmethod
+    def from_marks(cls, marks, win_length=None):
+        # from a list of marks, like [0, 1, 2, 0, ...]
+        size = int(round(len(marks) ** 0.5))
+        if size * size != len(marks):
+            raise ValueError('Not a square board: {0} regions'.format(len(marks)))
+        board = cls(size=size, win_length=win_length)
+        for i, m in enumerate(marks):
+            if m != EMPTY:
+                board.masks[m] |= (1 << i)
+        return board
+
+    def to_marks(self):
+        return [self[i] for i in range(self.num_squares)]
+
+    def camera_mask(self, regions):
+        return camera_to_mask(regions, self.num_squares)
+
+    def to_camera(self):
+        return mask_to_camera(self.occupied, self.num_squares)
+
+    def copy(self, masks=None):
+        # a board of the same shape, with these masks or a copy of ours
+        if masks is None:
+            masks = self.masks
+        return Board(masks, size=self.size, win_length=self.win_length)
+
+    def key(self):
+        # base-3 encoding of the board, where each region's digit is its mark
+        if self.num_squares == NUM_SQUARES:
+            return sum(_BASE3[mask] * p for p, mask in self.masks.items())
+        return sum(self[i] * (3 ** i) for i in range(self.num_squares))
+
+    @property
+    def occupied(self):
+        mask = 0
+        for m in self.masks.values():
+            mask |= m
+        return mask
+
+    @property
+    def empty(self):
+        return self.full_mask & ~self.occupied
+
+    def count(self, player=None):
+        if player is None:
+            return popcount(self.occupied)
+        return popcount(self.masks[player])
+
+    def empties(self):
+        return mask_to_indices(self.empty, self.num_squares)
+
+    def is_full(self):
+        return self.occupied == self.full_mask
+
+    def is_empty(self):
+        return self.occupied == 0
+
+    def winner(self):
+        # returns (player, line_indices) of the first win found, or None
+        for p, mask in self.masks.items():
+            for i, win in enumerate(self.win_masks):
+                if mask & win == win:
+                    return p, self.win_lines[i]
+        return None
+
+    def winning_line(self):
+        win = self.winner()
+        return win[1] if win else None
+
+    def added(self, camera_mask):
+        # regions the camera sees drawn on, that aren't on this board
+        return camera_mask & ~self.occupied
+
+    def removed(self, camera_mask):
+        # regions on this board, that the camera no longer sees
+        return self.occupied & ~camera_mask
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < self.num_squares:
+            raise IndexError('Region {0} is not on the board'.format(idx))
+        bit = 1 << idx
+        for p, mask in self.masks.items():
+            if mask & bit:
+                return p
+        return EMPTY
+
+    def __setitem__(self, idx, mark):
+        if not 0 <= idx < self.num_squares:
+            raise IndexError('Region {0} is not on the board'.format(idx))
+        bit = 1 << idx
+        for p in self.masks:
+            self.masks[p] &= ~bit
+        if mark != EMPTY:
+            self.masks[mark] |= bit
+
+    def __len__(self):
+        return self.num_squares
+
+    def __iter__(self):
+        return iter(self.to_marks())
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Board) and
+            self.size == other.size and
+            self.win_length == other.win_length and
+            self.masks == other.masks)
+
+    def __repr__(self):
+        return 'Board({0})'.format(self.to_marks())
@@ -0,0 +1,222 @@
+import random
+import time
+
+from tictactoe_board import Board, EMPTY, PLAYERS, get_win_masks, popcount
+
+
+# Game engine for NxN boards, where `win_length` marks in a row wins.
+#
+# Boards too big to solve ahead of time (like 4x4, or 5x5 with 4 in a row)
+# are searched move by move with alpha-beta negamax, remembering positions
+# in a transposition table. The search deepens one ply at a time until the
+# time budget runs out, and plays the best move from the deepest search it
+# finished, so the arm never thinks for longer than the budget allows.
+
+WIN_SCORE = 1000000
+# scores past this are forced wins (or losses), found by the search
+WIN_THRESHOLD = WIN_SCORE - 1000
+
+TABLE_EXACT = 0
+TABLE_LOWER = 1
+TABLE_UPPER = 2
+TABLE_MAX_ENTRIES = 1000000
+
+DEFAULT_TIME_BUDGET_SEC = 1.0
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class GameEngine(object):
+
+    def __init__(self, size=3, win_length=None):
+        self.size = size
+        self.win_length = win_length or size
+        self.num_squares = size * size
+        self.full_mask = (1 << self.num_squares) - 1
+        self.win_lines, self.win_masks = get_win_masks(size, self.win_length)
+        # the winning lines passing through each region
+        self.lines_through = [[] for i in range(self.num_squares)]
+        for line, mask in zip(self.win_lines, self.win_masks):
+            for idx in line:
+                self.lines_through[idx].append(mask)
+        # more marks in an open line is worth a lot more
+        self.line_weights = [0] + [4 ** i for i in range(self.win_length)]
+        self._table = {}
+        self._deadline = None
+        self._nodes = 0
+
+    def clear(self):
+        self._table = {}
+
+    def _is_win(self, mask, idx):
+        # only the lines through the newest mark can have just been won
+        for line in self.lines_through[idx]:
+            if mask & line == line:
+                return True
+        return False
+
+    def _evaluate(self, me, opp):
+        # lines only one player can still win, weighed by how full they are
+        score = 0
+        weights = self.line_weights
+        for line in self.win_masks:
+            mine = me & line
+            theirs = opp & line
+            if mine and not theirs:
+                score += weights[popcount(mine)]
+            elif theirs and not mine:
+                score -= weights[popcount(theirs)]
+        return score
+
+    def _move_score(self, me, opp, idx):
+        score = 0
+        weights = self.line_weights
+        for line in self.lines_through[idx]:
+            mine = me & line
+            theirs = opp & line
+            if not theirs:
+                score += weights[popcount(mine) + 1]
+            if not mine:
+                score += weights[popcount(theirs) + 1]
+        return score
+
+    def _ordered_moves(self, me, opp, empty, first=None):
+        # best looking moves first, so alpha-beta can skip more of the tree
+        moves = [i for i in range(self.num_squares) if empty & (1 << i)]
+        moves.sort(key=lambda i: self._move_score(me, opp, i), reverse=True)
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _to_table(self, value, ply):
+        # forced win scores are stored relative to the stored position
+        if value > WIN_THRESHOLD:
+            return value + ply
+        if value < -WIN_THRESHOLD:
+            return value - ply
+        return value
+
+    def _from_table(self, value, ply):
+        if value > WIN_THRESHOLD:
+            return value - ply
+        if value < -WIN_THRESHOLD:
+            return value + ply
+        return value
+
+    def _negamax(self, me, opp, depth, alpha, beta, ply):
+        self._nodes += 1
+        if not self._nodes & 0xff and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+        empty = self.full_mask & ~(me | opp)
+        if not empty:
+            return 0
+        if depth == 0:
+            return self._evaluate(me, opp)
+        key = (me, opp)
+        alpha_start = alpha
+        table_move = None
+        entry = self._table.get(key)
+        if entry:
+            t_depth, t_value, t_flag, table_move = entry
+            if t_depth >= depth:
+                t_value = self._from_table(t_value, ply)
+                if t_flag == TABLE_EXACT:
+                    return t_value
+                elif t_flag == TABLE_LOWER:
+                    alpha = max(alpha, t_value)
+                else:
+                    beta = min(beta, t_value)
+                if alpha >= beta:
+                    return t_value
+        best_value = None
+        best_move = None
+        for idx in self._ordered_moves(me, opp, empty, first=table_move):
+            new_me = me | (1 << idx)
+            if self._is_win(new_me, idx):
+                value = WIN_SCORE - ply
+            else:
+                value = -self._negamax(
+                    opp, new_me, depth - 1, -beta, -alpha, ply + 1)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_move = idx
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        if best_value <= alpha_start:
+            flag = TABLE_UPPER
+        elif best_value >= beta:
+            flag = TABLE_LOWER
+        else:
+            flag = TABLE_EXACT
+        if len(self._table) >= TABLE_MAX_ENTRIES:
+            self._table = {}
+        self._table[key] = (
+            depth, self._to_table(best_value, ply), flag, best_move)
+        return best_value
+
+    def _search_root(self, me, opp, moves, depth):
+        alpha = -WIN_SCORE - 1
+        beta = WIN_SCORE + 1
+        best_value = None
+        best_move = None
+        for idx in moves:
+            new_me = me | (1 << idx)
+            if self._is_win(new_me, idx):
+                value = WIN_SCORE
+            else:
+                value = -self._negamax(opp, new_me, depth - 1, -beta, -alpha, 1)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_move = idx
+            alpha = max(alpha, value)
+        return best_value, best_move
+
+    def search(self, board, player, time_budget=DEFAULT_TIME_BUDGET_SEC,
+               max_depth=None, tie_break=True):
+        # returns (move, score, depth) for `player` to move on `board`,
+        # where move is None if the game is already over
+        if board.winner() or board.is_full():
+            return None, None, 0
+        me = board.masks[player]
+        opp = board.masks[PLAYERS[1] if player == PLAYERS[0] else PLAYERS[0]]
+        empty = board.empty
+        self._deadline = time.perf_counter() + time_budget
+        self._nodes = 0
+        moves = [i for i in range(self.num_squares) if empty & (1 << i)]
+        if tie_break:
+            # equally good looking moves are ordered randomly
+            random.shuffle(moves)
+        moves.sort(key=lambda i: self._move_score(me, opp, i), reverse=True)
+        best_move = moves[0]
+        best_value = None
+        depth_reached = 0
+        if max_depth is None:
+            max_depth = len(moves)
+        for depth in range(1, min(max_depth, len(moves)) + 1):
+            try:
+                value, move = self._search_root(me, opp, moves, depth)
+            except _SearchTimeout:
+                break
+            best_move, best_value, depth_reached = move, value, depth
+            # search the best move first next time
+            moves.remove(move)
+            moves.insert(0, move)
+            if WIN_SCORE - abs(value) < depth:
+                # the result is forced within the plies searched, so deeper
+                # won't change it (a win from the table may be further away,
+                # and a deeper search could still find a quicker one)
+                break
+        return best_move, best_value, depth_reached
+
+    def best_move(self, board, player, time_budget=DEFAULT_TIME_BUDGET_SEC,
+                  tie_break=True):
+        move, _, _ = self.search(
+            board, player, time_budget=time_budget, tie_break=tie_break)
+        return move
+
+    def new_board(self):
+        return Board(size=self.size, win_length=self.win_length)
@@ -1,6 +1,8 @@
 import json
+import struct
 import utime
 
+import pyb
 import sensor
 
 sensor.reset()
@@ -17,6 +19,30 @@ sensor.set_saturation(-3)
 sensor.set_auto_exposure(True)
 sensor.set_auto_whitebal(True)
 
+# the host can ask for compact binary frames instead of JSON lines
+# NOTE: must match the layout in `utils/openmv_protocol.py`
+usb = pyb.USB_VCP()
+binary_mode = False
+
+# the host can also ask to only be sent frames when something changes,
+# plus a heartbeat frame so it knows the camera is still running
+event_mode = False
+event_heartbeat_ms = 1000
+last_event_key = None
+last_event_ms = 0
+BINARY_SYNC = b'\xa5\x5a'
+BINARY_TYPE_TICTACTOE = 1
+BINARY_FLAG_EMPTY = 1 << 0
+BINARY_FLAG_MOVING = 1 << 1
+BINARY_FLAG_REGIONS = 1 << 2
+
+# every frame is stamped, so the host can tell how old a reading is
+frame_seq = 0
+
+# number of regions along each side of the grid
+# NOTE: must match `board_size` in `tictactoe_uarm.py`
+grid_size = 3
+
 
 def get_crop_coords(img):
     crop_percentage_x = 0.2
@@ -45,11 +71,12 @@ def crop_image(img):
 
 def read_image():
     img = sensor.snapshot()
+    capture_ms = utime.ticks_ms()
     img.lens_corr(1.8)
     img = crop_image(img)
     stats = img.get_statistics(threshold=[(0, 255)])
     hist = img.get_histogram()
-    return (img, stats, hist)
+    return (img, stats, hist, capture_ms)
 
 
 def auto_binary(img):
@@ -91,7 +118,9 @@ def get_region_offsets(img):
     w = img.width()
     h = img.height()
     s = [0.0125, 0.025, 0.05, 0.075]
-    xy_offsets = [{'x': 0, 'y': 0} for i in range(9)]
+    xy_offsets = [{'x': 0, 'y': 0} for i in range(grid_size * grid_size)]
+    if grid_size != 3:
+        return xy_offsets # offsets are only tuned for the 3x3 grid
     xy_offsets[0] = {'x': w * s[1], 'y': h * s[1]}      # top-left
     xy_offsets[1] = {'x': 0, 'y': h * -s[0]}            # top-center
     xy_offsets[2] = {'x': w * -s[1], 'y': h * s[1]}     # top-right
@@ -107,10 +136,10 @@ def get_region_offsets(img):
 def get_region_coords(img):
     width = img.width()
     height = img.height()
-    region_size = (width / 3) * 0.5
+    region_size = (width / grid_size) * 0.5
     w = int(region_size)
     h = int(region_size)
-    rel_offsets = [1 / 6, 1 / 2, 5 / 6]
+    rel_offsets = [(i + 0.5) / grid_size for i in range(grid_size)]
     xy_offsets = get_region_offsets(img)
     regions = []
     for rel_y in rel_offsets:
@@ -133,8 +162,15 @@ def get_region_coords(img):
     return regions
 
 
+# the regions only depend on the image's size, so they're found once
+region_coords_cache = {}
+
+
 def get_regions(img, mean_thresh=250):
-    region_coords = get_region_coords(img)
+    size = (img.width(), img.height())
+    if size not in region_coords_cache:
+        region_coords_cache[size] = get_region_coords(img)
+    region_coords = region_coords_cache[size]
     stats = []
     for c in region_coords:
         s = img.get_statistics(threshold=[(0, 255)], roi=c['roi'])
@@ -164,11 +200,79 @@ def draw_regions(img, reg_stats):
         )
 
 
-def print_state(is_empty, is_moving, reg_stats):
+def crc16(data):
+    crc = 0
+    for b in data:
+        crc ^= b << 8
+        for i in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+    return crc
+
+
+def check_protocol_request():
+    global binary_mode, event_mode, last_event_key
+    if not usb.any():
+        return
+    cmd = usb.read()
+    # requests can arrive together, and the last one of each kind wins
+    if cmd.rfind(b'BIN') > cmd.rfind(b'JSON'):
+        binary_mode = True
+    elif b'JSON' in cmd:
+        binary_mode = False
+    if cmd.rfind(b'EVENTS') > cmd.rfind(b'FRAMES'):
+        event_mode = True
+        last_event_key = None # always send the current state first
+    elif b'FRAMES' in cmd:
+        event_mode = False
+
+
+def should_send(event_key, capture_ms):
+    global last_event_key, last_event_ms
+    if not event_mode:
+        return True
+    changed = event_key != last_event_key
+    if not changed and utime.ticks_diff(capture_ms, last_event_ms) < event_heartbeat_ms:
+        return False
+    last_event_key = event_key
+    last_event_ms = capture_ms
+    return True
+
+
+def send_binary_state(is_empty, is_moving, reg_stats, seq, capture_ms):
+    flags = 0
+    if is_empty:
+        flags |= BINARY_FLAG_EMPTY
+    if is_moving:
+        flags |= BINARY_FLAG_MOVING
+    bitmap = 0
+    if reg_stats and len(reg_stats):
+        flags |= BINARY_FLAG_REGIONS
+        for i, r in enumerate(reg_stats):
+            if r['filled']:
+                bitmap |= 1 << i
+    payload = struct.pack(
+        '<BBHII', flags, len(reg_stats), bitmap, seq, capture_ms)
+    body = bytes([BINARY_TYPE_TICTACTOE, len(payload)]) + payload
+    usb.write(BINARY_SYNC + body + struct.pack('<H', crc16(body)))
+
+
+def print_state(is_empty, is_moving, reg_stats, seq, capture_ms):
+    event_key = (is_empty, is_moving, tuple([r['filled'] for r in reg_stats]))
+    if not should_send(event_key, capture_ms):
+        return
+    # binary frames only have room for 16 regions
+    if binary_mode and len(reg_stats) <= 16:
+        send_binary_state(is_empty, is_moving, reg_stats, seq, capture_ms)
+        return
     json_data = {
         'empty': is_empty,
         'moving': is_moving,
-        'regions': []
+        'regions': [],
+        'seq': seq,
+        'time': capture_ms
     }
     if reg_stats and len(reg_stats):
         json_data['regions'] = [
@@ -182,7 +286,9 @@ def print_state(is_empty, is_moving, reg_stats):
 prev_stats = None
 still_count = 0
 while(True):
-    img, stats, hist = read_image()
+    check_protocol_request()
+    img, stats, hist, capture_ms = read_image()
+    frame_seq += 1
     is_empty = is_image_empty(stats)
     is_moving, still_count = is_image_moving(stats, prev_stats, hist, still_count)
     prev_stats = stats
@@ -192,7 +298,7 @@ while(True):
         img = auto_binary(img)
         reg_stats = get_regions(img)
         draw_regions(img, reg_stats)
-    print_state(is_empty, is_moving, reg_stats)
+    print_state(is_empty, is_moving, reg_stats, frame_seq, capture_ms)
 
 
 
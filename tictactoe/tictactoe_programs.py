@@ -0,0 +1,106 @@
+import collections
+import json
+import os
+
+
+# Cache of compiled motion programs, so drawing something the arm has
+# drawn before (the grid, a mark on a region, a face) is a lookup instead
+# of generating, planning and copying all of its points again.
+#
+# Every program is built for one layout of the drawing surface (paper
+# height, grid location and size, ...). Each lookup passes in the current
+# layout's signature, and the whole cache is dropped when it changes.
+
+PROGRAMS_DEFAULT_MAX_SIZE = 256
+PROGRAMS_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.uarm_projects', 'tictactoe_programs.json')
+
+# `moves` is a tuple of (x, y, z, drawing) positions to move through
+MotionProgram = collections.namedtuple(
+    'MotionProgram', ['moves', 'strokes', 'saved_distance'])
+
+
+def translate_program(program, offset):
+    # the same program, drawn `offset` (x, y) mm away
+    dx, dy = offset
+    return program._replace(moves=tuple(
+        (x + dx, y + dy, z, drawing) for x, y, z, drawing in program.moves))
+
+
+def join_programs(programs):
+    # programs start and end with the pen up, so they can run back to back
+    return MotionProgram(
+        tuple(m for p in programs for m in p.moves),
+        sum(p.strokes for p in programs),
+        sum(p.saved_distance for p in programs))
+
+
+def _to_tuple(value):
+    # JSON turns tuples into lists, so turn them back into (hashable) tuples
+    if isinstance(value, list):
+        return tuple(_to_tuple(v) for v in value)
+    return value
+
+
+class ProgramCache(object):
+
+    def __init__(self, max_size=PROGRAMS_DEFAULT_MAX_SIZE, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._programs = collections.OrderedDict()
+        self._signature = None
+        if self.path:
+            self.load()
+
+    def __len__(self):
+        return len(self._programs)
+
+    def clear(self):
+        self._programs.clear()
+
+    def get(self, key, signature, build):
+        # returns the program for `key`, calling `build()` to make it if
+        # it isn't cached yet for this `signature`
+        if signature != self._signature:
+            self.clear()
+            self._signature = signature
+        program = self._programs.get(key)
+        if program is not None:
+            self._programs.move_to_end(key)
+            self.hits += 1
+            return program
+        self.misses += 1
+        program = build()
+        self._programs[key] = program
+        if len(self._programs) > self.max_size:
+            self._programs.popitem(last=False) # least recently used
+        return program
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._signature = _to_tuple(data['signature'])
+            self._programs = collections.OrderedDict(
+                (_to_tuple(key), MotionProgram(
+                    _to_tuple(p['moves']), p['strokes'], p['saved_distance']))
+                for key, p in data['programs'])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._signature = None
+            self._programs = collections.OrderedDict()
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            'signature': self._signature,
+            'programs': [[key, p._asdict()] for key, p in self._programs.items()]
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(data, f)
+        except OSError:
+            pass # caching is only an optimization
@@ -0,0 +1,348 @@
+import argparse
+import collections
+import functools
+import json
+import sys
+import time
+
+import numpy as np
+
+sys.path.append('..')
+from utils.openmv_host import EndOfFrames, sensor
+from utils.openmv_host.image import get_lens_corr_map
+
+
+# Host-side, batched version of what `tictactoe_openmv.py` does with each
+# picture: lens correction, cropping, the empty and moving tests, the
+# automatic binary threshold, then deciding which regions are filled.
+# Whole stacks of grayscale frames are processed at once, so the settings
+# can be re-tuned over thousands of recorded frames in seconds.
+#
+# Each region is filled when it has at least one dark pixel (min == 0) and
+# its mean, in the binary image, is below `mean_thresh`. The dark pixels of
+# a frame are summed once into an integral image, after which the number
+# of dark pixels inside any region costs four lookups. So one pass measures
+# every region of every candidate layout, and `mean_thresh` is then tuned
+# on those counts without touching the frames again.
+
+# NOTE: must match `tictactoe_openmv.py`
+LENS_CORR_STRENGTH = 1.8
+CROP_PERCENTAGE = {'x': 0.2, 'y': 0.15}
+CROP_OFFSET = {'x': -0.04, 'y': 0.025}
+OFFSET_STEPS = (0.0125, 0.025, 0.05, 0.075)
+REGION_SCALE = 0.5
+EMPTY_MIN_THRESH = 100
+MEAN_THRESH = 250
+MOVING_STATS_THRESH = 15
+MOVING_SPREAD_THRESH = 30
+MOVING_STILL_COUNT = 10
+
+REGIONS_DEFAULT_CHUNK_SIZE = 256
+
+# `empty` and `moving` are (frames,) arrays, `dark` is the number of dark
+# pixels in each region, shaped (frames, layouts, regions), and `area` is
+# each region's number of pixels, shaped (layouts, regions)
+RegionMeasurements = collections.namedtuple(
+    'RegionMeasurements', ['empty', 'moving', 'dark', 'area', 'layouts'])
+
+
+def get_crop_roi(width, height):
+    x = int(width * CROP_PERCENTAGE['x'])
+    y = int(height * CROP_PERCENTAGE['y'])
+    w = width - (x * 2)
+    h = height - (y * 2)
+    x += int(width * CROP_OFFSET['x'])
+    y += int(height * CROP_OFFSET['y'])
+    return (x, y, w, h)
+
+
+def get_region_offsets(width, height, grid_size=3, steps=OFFSET_STEPS):
+    # (x, y) pixel offsets of each region, from the center of its square
+    xy_offsets = [(0, 0) for i in range(grid_size * grid_size)]
+    if grid_size != 3:
+        return xy_offsets # offsets are only tuned for the 3x3 grid
+    s = steps
+    w, h = width, height
+    return [
+        (w * s[1], h * s[1]),       # top-left
+        (0, h * -s[0]),             # top-center
+        (w * -s[1], h * s[1]),      # top-right
+        (w * s[1], h * -s[0]),      # center-left
+        (0, h * -s[2]),             # center
+        (w * -s[1], h * -s[0]),     # center-right
+        (w * s[1], h * -s[1]),      # bottom-left
+        (0, h * -s[3]),             # bottom-center
+        (w * -s[1], h * -s[1])      # bottom-right
+    ]
+
+
+@functools.lru_cache(maxsize=64)
+def get_region_rois(width, height, grid_size=3, steps=OFFSET_STEPS):
+    # (regions, 4) array of each region's (x0, y0, x1, y1) inside the
+    # cropped image, clipped to it like the camera clips a `roi`
+    region_size = (width / grid_size) * REGION_SCALE
+    rel_offsets = [(i + 0.5) / grid_size for i in range(grid_size)]
+    xy_offsets = get_region_offsets(width, height, grid_size, steps)
+    rois = []
+    for rel_y in rel_offsets:
+        for rel_x in rel_offsets:
+            offset_x, offset_y = xy_offsets[len(rois)]
+            x = int((rel_x * width) + offset_x - (region_size / 2))
+            y = int((rel_y * height) + offset_y - (region_size / 2))
+            size = int(region_size)
+            rois.append((
+                min(max(x, 0), width), min(max(y, 0), height),
+                min(max(x + size, 0), width), min(max(y + size, 0), height)))
+    rois = np.array(rois, dtype=np.intp)
+    rois.flags.writeable = False
+    return rois
+
+
+def _percentile_bins(counts, cumulative, percentile):
+    # the first bin of each histogram where the cumulative count reaches
+    # `percentile`, like `hist.get_percentile(percentile).value()`
+    target = percentile * counts.sum(axis=1, keepdims=True)
+    return (cumulative < target).sum(axis=1)
+
+
+def get_frame_stats(frames):
+    # the statistics the camera tests for empty and moving frames, plus
+    # the Otsu threshold it makes the binary image with, for each frame
+    num_frames = len(frames)
+    flat = frames.reshape(num_frames, -1).astype(np.intp)
+    flat += (np.arange(num_frames) * 256)[:, None]
+    counts = np.bincount(flat.ravel(), minlength=num_frames * 256)
+    counts = counts.reshape(num_frames, 256).astype(np.float64)
+    bins = np.arange(256, dtype=np.float64)
+    total = counts.sum(axis=1)
+    cumulative = np.cumsum(counts, axis=1)
+    sums = np.cumsum(counts * bins, axis=1)
+    mean = sums[:, -1] / total
+    var = (counts * ((bins[None, :] - mean[:, None]) ** 2)).sum(axis=1) / total
+    # Otsu's method, maximizing the variance between the two classes
+    weight_high = total[:, None] - cumulative
+    mean_low = sums / np.maximum(cumulative, 1)
+    mean_high = (sums[:, -1:] - sums) / np.maximum(weight_high, 1)
+    between = cumulative * weight_high * ((mean_low - mean_high) ** 2)
+    return {
+        'mean': mean.astype(int),
+        'min': np.argmax(counts > 0, axis=1),
+        'median': _percentile_bins(counts, cumulative, 0.5),
+        'stdev': np.sqrt(var).astype(int),
+        'low': _percentile_bins(counts, cumulative, 0.25),
+        'high': _percentile_bins(counts, cumulative, 0.95),
+        'threshold': np.argmax(between, axis=1)
+    }
+
+
+def get_moving(stats, prev=None):
+    # same as `is_image_moving()`, which depends on the frames before, so
+    # it's a loop over the (already computed) statistics of each frame;
+    # `prev` carries the state over from the previous chunk of frames
+    prev = prev or {'stats': None, 'count': 0}
+    keys = ('mean', 'min', 'median', 'stdev')
+    moving = np.ones(len(stats['mean']), dtype=bool)
+    for i in range(len(moving)):
+        frame_stats = [stats[k][i] for k in keys]
+        is_moving = prev['stats'] is None or max(
+            abs(a - b) for a, b in zip(frame_stats, prev['stats'])
+        ) > MOVING_STATS_THRESH
+        if not is_moving:
+            is_moving = stats['high'][i] - stats['low'][i] > \
+                MOVING_SPREAD_THRESH
+        if is_moving:
+            prev['count'] = 0
+        else:
+            prev['count'] += 1
+            is_moving = prev['count'] < MOVING_STILL_COUNT
+        moving[i] = is_moving
+        prev['stats'] = frame_stats
+    return moving, prev
+
+
+def prepare_frames(frames):
+    # lens correction and cropping, for a (frames, height, width) stack
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 2:
+        frames = frames[None]
+    height, width = frames.shape[1:]
+    src_y, src_x = get_lens_corr_map(height, width, LENS_CORR_STRENGTH)
+    x, y, w, h = get_crop_roi(width, height)
+    # only look up the pixels that survive the crop
+    return frames[:, src_y[y:y + h, x:x + w], src_x[y:y + h, x:x + w]]
+
+
+def count_dark_pixels(frames, thresholds, rois):
+    # number of pixels at or below each frame's threshold inside each roi,
+    # using an integral image; returns a (frames, rois) array
+    num_frames, height, width = frames.shape
+    dark = frames <= thresholds[:, None, None]
+    integral = np.zeros((num_frames, height + 1, width + 1), dtype=np.int32)
+    np.cumsum(dark, axis=1, dtype=np.int32, out=integral[:, 1:, 1:])
+    np.cumsum(integral[:, 1:, 1:], axis=2, out=integral[:, 1:, 1:])
+    x0, y0, x1, y1 = rois[:, 0], rois[:, 1], rois[:, 2], rois[:, 3]
+    return (integral[:, y1, x1] - integral[:, y0, x1]
+            - integral[:, y1, x0] + integral[:, y0, x0])
+
+
+class RegionClassifier(object):
+
+    def __init__(self, grid_size=3, mean_thresh=MEAN_THRESH,
+                 steps=OFFSET_STEPS):
+        self.grid_size = grid_size
+        self.mean_thresh = mean_thresh
+        self.steps = tuple(steps)
+
+    def measure(self, frames, layouts=None,
+                chunk_size=REGIONS_DEFAULT_CHUNK_SIZE):
+        # `frames` is a (frames, height, width) stack, or an iterable of
+        # frames; `layouts` is a list of offset steps to measure regions
+        # at, defaulting to this classifier's own
+        layouts = [tuple(s) for s in (layouts or [self.steps])]
+        empty, moving, dark = [], [], []
+        area = None
+        moving_state = None
+        for chunk in self._chunks(frames, chunk_size):
+            chunk = prepare_frames(chunk)
+            height, width = chunk.shape[1:]
+            rois = np.concatenate([
+                get_region_rois(width, height, self.grid_size, s)
+                for s in layouts])
+            stats = get_frame_stats(chunk)
+            chunk_moving, moving_state = get_moving(stats, moving_state)
+            empty.append(stats['min'] > EMPTY_MIN_THRESH)
+            moving.append(chunk_moving)
+            counts = count_dark_pixels(chunk, stats['threshold'], rois)
+            dark.append(counts.reshape(len(chunk), len(layouts), -1))
+            area = ((rois[:, 2] - rois[:, 0]) * (rois[:, 3] - rois[:, 1]))
+            area = area.reshape(len(layouts), -1)
+        if area is None:
+            raise RuntimeError('No frames to measure')
+        return RegionMeasurements(
+            np.concatenate(empty), np.concatenate(moving),
+            np.concatenate(dark), area, layouts)
+
+    def _chunks(self, frames, chunk_size):
+        if isinstance(frames, np.ndarray):
+            for i in range(0, len(frames), chunk_size):
+                yield frames[i:i + chunk_size]
+            return
+        chunk = []
+        for frame in frames:
+            chunk.append(frame)
+            if len(chunk) >= chunk_size:
+                yield np.stack(chunk)
+                chunk = []
+        if chunk:
+            yield np.stack(chunk)
+
+    def get_filled(self, measurements, mean_thresh=None, layout=0):
+        # (frames, regions) array of which regions are filled
+        if mean_thresh is None:
+            mean_thresh = self.mean_thresh
+        dark = measurements.dark[:, layout]
+        area = measurements.area[layout]
+        # the binary image is 0 or 255, so its mean comes from the counts
+        mean = (255 * (area - dark)) // np.maximum(area, 1)
+        return (dark > 0) & (mean < mean_thresh)
+
+    def classify(self, frames):
+        # the states the camera would send, one per frame
+        m = self.measure(frames)
+        filled = self.get_filled(m)
+        states = []
+        for i in range(len(m.empty)):
+            regions = []
+            if not m.empty[i] and not m.moving[i]:
+                regions = [bool(f) for f in filled[i]]
+            states.append({
+                'empty': bool(m.empty[i]),
+                'moving': bool(m.moving[i]),
+                'regions': regions
+            })
+        return states
+
+    def tune(self, measurements, expected, mean_threshs=range(200, 256)):
+        # scores every `mean_thresh` with every measured layout against
+        # `expected`, a (frames, regions) array of filled regions (rows of
+        # None are unlabeled); only frames the camera would have classified
+        # (not empty, not moving) count; returns the (accuracy, mean_thresh,
+        # layout steps) tried, best first
+        labeled = np.array([e is not None for e in expected])
+        used = labeled & ~measurements.empty & ~measurements.moving
+        if not used.any():
+            raise RuntimeError('No still, labeled frames to tune with')
+        truth = np.array([e for e, u in zip(expected, used) if u], dtype=bool)
+        results = []
+        for layout_idx, steps in enumerate(measurements.layouts):
+            dark = measurements.dark[used, layout_idx]
+            area = measurements.area[layout_idx]
+            mean = (255 * (area - dark)) // np.maximum(area, 1)
+            threshs = np.asarray(list(mean_threshs))
+            # (thresholds, frames, regions), every threshold at once
+            filled = (dark > 0)[None] & (mean[None] < threshs[:, None, None])
+            accuracy = (filled == truth[None]).mean(axis=(1, 2))
+            for t, a in zip(threshs, accuracy):
+                results.append((float(a), int(t), steps))
+        results.sort(key=lambda r: -r[0])
+        return results
+
+
+def get_scaled_layouts(scales, steps=OFFSET_STEPS):
+    # candidate offsets for `tune()`, the default ones scaled up and down
+    return [tuple(s * scale for s in steps) for scale in scales]
+
+
+def load_frames(source, max_frames=None):
+    # grayscale QVGA frames, exactly as the emulated camera would take them
+    sensor.reset()
+    sensor.set_pixformat(sensor.GRAYSCALE)
+    sensor.set_framesize(sensor.QVGA)
+    sensor.set_source(source, max_frames=max_frames)
+    frames = []
+    try:
+        while True:
+            frames.append(sensor.snapshot().to_ndarray())
+    except EndOfFrames:
+        pass
+    return np.stack(frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Classify or tune the tic-tac-toe regions, over a folder '
+                    'of images, a .npy stack, or a video')
+    parser.add_argument('source')
+    parser.add_argument('--expected', default=None,
+                        help='JSON list of each frame\'s filled regions '
+                             '(or null), to tune the settings against')
+    parser.add_argument('--frames', type=int, default=None)
+    parser.add_argument('--mean-thresh', type=int, default=MEAN_THRESH)
+    parser.add_argument('--scales', type=float, nargs='+',
+                        default=[0.5, 0.75, 1.0, 1.25, 1.5],
+                        help='offset scales to try when tuning')
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames)
+    classifier = RegionClassifier(mean_thresh=args.mean_thresh)
+    start = time.perf_counter()
+    layouts = None
+    if args.expected:
+        layouts = get_scaled_layouts(args.scales)
+    m = classifier.measure(frames, layouts)
+    elapsed = time.perf_counter() - start
+    print('Measured {0} frames, {1} layouts, in {2:.3f}s'.format(
+        len(frames), len(m.layouts), elapsed))
+    still = ~m.empty & ~m.moving
+    print('  empty={0} moving={1} still={2}'.format(
+        int(m.empty.sum()), int((m.moving & ~m.empty).sum()), int(still.sum())))
+    if not args.expected:
+        filled = classifier.get_filled(m)[still]
+        print('  filled per region: {0}'.format(filled.sum(axis=0).tolist()))
+        sys.exit(0)
+    with open(args.expected) as f:
+        expected = json.load(f)
+    results = classifier.tune(m, expected[:len(frames)])
+    for accuracy, mean_thresh, steps in results[:10]:
+        print('  {0:.4f}  mean_thresh={1}  steps={2}'.format(
+            accuracy, mean_thresh, [round(s, 5) for s in steps]))
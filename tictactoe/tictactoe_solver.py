@@ -0,0 +1,166 @@
+import array
+import random
+
+from tictactoe_board import Board, EMPTY, NUM_SQUARES, PLAYERS, WIN_LINES
+
+
+# Perfect-play move table for 3x3 tic-tac-toe.
+#
+# Every position reachable from an empty board (with either player going
+# first) is solved once with minimax, and the set of best moves for the
+# player about to move is stored as a 9-bit mask. Boards are indexed by
+# their base-3 encoding (empty=0, player 1=1, player 2=2), so looking up
+# a move is a single array access. Searching is memoized on the board's
+# canonical form under the 8 symmetries of the square, which means each
+# distinct position is only ever searched once.
+
+# the 8 symmetries of the square, as index permutations
+# (where `permuted[i] = board[sym[i]]`)
+_IDENTITY = (0, 1, 2, 3, 4, 5, 6, 7, 8)
+_ROTATE = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+_MIRROR = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+
+def _compose(a, b):
+    return tuple(a[i] for i in b)
+
+
+def _get_symmetries():
+    syms = []
+    sym = _IDENTITY
+    for i in range(4):
+        syms.append(sym)
+        syms.append(_compose(sym, _MIRROR))
+        sym = _compose(sym, _ROTATE)
+    return tuple(syms)
+
+
+SYMMETRIES = _get_symmetries()
+_POWERS = tuple(3 ** i for i in range(NUM_SQUARES))
+TABLE_SIZE = 3 ** NUM_SQUARES
+
+
+def encode(board):
+    if isinstance(board, Board):
+        return board.key()
+    return sum(board[i] * _POWERS[i] for i in range(NUM_SQUARES))
+
+
+def canonical_key(board):
+    return min(
+        sum(board[sym[i]] * _POWERS[i] for i in range(NUM_SQUARES))
+        for sym in SYMMETRIES)
+
+
+def other_player(player):
+    return PLAYERS[1] if player == PLAYERS[0] else PLAYERS[0]
+
+
+def get_winner(board):
+    for a, b, c in WIN_LINES:
+        if board[a] != EMPTY and board[a] == board[b] == board[c]:
+            return board[a]
+    return None
+
+
+def mask_to_moves(mask):
+    return [i for i in range(NUM_SQUARES) if mask & (1 << i)]
+
+
+class PerfectPlayTable(object):
+
+    def __init__(self):
+        # one table per player to move, 0 means "not solved"
+        self._tables = {
+            p: array.array('H', bytes(2 * TABLE_SIZE)) for p in PLAYERS}
+        self._values = {}
+        for first in PLAYERS:
+            self._fill([EMPTY] * NUM_SQUARES, first, set())
+
+    def _value(self, board, player):
+        # negamax score for `player` to move: positive wins, negative loses,
+        # and quicker wins (or slower losses) score further from zero
+        key = (canonical_key(board), player)
+        if key in self._values:
+            return self._values[key]
+        empties = [i for i in range(NUM_SQUARES) if board[i] == EMPTY]
+        if get_winner(board) is not None:
+            # the previous move won the game
+            value = -(len(empties) + 1)
+        elif not empties:
+            value = 0
+        else:
+            value = None
+            opponent = other_player(player)
+            for i in empties:
+                board[i] = player
+                v = -self._value(board, opponent)
+                board[i] = EMPTY
+                if value is None or v > value:
+                    value = v
+        self._values[key] = value
+        return value
+
+    def _solve(self, board, player):
+        # mask of every move that scores as well as the best move
+        best = None
+        mask = 0
+        opponent = other_player(player)
+        for i in range(NUM_SQUARES):
+            if board[i] != EMPTY:
+                continue
+            board[i] = player
+            v = -self._value(board, opponent)
+            board[i] = EMPTY
+            if best is None or v > best:
+                best = v
+                mask = 0
+            if v == best:
+                mask |= (1 << i)
+        return mask
+
+    def _fill(self, board, player, visited):
+        key = encode(board)
+        if (key, player) in visited:
+            return
+        visited.add((key, player))
+        if get_winner(board) is not None or EMPTY not in board:
+            return
+        mask = self._solve(board, player)
+        self._tables[player][key] = mask
+        opponent = other_player(player)
+        for i in range(NUM_SQUARES):
+            if board[i] == EMPTY:
+                board[i] = player
+                self._fill(board, opponent, visited)
+                board[i] = EMPTY
+
+    def best_moves_mask(self, board, player):
+        key = encode(board)
+        mask = self._tables[player][key]
+        if not mask and get_winner(board) is None and EMPTY in board:
+            # an unreachable position (maybe a bad camera read),
+            # solve it now and remember it
+            mask = self._solve(list(board), player)
+            self._tables[player][key] = mask
+        return mask
+
+    def best_moves(self, board, player):
+        return mask_to_moves(self.best_moves_mask(board, player))
+
+    def best_move(self, board, player, tie_break=True):
+        # returns None if the game is already over
+        moves = self.best_moves(board, player)
+        if not moves:
+            return None
+        if tie_break:
+            return random.choice(moves)
+        return moves[0]
+
+
+# built once at import, which takes a fraction of a second
+perfect_play_table = PerfectPlayTable()
+
+
+def get_best_move(board, player, tie_break=True):
+    return perfect_play_table.best_move(board, player, tie_break=tie_break)
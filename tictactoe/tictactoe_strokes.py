@@ -0,0 +1,158 @@
+import math
+
+
+# Plans the order of pen strokes, to spend less time travelling with the
+# pen up.
+#
+# A drawing job is a list of shapes, each a list of points like the ones
+# `draw_shape()` takes, where points with 'drawing' set are pen-down. Every
+# run of pen-down points is a stroke. Strokes are ordered greedily (always
+# drawing the nearest one next), then improved with 2-opt, where reversing
+# a run of strokes also flips the direction each one is drawn in. The
+# whole job then becomes a single list of points, with exactly one lift
+# and one hover move between strokes, and no lift at all between strokes
+# that touch.
+
+# strokes closer than this (in mm) are joined without lifting the pen
+JOIN_DISTANCE = 0.01
+
+
+def get_distance(a, b):
+    return math.sqrt(sum([math.pow(a[ax] - b[ax], 2) for ax in 'xyz']))
+
+
+def split_strokes(points):
+    strokes = []
+    stroke = []
+    for p in points:
+        if p.get('drawing'):
+            stroke.append(p)
+        elif stroke:
+            strokes.append(stroke)
+            stroke = []
+    if stroke:
+        strokes.append(stroke)
+    return strokes
+
+
+def get_shape_moves(points, hover_height):
+    # the positions `draw_shape()` moves through for these points
+    first = {ax: points[0][ax] for ax in 'xyz'}
+    first['z'] += hover_height
+    last = {ax: points[-1][ax] for ax in 'xyz'}
+    last['z'] += hover_height
+    return [first] + list(points) + [last]
+
+
+def get_pen_up_distance(moves, start=None):
+    # total distance travelled between positions that aren't both pen-down
+    total = 0
+    prev = start
+    for m in moves:
+        if prev is not None:
+            if not (prev.get('drawing') and m.get('drawing')):
+                total += get_distance(prev, m)
+        prev = m
+    return total
+
+
+def _travel(start, end):
+    if start is None:
+        return 0
+    return math.sqrt(
+        math.pow(start['x'] - end['x'], 2) + math.pow(start['y'] - end['y'], 2))
+
+
+def _order_greedy(strokes, start):
+    # returns a list of (stroke index, reversed)
+    remaining = set(range(len(strokes)))
+    order = []
+    pos = start
+    while remaining:
+        best = None
+        for i in remaining:
+            for rev in (False, True):
+                begin = strokes[i][-1] if rev else strokes[i][0]
+                d = _travel(pos, begin)
+                if best is None or d < best[0]:
+                    best = (d, i, rev)
+        _, i, rev = best
+        remaining.remove(i)
+        order.append((i, rev))
+        pos = strokes[i][0] if rev else strokes[i][-1]
+    return order
+
+
+def _ends(strokes, item):
+    i, rev = item
+    if rev:
+        return strokes[i][-1], strokes[i][0]
+    return strokes[i][0], strokes[i][-1]
+
+
+def _improve_2opt(strokes, order, start):
+    # reverse runs of strokes while that shortens the pen-up travel
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order)):
+            for j in range(i, len(order)):
+                first_begin, _ = _ends(strokes, order[i])
+                _, last_end = _ends(strokes, order[j])
+                prev_end = start if i == 0 else _ends(strokes, order[i - 1])[1]
+                next_begin = None
+                if j + 1 < len(order):
+                    next_begin = _ends(strokes, order[j + 1])[0]
+                before = _travel(prev_end, first_begin)
+                after = _travel(prev_end, last_end)
+                if next_begin is not None:
+                    before += _travel(last_end, next_begin)
+                    after += _travel(first_begin, next_begin)
+                if after < before - 1e-9:
+                    order[i:j + 1] = [(k, not rev) for k, rev in reversed(order[i:j + 1])]
+                    improved = True
+    return order
+
+
+def plan_strokes(shapes, hover_height, start=None):
+    # returns (points, report) where points can be drawn by `draw_shape()`
+    moves_before = []
+    for points in shapes:
+        moves_before += get_shape_moves(points, hover_height)
+    strokes = []
+    for points in shapes:
+        strokes += split_strokes(points)
+    order = _improve_2opt(strokes, _order_greedy(strokes, start), start)
+    planned = []
+    for i, rev in order:
+        stroke = list(reversed(strokes[i])) if rev else strokes[i]
+        if planned:
+            prev = planned[-1]
+            if get_distance(prev, stroke[0]) <= JOIN_DISTANCE:
+                # keep the pen down, and skip the duplicate point
+                planned += [p.copy() for p in stroke[1:]]
+                continue
+            for p in [prev, stroke[0]]:
+                hover = {ax: p[ax] for ax in 'xyz'}
+                hover['z'] += hover_height
+                planned.append(hover)
+        planned += [p.copy() for p in stroke]
+    moves_after = get_shape_moves(planned, hover_height)
+    before = get_pen_up_distance(moves_before, start)
+    after = get_pen_up_distance(moves_after, start)
+    report = {
+        'strokes': len(strokes),
+        'moves_before': len(moves_before),
+        'moves_after': len(moves_after),
+        'pen_up_before': before,
+        'pen_up_after': after,
+        'saved_distance': before - after
+    }
+    return planned, report
+
+
+def estimate_seconds(distance, speed):
+    # rough, ignores acceleration (`speed` is in mm per second)
+    if not speed:
+        return 0
+    return distance / speed
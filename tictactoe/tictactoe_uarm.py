@@ -3,14 +3,22 @@ import json
 import math
 import random
 import sys
+import threading
 import time
 
+import numpy as np
 import serial
 
 from uarm import uarm_scan_and_connect
 
 sys.path.append('..')
-from utils import openmv_port
+from utils import openmv_port, uarm_motion_queue
+
+import tictactoe_programs
+import tictactoe_solver
+import tictactoe_strokes
+from tictactoe_board import Board, camera_to_mask, popcount
+from tictactoe_engine import GameEngine
 
 # speeds
 move_speed = 400
@@ -25,48 +33,89 @@ paper_height = 23
 # position where the camera can observe the entire drawing surface
 observer_pos = {'x': 145, 'y': 0, 'z': 140}
 
+# number of frames in a row, captured after the arm arrives at the
+# `observer_pos`, which must agree before the camera's state is trusted
+observe_frames = 2
+
 # for some reason, uArm's wrist angle isn't exactly centered at 90 degrees
 wrist_centered_angle = 100
 
 # height at which it is safe to move without touching the drawing surface
 hover_height = 5
 
+# furthest (mm) the straight lines drawing a circle can stray from the true
+# circle, well under the width of the marker's line
+arc_tolerance = 0.25
+
 # location and size of the playing surface
 play_grid = {
     'center': {'x': 180, 'y': 0, 'z': paper_height},
     'square_size': 30
 }
 
-num_squares = 9
+# number of regions along each side of the grid, and how many marks in a
+# row win (bigger boards need a bigger `square_size` or smaller marks)
+board_size = 3
+win_length = 3
+num_squares = board_size * board_size
 empty_mark = 0
 user_mark = 1
 uarm_mark = 2
 
+# longest the uArm will think about a move, on boards bigger than 3x3
+move_time_budget = 2.0
+game_engine = GameEngine(board_size, win_length)
+
+
+def get_region_locations(center, square_size, size=None):
+    # first is top-left, last is bottom-right, going row by row
+    # also, remember the XY axis are reversed on the uArm :(
+    if size is None:
+        size = board_size
+    locations = []
+    middle = (size - 1) / 2
+    for row in range(size):
+        for col in range(size):
+            loc = center.copy()
+            loc['x'] += square_size * (middle - row)
+            loc['y'] += square_size * (middle - col)
+            locations.append(loc)
+    return locations
+
+
 # get region locations based on the grid location/size
-# first is top-left, last is bottom-right
-# also, remember the XY axis are reversed on the uArm :(
-region_locations = [play_grid['center'].copy() for i in range(num_squares)]
-region_locations[0]['y'] += play_grid['square_size']
-region_locations[3]['y'] += play_grid['square_size']
-region_locations[6]['y'] += play_grid['square_size']
-region_locations[2]['y'] -= play_grid['square_size']
-region_locations[5]['y'] -= play_grid['square_size']
-region_locations[8]['y'] -= play_grid['square_size']
-region_locations[0]['x'] += play_grid['square_size']
-region_locations[1]['x'] += play_grid['square_size']
-region_locations[2]['x'] += play_grid['square_size']
-region_locations[6]['x'] -= play_grid['square_size']
-region_locations[7]['x'] -= play_grid['square_size']
-region_locations[8]['x'] -= play_grid['square_size']
-
-print_output_format = '''
-***********
-{0}  | {1} |  {2}
------------
-{3}  | {4} |  {5}
------------
-{6}  | {7} |  {8}
-***********'''
+region_locations = get_region_locations(
+    play_grid['center'], play_grid['square_size'])
+
+
+def update_region_locations():
+    # in case the grid was moved or resized while running
+    region_locations[:] = get_region_locations(
+        play_grid['center'], play_grid['square_size'])
+
+
+def get_layout_signature():
+    # everything the drawing programs depend on, see `get_drawing_program()`
+    return (
+        paper_height,
+        play_grid['center']['x'],
+        play_grid['center']['y'],
+        play_grid['square_size'],
+        hover_height,
+        arc_tolerance,
+        board_size,
+        observer_pos['x'],
+        observer_pos['y'],
+        observer_pos['z']
+    )
+
+
+# planned and compiled drawings, from `get_drawing_program()`
+program_cache = tictactoe_programs.ProgramCache()
+
+# a `utils.uarm_motion_queue.UArmMotionQueue` on the arm's connection, to
+# stream drawings without a round trip per move, or None to send each move
+motion_queue = None
 
 mark_to_char = {
     empty_mark: ' ',
@@ -74,17 +123,6 @@ mark_to_char = {
     user_mark: 'o'
 }
 
-winning_sequences = [
-    (0, 1, 2), # top
-    (0, 4, 8), # cross
-    (0, 3, 6), # left
-    (1, 4, 7), # center-vertical
-    (2, 5, 8), # right
-    (2, 4, 6), # cross
-    (3, 4, 5), # center-horizontal
-    (6, 7, 8)  # bottom
-]
-
 
 def find_paper_height(bot):
     bot.disable_all_motors()
@@ -121,28 +159,53 @@ def get_cross_coords(center, radius, angle=0):
     return points
 
 
-def get_circle_coords(center, radius, line_length=3, start_rad=0, end_rad=None):
+def get_arc_segments(radius, sweep, tolerance=None):
+    # fewest straight lines that keep within `tolerance` of the arc, where
+    # a chord spanning angle A strays radius * (1 - cos(A / 2)) from it
+    if tolerance is None:
+        tolerance = arc_tolerance
+    if tolerance >= radius:
+        max_step = math.pi
+    else:
+        max_step = 2 * math.acos(1 - (tolerance / radius))
+    # never fewer than 4 lines per full circle
+    min_segments = math.ceil(sweep / (math.pi / 2))
+    return max(int(math.ceil(sweep / max_step)), min_segments, 1)
+
+
+def get_circle_coords(center, radius, start_rad=0, end_rad=None,
+                      tolerance=None):
     two_pi = 2 * math.pi
     thresh_radian = two_pi
     if end_rad is not None:
         while end_rad <= 0:
             end_rad += two_pi
         thresh_radian = end_rad
-    circum = radius * two_pi
-    draw_length = circum * (thresh_radian / two_pi)
-    radian_step = two_pi * (line_length / draw_length)
-    curr_radian = start_rad
+    sweep = thresh_radian - start_rad
+    while sweep <= 0:
+        sweep += two_pi
+    num_segments = get_arc_segments(radius, sweep, tolerance=tolerance)
+    radians = start_rad + np.linspace(0, sweep, num_segments + 1)
+    xs = center['x'] + (radius * np.sin(radians))
+    ys = center['y'] + (radius * np.cos(radians))
     points = []
-    while curr_radian <= thresh_radian:
+    for x, y in zip(xs.tolist(), ys.tolist()):
         p = center.copy()
-        p['x'] += radius * math.sin(curr_radian)
-        p['y'] += radius * math.cos(curr_radian)
+        p['x'] = x
+        p['y'] = y
         p['drawing'] = True
         points.append(p)
-        curr_radian += radian_step
     return points
 
 
+def get_arc_deviation(center, radius, points):
+    # furthest any of the lines between `points` strays from the circle,
+    # measured at the middle of each line
+    xy = np.array([[p['x'] - center['x'], p['y'] - center['y']] for p in points])
+    middles = (xy[1:] + xy[:-1]) / 2
+    return float(np.max(np.abs(radius - np.hypot(middles[:, 0], middles[:, 1]))))
+
+
 def get_line_coords(point_a, point_b):
     point_a = point_a.copy()
     point_b = point_b.copy()
@@ -151,38 +214,45 @@ def get_line_coords(point_a, point_b):
     return [point_a, point_b]
 
 
-def get_grid_coords(center, square_size):
-    line_length = square_size * 3
-    center_offset = square_size / 2
+def get_grid_coords(center, square_size, size=None):
+    if size is None:
+        size = board_size
+    line_length = square_size * size
 
     top = center['y'] + (line_length / 2)
     bottom = center['y'] - (line_length / 2)
     left = center['x'] - (line_length / 2)
     right = center['x'] + (line_length / 2)
 
+    # offsets from the center of the lines between each row/column
+    line_offsets = [
+        square_size * ((size / 2) - i) for i in range(1, size)]
+
+    # each line is a (start, end) pair of XY positions
+    lines = []
+    for offset in line_offsets:
+        y = center['y'] + offset
+        lines.append(((right, y), (left, y)))
+    for i, offset in enumerate(line_offsets):
+        x = center['x'] + offset
+        if i % 2:
+            lines.append(((x, bottom), (x, top)))
+        else:
+            lines.append(((x, top), (x, bottom)))
+
     touch_z = center['z']
     hover_z = center['z'] + hover_height
 
-    points = [
-        # line
-        {'x': right, 'y': center['y'] + center_offset, 'z': touch_z, 'drawing': True},
-        {'x': left, 'y': center['y'] + center_offset, 'z': touch_z, 'drawing': True},
-        {'x': left, 'y': center['y'] + center_offset, 'z': hover_z}, # lift up
-        # line
-        {'x': right, 'y': center['y'] - center_offset, 'z': hover_z}, # move
-        {'x': right, 'y': center['y'] - center_offset, 'z': touch_z, 'drawing': True},
-        {'x': left, 'y': center['y'] - center_offset, 'z': touch_z, 'drawing': True},
-        {'x': left, 'y': center['y'] - center_offset, 'z': hover_z}, # lift up
-        # line
-        {'x': center['x'] + center_offset, 'y': top, 'z': hover_z}, # move
-        {'x': center['x'] + center_offset, 'y': top, 'z': touch_z, 'drawing': True},
-        {'x': center['x'] + center_offset, 'y': bottom, 'z': touch_z, 'drawing': True},
-        {'x': center['x'] + center_offset, 'y': bottom, 'z': hover_z}, # lift up
-        # line
-        {'x': center['x'] - center_offset, 'y': bottom, 'z': hover_z}, # move
-        {'x': center['x'] - center_offset, 'y': bottom, 'z': touch_z, 'drawing': True},
-        {'x': center['x'] - center_offset, 'y': top, 'z': touch_z, 'drawing': True}
-    ]
+    points = []
+    for i, (start, end) in enumerate(lines):
+        if i > 0:
+            points.append({'x': start[0], 'y': start[1], 'z': hover_z}) # move
+        points.append(
+            {'x': start[0], 'y': start[1], 'z': touch_z, 'drawing': True})
+        points.append(
+            {'x': end[0], 'y': end[1], 'z': touch_z, 'drawing': True})
+        if i < len(lines) - 1:
+            points.append({'x': end[0], 'y': end[1], 'z': hover_z}) # lift up
     return points
 
 
@@ -198,20 +268,81 @@ def adjust_speed_during_drawing(bot, point, settings_pushed):
     return False
 
 
-def draw_shape(bot, points):
-    hover_pos = {ax: points[0][ax] for ax in 'xyz'}
-    hover_pos['z'] += hover_height
-    bot.move_to(**hover_pos)
+def compile_shape(points):
+    # every position `draw_shape()` moves through, as (x, y, z, drawing)
+    moves = tictactoe_strokes.get_shape_moves(points, hover_height)
+    return tuple(
+        (m['x'], m['y'], m['z'], bool(m.get('drawing'))) for m in moves)
+
+
+def stream_program(bot, queue, moves):
+    # the wrapper's speed and acceleration commands go out on the same
+    # connection, so they reach the firmware in order with the moves
     settings_pushed = False
-    for p in points:
-        settings_pushed = adjust_speed_during_drawing(bot, p, settings_pushed)
-        coord = {ax: p[ax] for ax in 'xyz'}
-        bot.move_to(**coord)
+    for x, y, z, drawing in moves:
+        if bool(drawing) != settings_pushed:
+            # moves already queued keep the speed they were queued with
+            queue.flush()
+        settings_pushed = adjust_speed_during_drawing(
+            bot, {'drawing': drawing}, settings_pushed)
+        queue.move_to(x=x, y=y, z=z)
+    # the wrapper didn't see these moves
+    queue.wait_for_arrival()
     if settings_pushed:
         bot.pop_settings()
-    hover_pos = {ax: points[-1][ax] for ax in 'xyz'}
-    hover_pos['z'] += hover_height
-    bot.move_to(**hover_pos)
+
+
+def run_program(bot, moves):
+    if motion_queue:
+        stream_program(bot, motion_queue, moves)
+        return
+    settings_pushed = False
+    for x, y, z, drawing in moves:
+        settings_pushed = adjust_speed_during_drawing(
+            bot, {'drawing': drawing}, settings_pushed)
+        bot.move_to(x=x, y=y, z=z)
+    if settings_pushed:
+        bot.pop_settings()
+
+
+def draw_shape(bot, points):
+    run_program(bot, compile_shape(points))
+
+
+def plan_program(shapes, start):
+    # order (and flip) the shapes' strokes to travel as little as possible
+    # with the pen up, then compile them into a single program
+    points, report = tictactoe_strokes.plan_strokes(
+        shapes, hover_height, start=start)
+    return tictactoe_programs.MotionProgram(
+        compile_shape(points), report['strokes'], report['saved_distance'])
+
+
+def get_drawing_program(key, get_shapes, get_offset=None):
+    # `get_shapes()` is only called if the program isn't cached yet, and
+    # drawings start from the `observer_pos` the arm watches the game from.
+    # Shapes that can go anywhere are cached once, and moved by
+    # `get_offset()` (x, y) after the lookup
+    update_region_locations()
+    program = program_cache.get(
+        tuple(key), get_layout_signature(),
+        lambda: plan_program(get_shapes(), observer_pos))
+    if get_offset:
+        program = tictactoe_programs.translate_program(program, get_offset())
+    return program
+
+
+def draw_program(bot, program):
+    saved_sec = tictactoe_strokes.estimate_seconds(
+        program.saved_distance, move_speed)
+    print('Drawing {0} strokes, {1:.1f}mm less pen-up travel (~{2:.2f}sec)'.format(
+        program.strokes, program.saved_distance, saved_sec))
+    run_program(bot, program.moves)
+
+
+def draw_shapes(bot, key, get_shapes):
+    # draw several shapes as a single job
+    draw_program(bot, get_drawing_program(key, get_shapes))
 
 
 def reset_uarm(bot):
@@ -231,136 +362,88 @@ def setup_uarm():
 
 def draw_playing_grid(bot):
     play_grid['center']['z'] = paper_height
-    grid_points = get_grid_coords(
-        play_grid['center'], play_grid['square_size'])
-    draw_shape(bot, grid_points)
-
-
-def get_number_mismatch(old_regions, new_regions):
-    old_regions = [bool(v) for v in old_regions]
-    if len(old_regions) != len(new_regions):
-        raise RuntimeError(
-            'Number old ({0}) doesnt match number new ({1})'.format(
-                len(old_regions), len(new_regions)))
-    mismatch_indexes = []
-    for i in range(len(old_regions)):
-        # only detect changes from False -> True
-        if not old_regions[i] and new_regions[i]:
-            mismatch_indexes.append(int(i))
-    return len(mismatch_indexes)
-
-
-def convert_camera_regions(old_regions, new_regions, empy_mark, user_mark):
-    converted_regions = []
-    for i, v in enumerate(old_regions):
-        if new_regions[i]:
-            if old_regions[i] != empy_mark:
-                converted_regions.append(int(old_regions[i])) # copy old value
-            else:
-                converted_regions.append(user_mark) # user drew the mark
-        else:
-            converted_regions.append(empy_mark) # it's empty
-    return converted_regions
-
-
-def get_region_to_draw(regions):
-
-    # sort by number of empty-markings
-    def _get_mode_mark_of_seq_idx(seq_idxs):
-        # return the mode of the region values
-        # these should only have either two values, EMPTY or UARM/USER marking
-        seq_vals = [regions[s_idx] for s_idx in seq_idxs]
-        return max(seq_vals, key=seq_vals.count)
-
-
-    def _reduce_to_winners_or_possible_winners(winner_seqs):
-        has_winner = False
-        winners_list = []
-        if len(winner_seqs):
-            for seq_idxs in winner_seqs:
-                if _get_mode_mark_of_seq_idx(seq_idxs) != empty_mark:
-                    has_winner = True
-                    winners_list.append(seq_idxs)
-        if has_winner:
-            winner_seqs = winners_list
-        random.shuffle(winner_seqs)  # randomized shuffle of indices
-        return winner_seqs, has_winner
-
-
-    def _get_empty_idx(seq_idxs):
-        empty_idxs = []
-        for idx in seq_idxs:
-            if regions[idx] == empty_mark:
-                empty_idxs.append(idx)
-        if not len(empty_idxs):
-            return None
-        random.shuffle(empty_idxs)  # randomized shuffle of indices
-        return empty_idxs[0]
-
-
-    # loop through each uarm/user marked region
-    uarm_winners = []
-    user_winners = []
-    for r_idx, val in enumerate(regions):
-        for seq_idxs in winning_sequences:
-            if r_idx == seq_idxs[0]:
-                seq_vals = [regions[s_idx] for s_idx in seq_idxs]
-                # get list of possible winning sequences
-                if user_mark not in seq_vals:
-                    uarm_winners.append(seq_idxs)
-                if uarm_mark not in seq_vals:
-                    user_winners.append(seq_idxs)
-
-    uarm_winners, _ = _reduce_to_winners_or_possible_winners(uarm_winners)
-    user_winners, user_has_winner = _reduce_to_winners_or_possible_winners(user_winners)
-
-    if user_has_winner:
-        # play defense
-        return _get_empty_idx(user_winners[0])
-    elif len(uarm_winners):
-        # play offense
-        return _get_empty_idx(uarm_winners[0])
-    else:
-        # no possible winner, pick randomly from empty regions
-        return _get_empty_idx([i for i in range(num_squares)])
+    draw_shapes(bot, ('grid',), lambda: [get_grid_coords(
+        play_grid['center'], play_grid['square_size'])])
 
 
-def draw_mark_on_region(bot, region_idx, mark):
+def get_number_mismatch(board, new_regions):
+    # only detect changes from empty -> drawn
+    return popcount(board.added(board.camera_mask(new_regions)))
+
+
+def convert_camera_regions(board, new_regions, new_mark):
+    # regions the camera newly sees were drawn with `new_mark`,
+    # and regions the camera doesn't see anymore are empty
+    camera_mask = board.camera_mask(new_regions)
+    converted = board.copy({
+        p: mask & camera_mask for p, mask in board.masks.items()})
+    converted.masks[new_mark] |= board.added(camera_mask)
+    return converted
+
+
+def get_region_to_draw(regions, tie_break=True):
+    # randomly picks between equally good moves, unless `tie_break` is False
+    if board_size == 3 and win_length == 3:
+        # classic tic-tac-toe is solved, so look up a perfect move
+        return tictactoe_solver.get_best_move(
+            regions, uarm_mark, tie_break=tie_break)
+    return game_engine.best_move(
+        regions, uarm_mark, time_budget=move_time_budget, tie_break=tie_break)
+
+
+def get_mark_coords(region_idx, mark):
     loc = region_locations[region_idx].copy()
     loc['z'] = paper_height
-    coords = None
     mark_radius = play_grid['square_size'] * 0.25
-    if mark.lower() == 'x':
-        coords = get_cross_coords(loc, mark_radius)
-    elif mark.lower() == 'o':
-        coords = get_circle_coords(loc, mark_radius)
-    else:
+    if mark == 'x':
+        return get_cross_coords(loc, mark_radius)
+    return get_circle_coords(loc, mark_radius)
+
+
+def draw_mark_on_region(bot, region_idx, mark):
+    mark = mark.lower()
+    if mark not in ['x', 'o']:
         raise RuntimeError('Unknown marking: {0}'.format(mark))
-    draw_shape(bot, coords)
+    draw_shapes(
+        bot, ('mark', region_idx, mark),
+        lambda: [get_mark_coords(region_idx, mark)])
 
 
-def draw_winning_line(bot, win_idxs):
+def get_winning_line_coords(win_idxs):
     min_idx = min(win_idxs)
     max_idx = max(win_idxs)
     min_loc = region_locations[min_idx].copy()
     max_loc = region_locations[max_idx].copy()
     min_loc['z'] = paper_height
     max_loc['z'] = paper_height
-    points = get_line_coords(min_loc, max_loc)
-    draw_shape(bot, points)
+    return get_line_coords(min_loc, max_loc)
 
 
-def draw_face(bot, regions, happy):
-    empty_idxs = [i for i, r in enumerate(regions) if r == empty_mark]
-    face_loc = None
-    if len(empty_idxs):
-        random.shuffle(empty_idxs)
-        face_loc = region_locations[empty_idxs[0]].copy()
+def draw_winning_line(bot, win_idxs):
+    draw_shape(bot, get_winning_line_coords(win_idxs))
+
+
+def get_face_region(regions):
+    # a random empty region to draw the face in, or None if there are none
+    empty_idxs = regions.empties()
+    if not len(empty_idxs):
+        return None
+    random.shuffle(empty_idxs)
+    return empty_idxs[0]
+
+
+def get_face_location(face_idx):
+    # below the grid if there's no empty region
+    if face_idx is not None:
+        face_loc = region_locations[face_idx].copy()
     else:
-        face_loc = region_locations[-2]
+        face_loc = region_locations[-2].copy()
         face_loc['x'] -= play_grid['square_size']
     face_loc['z'] = paper_height
+    return face_loc
 
+
+def get_face_shapes(face_loc, happy):
     face_radius = play_grid['square_size'] * 0.3
     eye_x_offset = face_radius * 0.3
     eye_y_offset = face_radius * 0.3
@@ -368,7 +451,6 @@ def draw_face(bot, regions, happy):
     mouth_radius = face_radius * 0.6
 
     circle_coords = get_circle_coords(face_loc, face_radius)
-    draw_shape(bot, circle_coords)
 
     eye_left_center = face_loc.copy()
     eye_left_center['x'] -= eye_x_offset
@@ -378,7 +460,6 @@ def draw_face(bot, regions, happy):
     eye_left_top['x'] += (eye_height / 2)
     eye_left_bottom['x'] -= (eye_height / 2)
     eye_left_points = get_line_coords(eye_left_top, eye_left_bottom)
-    draw_shape(bot, eye_left_points)
 
     eye_right_center = face_loc.copy()
     eye_right_center['x'] -= eye_x_offset
@@ -388,7 +469,6 @@ def draw_face(bot, regions, happy):
     eye_right_top['x'] += (eye_height / 2)
     eye_right_bottom['x'] -= (eye_height / 2)
     eye_right_points = get_line_coords(eye_right_top, eye_right_bottom)
-    draw_shape(bot, eye_right_points)
 
     mouth_center = face_loc.copy()
     if not happy:
@@ -398,9 +478,43 @@ def draw_face(bot, regions, happy):
     if not happy:
         mouth_start, mouth_end = mouth_end, mouth_start
     mouth_coords = get_circle_coords(
-        mouth_center, mouth_radius, line_length=2,
+        mouth_center, mouth_radius,
         start_rad=mouth_start, end_rad=mouth_end)
-    draw_shape(bot, mouth_coords)
+    return [circle_coords, eye_left_points, eye_right_points, mouth_coords]
+
+
+def get_face_program(face_idx, happy):
+    # the face is planned at the grid's center, and moved to its region
+
+    def _get_center():
+        center = play_grid['center'].copy()
+        center['z'] = paper_height
+        return center
+
+    def _get_offset():
+        face_loc = get_face_location(face_idx)
+        center = _get_center()
+        return (face_loc['x'] - center['x'], face_loc['y'] - center['y'])
+
+    return get_drawing_program(
+        ('face', happy), lambda: get_face_shapes(_get_center(), happy),
+        _get_offset)
+
+
+def draw_face(bot, regions, happy):
+    draw_program(bot, get_face_program(get_face_region(regions), happy))
+
+
+def draw_end_of_game(bot, regions, win_idxs, happy):
+    # the winning line and the face are drawn as one job
+    face_idx = get_face_region(regions)
+    programs = []
+    if win_idxs:
+        win_idxs = tuple(win_idxs)
+        programs.append(get_drawing_program(
+            ('line', win_idxs), lambda: [get_winning_line_coords(win_idxs)]))
+    programs.append(get_face_program(face_idx, happy))
+    draw_program(bot, tictactoe_programs.join_programs(programs))
 
 
 def monitor_grid(bot):
@@ -409,42 +523,76 @@ def monitor_grid(bot):
     bot.wait_for_arrival()
 
 
-def are_regions_full(regions):
-    for r in regions:
-        if not r:
+def observe_grid(bot, camera, num_frames=None):
+    # moves up to the `observer_pos` while the camera keeps reading frames,
+    # then returns the camera's state as soon as `num_frames` frames in a
+    # row, all captured after the arm arrived, agree with each other
+    if num_frames is None:
+        num_frames = observe_frames
+    arrival = {'time': None, 'error': None}
+    agreed = []
+
+    def _approach():
+        try:
+            monitor_grid(bot)
+        except Exception as e:
+            arrival['error'] = e
+        arrival['time'] = time.monotonic()
+
+    def _frame_key(frame):
+        return (frame['empty'], frame['moving'], tuple(frame['regions']))
+
+    def _is_decided(frame):
+        if arrival['error']:
+            raise arrival['error']
+        arrival_time = arrival['time']
+        if arrival_time is None:
+            return False # still on the way, so the camera is moving too
+        if frame.get('capture_time', arrival_time) < arrival_time:
             return False
-    return True
+        if frame['moving']:
+            return True # nothing to decide until it stops
+        if agreed and _frame_key(agreed[-1]) != _frame_key(frame):
+            del agreed[:]
+        agreed.append(frame)
+        return len(agreed) >= num_frames
+
+    approach = threading.Thread(
+        target=_approach, name='monitor_grid', daemon=True)
+    approach.start()
+    try:
+        state = camera.wait_for(_is_decided)
+    finally:
+        approach.join()
+    if arrival['error']:
+        raise arrival['error']
+    return state
+
+
+def are_regions_full(regions):
+    return regions.is_full()
 
 
 def are_regions_empty(regions):
-    for r in regions:
-        if r:
-            return False
-    return True
+    return regions.is_empty()
 
 
 def get_winner_indices(regions):
-    # go through each region
-    for idx, m in enumerate(regions):
-        # for the region, go through each sequence
-        for seq in winning_sequences:
-            # if the region matches the sequences first spot, test it
-            if idx == seq[0] and m != empty_mark:
-                # count all the matching regions in the sequence
-                matches = sum([1 if regions[i] == m else 0 for i in seq])
-                # if all the regions match, it's a winner
-                if matches == len(seq):
-                    return seq
-    return None
+    return regions.winning_line()
 
 
 def print_regions(regions):
     region_marks = [mark_to_char[v] for v in regions]
-    print(print_output_format.format(*region_marks))
+    rows = [
+        ' ' + ' | '.join(region_marks[i:i + board_size])
+        for i in range(0, num_squares, board_size)]
+    divider = '-' * ((board_size * 4) - 1)
+    stars = '*' * len(divider)
+    print('\n'.join(['', stars, ('\n' + divider + '\n').join(rows), stars]))
 
 
 def run_cli_game():
-    regions = [empty_mark for i in range(num_squares)]
+    regions = game_engine.new_board()
     uarm_turn = True
     while True:
         if uarm_turn:
@@ -468,7 +616,7 @@ def run_cli_game():
                 print('{0} is the winner! -> {1}'.format(m, win_idx))
             else:
                 print('No winner, restarting game')
-            regions = [empty_mark for i in range(num_squares)]
+            regions = game_engine.new_board()
             uarm_turn = True
 
 
@@ -477,9 +625,10 @@ def auto_mode(bot, camera):
     def _wait_for_empty(state):
         print('Please start with an empty playing space. Waiting...')
         monitor_grid(bot)
-        while not state['empty'] or state['moving']:
-            time.sleep(0.5)
-            state = camera.read_json()
+        if not state['empty'] or state['moving']:
+            camera.wait_for(
+                lambda s: s['empty'] and not s['moving'],
+                captured_after=time.monotonic())
         print('Thank you, playing space is now empty')
 
 
@@ -490,26 +639,24 @@ def auto_mode(bot, camera):
             if win_idx:
                 win_mark = regions[win_idx[0]]
                 print('{0} is the winner!'.format(mark_to_char[win_mark]))
-                draw_winning_line(bot, win_idx)
                 happy = (win_mark == uarm_mark)
-                draw_face(bot, regions, happy)
+                draw_end_of_game(bot, regions, win_idx, happy)
             else:
                 print('No winner!')
-                draw_face(bot, regions, False)
+                draw_end_of_game(bot, regions, None, False)
             _wait_for_empty(state)
             return True
         return False
 
 
     game_state = {
-        'regions': [empty_mark for i in range(num_squares)],
+        'regions': game_engine.new_board(),
     }
     just_started = True
     while True:
-        # move to the top each time, and get the state from the camera
-        monitor_grid(bot)
-        time.sleep(0.5)
-        state = camera.read_json()
+        # move to the top each time, and get the state from the camera,
+        # only trusting images taken after the arm has stopped moving
+        state = observe_grid(bot, camera)
 
         # do nothing while there's movement
         if state['moving']:
@@ -519,7 +666,7 @@ def auto_mode(bot, camera):
         if state['empty']:
             just_started = False
             draw_playing_grid(bot)
-            game_state['regions'] = [empty_mark for i in range(num_squares)]
+            game_state['regions'] = game_engine.new_board()
             # HACK: overwrite camera state, to force it to immediately
             #       start drawing it's first mark, without first rising up
             state['empty'] = False
@@ -527,7 +674,7 @@ def auto_mode(bot, camera):
             state['regions'] = [empty_mark for i in range(num_squares)]
 
         # make sure we're not starting with a previously started game
-        total_drawn = sum([1 if v else 0 for v in state['regions']])
+        total_drawn = popcount(camera_to_mask(state['regions'], num_squares))
         if just_started:
             if total_drawn == 0:
                 just_started = False
@@ -550,7 +697,7 @@ def auto_mode(bot, camera):
 
         # update regions from the camera
         game_state['regions'] = convert_camera_regions(
-            game_state['regions'], state['regions'], empty_mark, user_mark)
+            game_state['regions'], state['regions'], user_mark)
         print_regions(game_state['regions'])
 
         # did the user just end the game?
@@ -599,8 +746,14 @@ if __name__ == "__main__":
     if input(input_msg.format('simulate a game')):
         run_cli_game()
     camera = openmv_port.OpenMVPort()
+    camera.find_port()
+    # keep compiled drawings between runs
+    program_cache.path = tictactoe_programs.PROGRAMS_CACHE_PATH
+    program_cache.load()
+    atexit.register(program_cache.save)
     robot = setup_uarm()
     atexit.register(robot.sleep)
+    motion_queue = uarm_motion_queue.UArmMotionQueue(robot)
     if input(input_msg.format('find paper height')):
         paper_height = find_paper_height(robot)
         print('Paper height is: {0}'.format(paper_height))
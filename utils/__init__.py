@@ -1 +1,14 @@
+from . import openmv_protocol
+from . import openmv_clock
+from . import openmv_discovery
+from . import openmv_mailbox
 from . import openmv_port
+from . import openmv_port_async
+from . import openmv_mux
+from . import openmv_recorder
+from . import openmv_replay
+from . import openmv_stats
+from . import benchmark
+from . import uarm_loopback
+from . import uarm_motion_queue
+from . import openmv_host
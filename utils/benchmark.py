@@ -0,0 +1,166 @@
+import json
+import os
+import subprocess
+import time
+
+
+# uArm wrapper methods that send at least one command over serial
+UARM_SERIAL_COMMANDS = (
+    'move_to',
+    'move_relative',
+    'rotate_to',
+    'wait_for_arrival',
+    'pump',
+    'home',
+    'update_position',
+    'get_base_angle',
+    'can_move_to',
+    'enable_all_motors',
+    'disable_all_motors',
+    'sleep'
+)
+
+
+class BenchmarkFinished(Exception):
+    # raised from inside a project's endless loop, to end a benchmark run
+    pass
+
+
+class PhaseTimer(object):
+    # Wraps module-level functions, so every call records its wall time and
+    # the number of serial commands sent while it ran. Phases can be nested,
+    # times and command counts are inclusive of any nested phases.
+
+    def __init__(self):
+        self.phases = {}
+        self._stack = []
+        self._originals = []
+
+    def _phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = {'calls': 0, 'total': 0.0, 'commands': 0}
+        return self.phases[name]
+
+    def wrap(self, module, name, stop_after=None):
+        original = getattr(module, name)
+        self._originals.append((module, name, original))
+        phase = self._phase(name)
+
+        def _timed(*args, **kwargs):
+            if name in self._stack:
+                # recursive call, already being timed by the outer call
+                return original(*args, **kwargs)
+            self._stack.append(name)
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                phase['total'] += time.perf_counter() - start
+                phase['calls'] += 1
+                self._stack.pop()
+                if stop_after and phase['calls'] >= stop_after:
+                    raise BenchmarkFinished(
+                        '{0} called {1} times'.format(name, phase['calls']))
+
+        setattr(module, name, _timed)
+        return _timed
+
+    def restore(self):
+        for module, name, original in reversed(self._originals):
+            setattr(module, name, original)
+        self._originals = []
+
+    def count_command(self):
+        for name in self._stack:
+            self.phases[name]['commands'] += 1
+
+    def as_dict(self):
+        return {
+            name: {
+                'calls': p['calls'],
+                'total': round(p['total'], 4),
+                'mean': round(p['total'] / p['calls'], 4) if p['calls'] else None,
+                'commands': p['commands']
+            }
+            for name, p in self.phases.items()
+        }
+
+
+class CountingBot(object):
+    # Stands in front of a uArm wrapper instance, counting every method
+    # call and tracking where the arm was last told to move
+
+    def __init__(self, bot, timer=None):
+        self._bot = bot
+        self._timer = timer
+        self.calls = {}
+        self.tracked_position = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+
+    @property
+    def commands(self):
+        return sum([self.calls.get(c, 0) for c in UARM_SERIAL_COMMANDS])
+
+    def _track(self, name, kwargs):
+        if name == 'move_to':
+            for ax in 'xyz':
+                if kwargs.get(ax) is not None:
+                    self.tracked_position[ax] = kwargs[ax]
+        elif name == 'move_relative':
+            for ax in 'xyz':
+                if kwargs.get(ax) is not None:
+                    self.tracked_position[ax] += kwargs[ax]
+
+    def __getattr__(self, name):
+        attr = getattr(self._bot, name)
+        if not callable(attr):
+            return attr
+
+        def _counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self._timer and name in UARM_SERIAL_COMMANDS:
+                self._timer.count_command()
+            self._track(name, kwargs)
+            ret = attr(*args, **kwargs)
+            # keep method chaining going through this object
+            if ret is self._bot:
+                return self
+            return ret
+
+        return _counted
+
+
+def get_git_commit(path='.'):
+    try:
+        out = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=path, stderr=subprocess.DEVNULL)
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path, name=None):
+    results = []
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue
+            if name is None or r.get('name') == name:
+                results.append(r)
+    return results
+
+
+def save_result(path, result):
+    with open(path, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+def compare_results(previous, current, metric):
+    # percentage change of `metric`, positive means `current` is higher
+    if not previous or not previous.get(metric) or current.get(metric) is None:
+        return None
+    return ((current[metric] - previous[metric]) / previous[metric]) * 100
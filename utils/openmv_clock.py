@@ -0,0 +1,80 @@
+import collections
+import time
+
+
+# MicroPython's `utime.ticks_ms()` wraps around at 2^30 milliseconds
+OPENMV_CLOCK_TICKS_PERIOD_MS = 1 << 30
+OPENMV_CLOCK_DEFAULT_WINDOW = 200
+
+
+class CameraClock(object):
+    # Estimates the offset between the camera's millisecond clock and the
+    # host's `time.monotonic()`. Every frame gives one sample of
+    # (host receive time - camera capture time), which is the true offset
+    # plus the transmission delay. Delays are never negative, so the
+    # smallest sample in a recent window is the best offset estimate, and
+    # the window lets the estimate follow slow drift between the clocks.
+    # Estimated capture times err late by the smallest transmission delay,
+    # which is only a few milliseconds over USB.
+
+    def __init__(self, window=OPENMV_CLOCK_DEFAULT_WINDOW):
+        self._samples = collections.deque(maxlen=window)
+        self._offset = None
+        self._last_ticks = None
+        self._wraps = 0
+        self._last_seq = None
+
+    def reset(self):
+        self._samples.clear()
+        self._offset = None
+        self._last_ticks = None
+        self._wraps = 0
+        self._last_seq = None
+
+    @property
+    def offset(self):
+        return self._offset
+
+    def _unwrap(self, ticks_ms):
+        # a large backwards jump means the camera's ticks wrapped around
+        if self._last_ticks is not None:
+            if ticks_ms < self._last_ticks - (OPENMV_CLOCK_TICKS_PERIOD_MS / 2):
+                self._wraps += 1
+        self._last_ticks = ticks_ms
+        return (ticks_ms + (self._wraps * OPENMV_CLOCK_TICKS_PERIOD_MS)) / 1000
+
+    def update(self, ticks_ms, received_time=None):
+        # returns the estimated host time the frame was captured at
+        if received_time is None:
+            received_time = time.monotonic()
+        camera_time = self._unwrap(ticks_ms)
+        sample = received_time - camera_time
+        if len(self._samples) == self._samples.maxlen:
+            oldest = self._samples[0]
+            self._samples.append(sample)
+            if oldest == self._offset:
+                self._offset = min(self._samples)
+            else:
+                self._offset = min(self._offset, sample)
+        else:
+            self._samples.append(sample)
+            if self._offset is None or sample < self._offset:
+                self._offset = sample
+        return camera_time + self._offset
+
+    def stamp(self, frame, received_time=None):
+        # adds 'capture_time', the host time.monotonic() the camera took the
+        # image at, or the time it was received for unstamped frames
+        if received_time is None:
+            received_time = time.monotonic()
+        if not isinstance(frame, dict):
+            return frame
+        if 'time' not in frame:
+            frame['capture_time'] = received_time
+            return frame
+        seq = frame.get('seq')
+        if seq is not None and self._last_seq is not None and seq < self._last_seq:
+            self.reset() # the camera restarted
+        self._last_seq = seq
+        frame['capture_time'] = self.update(frame['time'], received_time)
+        return frame
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+from serial.tools.list_ports import comports
+
+from .openmv_protocol import FrameDecoder
+
+
+# USB identity of the OpenMV Cam's virtual COM port
+OPENMV_USB_VID = 0x1209
+OPENMV_USB_PID = 0xABD1
+
+OPENMV_DISCOVERY_BAUDRATE = 115200
+OPENMV_DISCOVERY_PROBE_TIMEOUT_SEC = 2
+OPENMV_DISCOVERY_MAX_WORKERS = 8
+OPENMV_DISCOVERY_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.uarm_projects', 'openmv_port.json')
+
+
+def list_candidate_ports(vid=OPENMV_USB_VID, pid=OPENMV_USB_PID,
+                         serial_number=None):
+    # any of the filters set to None will match everything
+    candidates = []
+    for info in comports():
+        if vid is not None and info.vid != vid:
+            continue
+        if pid is not None and info.pid != pid:
+            continue
+        if serial_number is not None and info.serial_number != serial_number:
+            continue
+        candidates.append(info.device)
+    return candidates
+
+
+def get_port_identity(device):
+    identity = {'device': device}
+    for info in comports():
+        if info.device == device:
+            identity['vid'] = info.vid
+            identity['pid'] = info.pid
+            identity['serial_number'] = info.serial_number
+    return identity
+
+
+def probe_port(device, baudrate=OPENMV_DISCOVERY_BAUDRATE,
+               timeout=OPENMV_DISCOVERY_PROBE_TIMEOUT_SEC):
+    # a port is a camera if it sends at least one valid frame in time
+    try:
+        port = serial.Serial(port=device, baudrate=baudrate, timeout=0.1)
+    except (serial.SerialException, OSError):
+        return False
+    decoder = FrameDecoder()
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            decoder.feed(port.read(max(1, port.in_waiting)))
+            if decoder.next_frame() is not None:
+                return True
+    except (serial.SerialException, OSError):
+        return False
+    finally:
+        port.close()
+    return False
+
+
+def probe_ports(devices, baudrate=OPENMV_DISCOVERY_BAUDRATE,
+                timeout=OPENMV_DISCOVERY_PROBE_TIMEOUT_SEC):
+    # probe every candidate at once, and return the first one that answers
+    if not devices:
+        return None
+    num_workers = min(len(devices), OPENMV_DISCOVERY_MAX_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    futures = {
+        executor.submit(probe_port, d, baudrate, timeout): d
+        for d in devices
+    }
+    try:
+        for fut in as_completed(futures):
+            if fut.result():
+                return futures[fut]
+    finally:
+        # don't wait for the slower probes, they close their own ports
+        for fut in futures:
+            fut.cancel()
+        executor.shutdown(wait=False)
+    return None
+
+
+def load_cached_identity(cache_path=OPENMV_DISCOVERY_CACHE_PATH):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_identity(identity, cache_path=OPENMV_DISCOVERY_CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(identity, f)
+    except OSError:
+        pass # caching is only an optimization
+
+
+def _matches_identity(identity, vid, pid, serial_number):
+    # the cached camera must be the one asked for, with two attached
+    for key, value in [('vid', vid), ('pid', pid),
+                       ('serial_number', serial_number)]:
+        if value is not None and identity.get(key) != value:
+            return False
+    return True
+
+
+def _get_cached_device(identity):
+    # device paths can change between boots, so prefer the serial number
+    if identity.get('serial_number'):
+        devices = list_candidate_ports(
+            vid=identity.get('vid'), pid=identity.get('pid'),
+            serial_number=identity['serial_number'])
+        if devices:
+            return devices[0]
+    return identity.get('device')
+
+
+def discover_camera_port(candidates=None, vid=OPENMV_USB_VID,
+                         pid=OPENMV_USB_PID, serial_number=None,
+                         cache_path=OPENMV_DISCOVERY_CACHE_PATH,
+                         baudrate=OPENMV_DISCOVERY_BAUDRATE,
+                         timeout=OPENMV_DISCOVERY_PROBE_TIMEOUT_SEC,
+                         verbose=False):
+    # first try the port that worked last time, with a single probe
+    cached = None
+    if cache_path:
+        identity = load_cached_identity(cache_path)
+        if identity and _matches_identity(identity, vid, pid, serial_number):
+            cached = _get_cached_device(identity)
+        if cached and probe_port(cached, baudrate=baudrate, timeout=timeout):
+            if verbose:
+                print('OpenMV found at cached port:', cached)
+            return cached
+    # then scan everything that looks like a camera
+    if candidates is None:
+        candidates = list_candidate_ports(
+            vid=vid, pid=pid, serial_number=serial_number)
+    candidates = [d for d in candidates if d != cached]
+    if verbose:
+        print('OpenMV probing ports:', candidates)
+    device = probe_ports(candidates, baudrate=baudrate, timeout=timeout)
+    if not device:
+        raise RuntimeError('Could not find an OpenMV camera port')
+    if cache_path:
+        save_cached_identity(get_port_identity(device), cache_path)
+    if verbose:
+        print('OpenMV found at port:', device)
+    return device
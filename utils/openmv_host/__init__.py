@@ -0,0 +1,69 @@
+import contextlib
+import io
+import os
+import runpy
+import sys
+import time
+
+from . import frames
+from . import image
+from . import pyb
+from . import sensor
+from . import utime
+from .frames import EndOfFrames, FrameSource
+
+
+# Runs the OpenMV camera scripts (`*_openmv.py`) on a computer, unmodified,
+# with NumPy versions of the `sensor`, `image`, `pyb` and `utime` modules
+# and pictures read from image folders, .npy stacks or video files.
+#
+#   python -m utils.openmv_host tictactoe/tictactoe_openmv.py frames/
+
+EMULATED_MODULES = {
+    'sensor': sensor,
+    'image': image,
+    'pyb': pyb,
+    'utime': utime
+}
+
+
+@contextlib.contextmanager
+def installed():
+    # makes `import sensor` (etc.) find the emulated modules
+    previous = {name: sys.modules.get(name) for name in EMULATED_MODULES}
+    sys.modules.update(EMULATED_MODULES)
+    try:
+        yield
+    finally:
+        for name, module in previous.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+def run_script(path, source, loop=False, max_frames=None, requests=None,
+               output=None):
+    # runs the camera script at `path` until its frames run out, returning
+    # the number of frames and how long they took; the script's output
+    # goes to `output` (a text file), or stdout when it's None
+    sensor.reset()
+    source = sensor.set_source(source, loop=loop, max_frames=max_frames)
+    for r in requests or []:
+        pyb.send_to_camera(r)
+    redirect = contextlib.nullcontext()
+    if output is not None:
+        redirect = contextlib.redirect_stdout(output)
+    start = time.perf_counter()
+    with installed(), redirect:
+        try:
+            runpy.run_path(path, run_name='__main__')
+        except EndOfFrames:
+            pass
+    seconds = time.perf_counter() - start
+    return {
+        'script': os.path.basename(path),
+        'frames': source.count,
+        'seconds': seconds,
+        'fps': source.count / seconds if seconds else None
+    }
@@ -0,0 +1,66 @@
+import argparse
+import cProfile
+import os
+import pstats
+
+from . import run_script
+
+
+class _DiscardOutput(object):
+    # a text stream with a `buffer`, for binary frames from `pyb.USB_VCP`
+
+    def __init__(self):
+        self.buffer = self
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.openmv_host',
+        description='Run an OpenMV camera script on pictures from a folder, '
+                    '.npy file or video, using emulated camera modules')
+    parser.add_argument('script', help='camera script, like tictactoe_openmv.py')
+    parser.add_argument('source', help='image folder, image, .npy or video')
+    parser.add_argument('--loop', action='store_true',
+                        help='replay the frames until --frames is reached')
+    parser.add_argument('--frames', type=int, default=None,
+                        help='stop after this many frames')
+    parser.add_argument('--request', action='append', default=[],
+                        help='send this to the camera first, like BIN or EVENTS')
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't print the script's output")
+    parser.add_argument('--profile', type=int, nargs='?', const=25,
+                        default=None, metavar='N',
+                        help='profile the script, printing the top N calls')
+    args = parser.parse_args()
+    if args.loop and args.frames is None:
+        parser.error('--loop needs --frames')
+    if not os.path.isfile(args.script):
+        parser.error('No such script: {0}'.format(args.script))
+
+    def _run():
+        return run_script(
+            args.script, args.source, loop=args.loop, max_frames=args.frames,
+            requests=[r.encode() for r in args.request],
+            output=_DiscardOutput() if args.quiet else None)
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(_run)
+    else:
+        result = _run()
+    print('{script}: {frames} frames in {seconds:.3f}s -> {fps:.1f} fps'.format(
+        **result))
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(
+            args.profile)
+
+
+if __name__ == '__main__':
+    main()
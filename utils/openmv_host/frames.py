@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+
+
+# Frames for the emulated `sensor.snapshot()`, read from:
+#
+#   - a folder of images, played in filename order
+#   - a single image, which is played once (or forever with `loop=True`)
+#   - a .npy file, holding one image or a stack of them
+#   - a video file
+#
+# Frames are NumPy arrays, (height, width) for grayscale and
+# (height, width, 3) for RGB. PGM/PPM and .npy are read with NumPy alone,
+# other image formats need Pillow, and videos need OpenCV.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.pgm', '.ppm',
+                    '.pnm', '.npy')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.mjpeg', '.webm')
+
+
+class EndOfFrames(Exception):
+    pass
+
+
+def _read_pnm(path):
+    # binary PGM (P5) and PPM (P6), 8 bits per sample
+    with open(path, 'rb') as f:
+        data = f.read()
+    fields = []
+    idx = 0
+    while len(fields) < 4:
+        while data[idx:idx + 1].isspace():
+            idx += 1
+        if data[idx:idx + 1] == b'#':
+            idx = data.index(b'\n', idx) + 1
+            continue
+        start = idx
+        while not data[idx:idx + 1].isspace():
+            idx += 1
+        fields.append(data[start:idx])
+    magic, width, height, max_value = fields
+    if magic not in (b'P5', b'P6') or int(max_value) > 255:
+        raise ValueError('Only 8-bit binary PGM/PPM is supported: {0}'.format(
+            path))
+    channels = 3 if magic == b'P6' else 1
+    width, height = int(width), int(height)
+    pixels = np.frombuffer(
+        data, dtype=np.uint8, count=width * height * channels, offset=idx + 1)
+    if channels == 1:
+        return pixels.reshape(height, width)
+    return pixels.reshape(height, width, 3)
+
+
+def load_image(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        return np.load(path)
+    if ext in ('.pgm', '.ppm', '.pnm'):
+        return _read_pnm(path)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError(
+            'Reading {0} frames needs Pillow (pip install pillow)'.format(ext))
+    with Image.open(path) as img:
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
+        return np.asarray(img)
+
+
+def save_image(path, pixels):
+    # saves as PGM/PPM or .npy without any other libraries
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        np.save(path, pixels)
+        return
+    if ext in ('.pgm', '.ppm', '.pnm'):
+        magic = b'P6' if pixels.ndim == 3 else b'P5'
+        header = magic + ' {0} {1} 255\n'.format(
+            pixels.shape[1], pixels.shape[0]).encode()
+        with open(path, 'wb') as f:
+            f.write(header + np.ascontiguousarray(pixels, np.uint8).tobytes())
+        return
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError(
+            'Writing {0} frames needs Pillow (pip install pillow)'.format(ext))
+    Image.fromarray(pixels).save(path)
+
+
+def _iter_video(path):
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError(
+            'Reading video frames needs OpenCV (pip install opencv-python)')
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise RuntimeError('Could not open video: {0}'.format(path))
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+
+def list_image_files(folder):
+    names = sorted(
+        n for n in os.listdir(folder)
+        if os.path.splitext(n)[1].lower() in IMAGE_EXTENSIONS)
+    return [os.path.join(folder, n) for n in names]
+
+
+class FrameSource(object):
+    # Plays frames from `source`, a path or a sequence of arrays, raising
+    # `EndOfFrames` once they run out (unless `loop` is set). Image
+    # folders are read lazily, one file per frame.
+
+    def __init__(self, source, loop=False, max_frames=None):
+        self.source = source
+        self.loop = loop
+        self.max_frames = max_frames
+        self.count = 0
+        self._frames = None
+        self._iter = None
+        if isinstance(source, str):
+            if not os.path.exists(source):
+                raise RuntimeError('No such frame source: {0}'.format(source))
+        else:
+            self._frames = list(source)
+            if not self._frames:
+                raise RuntimeError('Frame source has no frames')
+
+    def _open(self):
+        if self._frames is not None:
+            return iter(self._frames)
+        path = self.source
+        if os.path.isdir(path):
+            files = list_image_files(path)
+            if not files:
+                raise RuntimeError('No images found in: {0}'.format(path))
+            return (load_image(p) for p in files)
+        ext = os.path.splitext(path)[1].lower()
+        if ext in VIDEO_EXTENSIONS:
+            return _iter_video(path)
+        pixels = load_image(path)
+        if ext == '.npy' and pixels.ndim in (3, 4) and not (
+                pixels.ndim == 3 and pixels.shape[-1] == 3):
+            return iter(pixels) # a stack of frames
+        return iter([pixels])
+
+    def rewind(self):
+        self._iter = None
+
+    def next_frame(self):
+        if self.max_frames is not None and self.count >= self.max_frames:
+            raise EndOfFrames('Played {0} frames'.format(self.count))
+        if self._iter is None:
+            self._iter = self._open()
+        try:
+            frame = next(self._iter)
+        except StopIteration:
+            if not self.loop or not self.count:
+                raise EndOfFrames('Played {0} frames'.format(self.count))
+            self._iter = self._open()
+            frame = next(self._iter)
+        self.count += 1
+        return np.asarray(frame, dtype=np.uint8)
@@ -0,0 +1,659 @@
+import math
+
+import numpy as np
+
+from .frames import load_image, save_image
+
+
+# NumPy version of the parts of OpenMV's `image` module used by the camera
+# scripts. Grayscale images are (height, width) uint8 arrays, and RGB565
+# images are (height, width, 3) uint8 arrays. Color thresholds and
+# statistics for RGB images are in LAB, the same as on the camera.
+#
+# Differences from the camera:
+#   - `find_blobs()` looks at every pixel, ignoring `x_stride`/`y_stride`
+#   - `draw_string()` does not render any text
+#   - `rotation_corr()` only does `z_rotation` and `zoom`
+
+GRAYSCALE = 'grayscale'
+RGB565 = 'rgb565'
+
+_lens_maps = {}
+_rotation_maps = {}
+
+
+def _rgb_to_lab(pixels):
+    # sRGB (D65) to integer LAB, with L in [0, 100] and A/B in [-128, 127]
+    rgb = pixels.astype(np.float32) / 255
+    rgb = np.where(
+        rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = rgb @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505]], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), (7.787 * xyz) + (16 / 116))
+    lab = np.empty(f.shape, dtype=np.int16)
+    lab[..., 0] = np.clip(np.round((116 * f[..., 1]) - 16), 0, 100)
+    lab[..., 1] = np.clip(np.round(500 * (f[..., 0] - f[..., 1])), -128, 127)
+    lab[..., 2] = np.clip(np.round(200 * (f[..., 1] - f[..., 2])), -128, 127)
+    return lab
+
+
+def _threshold_mask(channels, thresholds, invert=False):
+    # `channels` is (height, width) for grayscale, or (height, width, 3) LAB
+    mask = np.zeros(channels.shape[:2], dtype=bool)
+    for t in thresholds:
+        t_mask = np.ones(channels.shape[:2], dtype=bool)
+        if channels.ndim == 2:
+            lo, hi = min(t[0], t[1]), max(t[0], t[1])
+            t_mask = (channels >= lo) & (channels <= hi)
+        else:
+            for c in range(3):
+                lo = min(t[c * 2], t[(c * 2) + 1])
+                hi = max(t[c * 2], t[(c * 2) + 1])
+                t_mask &= (channels[..., c] >= lo) & (channels[..., c] <= hi)
+        mask |= t_mask
+    if invert:
+        mask = ~mask
+    return mask
+
+
+def _percentile_bin(counts, percentile):
+    # the first bin at which the cumulative fraction reaches `percentile`
+    total = counts.sum()
+    if not total:
+        return 0
+    cumulative = np.cumsum(counts)
+    return int(np.searchsorted(cumulative, percentile * total))
+
+
+def _otsu_bin(counts):
+    total = counts.sum()
+    if not total:
+        return 0
+    bins = np.arange(len(counts))
+    weight_low = np.cumsum(counts)
+    weight_high = total - weight_low
+    sum_low = np.cumsum(counts * bins)
+    mean_low = sum_low / np.maximum(weight_low, 1)
+    mean_high = (sum_low[-1] - sum_low) / np.maximum(weight_high, 1)
+    between = weight_low * weight_high * ((mean_low - mean_high) ** 2)
+    return int(np.argmax(between))
+
+
+def get_lens_corr_map(height, width, strength=1.8, zoom=1.0, x_corr=0.0,
+                      y_corr=0.0):
+    # (source rows, source columns) to index an image with to undo the
+    # lens' distortion, the same mapping as the camera uses
+    key = (height, width, strength, zoom, x_corr, y_corr)
+    if key not in _lens_maps:
+        half_w = width / 2.0
+        half_h = height / 2.0
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+        xs -= half_w + (x_corr * half_w)
+        ys -= half_h + (y_corr * half_h)
+        radius = math.sqrt((width * width) + (height * height)) / 2
+        r = np.sqrt((xs * xs) + (ys * ys)) / (radius / strength)
+        theta = np.ones_like(r)
+        nonzero = r > 0
+        theta[nonzero] = np.arctan(r[nonzero]) / r[nonzero]
+        src_x = np.clip(half_w + (theta * xs / zoom), 0, width - 1)
+        src_y = np.clip(half_h + (theta * ys / zoom), 0, height - 1)
+        _lens_maps[key] = (src_y.astype(np.intp), src_x.astype(np.intp))
+    return _lens_maps[key]
+
+
+class Statistics(object):
+    # like OpenMV's, every value is an int; for RGB images the un-prefixed
+    # methods return the L channel
+
+    def __init__(self, channel_counts, offsets):
+        self._values = []
+        for counts, offset in zip(channel_counts, offsets):
+            self._values.append(self._compute(counts, offset))
+
+    def _compute(self, counts, offset):
+        total = counts.sum()
+        if not total:
+            return dict.fromkeys(
+                ('mean', 'median', 'mode', 'stdev', 'min', 'max', 'lq', 'uq'),
+                0)
+        bins = np.arange(len(counts)) + offset
+        mean = float((counts * bins).sum()) / total
+        var = float((counts * ((bins - mean) ** 2)).sum()) / total
+        nonzero = np.nonzero(counts)[0]
+        return {
+            'mean': int(mean),
+            'median': _percentile_bin(counts, 0.5) + offset,
+            'mode': int(np.argmax(counts)) + offset,
+            'stdev': int(math.sqrt(var)),
+            'min': int(nonzero[0]) + offset,
+            'max': int(nonzero[-1]) + offset,
+            'lq': _percentile_bin(counts, 0.25) + offset,
+            'uq': _percentile_bin(counts, 0.75) + offset
+        }
+
+    def __getitem__(self, idx):
+        keys = ('mean', 'median', 'mode', 'stdev', 'min', 'max', 'lq', 'uq')
+        return self._values[idx // len(keys)][keys[idx % len(keys)]]
+
+    def __len__(self):
+        return 8 * len(self._values)
+
+    def __repr__(self):
+        return '<Statistics {0}>'.format(self._values)
+
+
+def _add_stat_methods(prefix, channel):
+    for key in ('mean', 'median', 'mode', 'stdev', 'min', 'max', 'lq', 'uq'):
+        def _get(self, _key=key):
+            return self._values[channel][_key]
+        setattr(Statistics, prefix + key, _get)
+
+
+_add_stat_methods('', 0)
+_add_stat_methods('l_', 0)
+_add_stat_methods('a_', 1)
+_add_stat_methods('b_', 2)
+
+
+class Percentile(object):
+    def __init__(self, values):
+        self._values = values
+
+    def value(self):
+        return self._values[0]
+
+    def l_value(self):
+        return self._values[0]
+
+    def a_value(self):
+        return self._values[1]
+
+    def b_value(self):
+        return self._values[2]
+
+    def __getitem__(self, idx):
+        return self._values[idx]
+
+
+# `Histogram.get_threshold()` returns the same kind of object
+Threshold = Percentile
+
+
+class Histogram(object):
+    # `bins()` are normalized to add up to 1.0, like on the camera
+
+    def __init__(self, channel_counts, offsets):
+        self._counts = channel_counts
+        self._offsets = offsets
+
+    def _normalized(self, idx):
+        counts = self._counts[idx]
+        total = counts.sum()
+        if not total:
+            return [0.0] * len(counts)
+        return list(counts / float(total))
+
+    def bins(self):
+        return self._normalized(0)
+
+    def l_bins(self):
+        return self._normalized(0)
+
+    def a_bins(self):
+        return self._normalized(1)
+
+    def b_bins(self):
+        return self._normalized(2)
+
+    def get_percentile(self, percentile):
+        return Percentile([
+            _percentile_bin(c, percentile) + o
+            for c, o in zip(self._counts, self._offsets)])
+
+    def get_threshold(self):
+        return Threshold([
+            _otsu_bin(c) + o for c, o in zip(self._counts, self._offsets)])
+
+    def get_statistics(self):
+        return Statistics(self._counts, self._offsets)
+
+
+class Blob(object):
+
+    def __init__(self, x, y, w, h, pixels, cx, cy, code, count=1):
+        self._rect = (int(x), int(y), int(w), int(h))
+        self._pixels = int(pixels)
+        self._cx = float(cx)
+        self._cy = float(cy)
+        self._code = code
+        self._count = count
+
+    def rect(self):
+        return self._rect
+
+    def x(self):
+        return self._rect[0]
+
+    def y(self):
+        return self._rect[1]
+
+    def w(self):
+        return self._rect[2]
+
+    def h(self):
+        return self._rect[3]
+
+    def pixels(self):
+        return self._pixels
+
+    def cx(self):
+        return int(round(self._cx))
+
+    def cy(self):
+        return int(round(self._cy))
+
+    def cxf(self):
+        return self._cx
+
+    def cyf(self):
+        return self._cy
+
+    def rotation(self):
+        return 0.0
+
+    def code(self):
+        return self._code
+
+    def count(self):
+        return self._count
+
+    def area(self):
+        return self._rect[2] * self._rect[3]
+
+    def density(self):
+        return self._pixels / float(max(self.area(), 1))
+
+    def __getitem__(self, idx):
+        return (self._rect + (
+            self._pixels, self.cx(), self.cy(), self.rotation(), self._code,
+            self._count))[idx]
+
+    def __repr__(self):
+        return '{{"x":{0}, "y":{1}, "w":{2}, "h":{3}, "pixels":{4}, ' \
+            '"cx":{5}, "cy":{6}, "code":{7}, "count":{8}}}'.format(
+                *(self._rect + (self._pixels, self.cx(), self.cy(),
+                                self._code, self._count)))
+
+
+def _label_runs(mask):
+    # 4-connected components of `mask`, found from the runs of set pixels
+    # in each row; returns the runs (row, start, end) and their labels
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    num_runs = len(rows)
+    parent = list(range(num_runs))
+
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # join each run with any run in the row above that it touches
+    row_bounds = np.searchsorted(rows, np.arange(height + 1))
+    for r in range(1, height):
+        above = range(row_bounds[r - 1], row_bounds[r])
+        below = range(row_bounds[r], row_bounds[r + 1])
+        if not above or not below:
+            continue
+        i = above.start
+        for j in below:
+            while i < above.stop and ends[i] <= starts[j]:
+                i += 1
+            k = i
+            while k < above.stop and starts[k] < ends[j]:
+                root_a, root_b = _find(k), _find(j)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+                k += 1
+    labels = np.array([_find(i) for i in range(num_runs)], dtype=np.int64)
+    return rows, starts, ends, labels
+
+
+def _merge_blobs(blobs, margin):
+    merged = list(blobs)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if (a.x() - margin > b.x() + b.w()
+                        or b.x() - margin > a.x() + a.w()
+                        or a.y() - margin > b.y() + b.h()
+                        or b.y() - margin > a.y() + a.h()):
+                    continue
+                x = min(a.x(), b.x())
+                y = min(a.y(), b.y())
+                w = max(a.x() + a.w(), b.x() + b.w()) - x
+                h = max(a.y() + a.h(), b.y() + b.h()) - y
+                pixels = a.pixels() + b.pixels()
+                cx = ((a.cxf() * a.pixels()) + (b.cxf() * b.pixels())) / pixels
+                cy = ((a.cyf() * a.pixels()) + (b.cyf() * b.pixels())) / pixels
+                merged[i] = Blob(
+                    x, y, w, h, pixels, cx, cy, a.code() | b.code(),
+                    a.count() + b.count())
+                del merged[j]
+                changed = True
+                break
+            if changed:
+                break
+    return merged
+
+
+def _color_value(color, is_rgb):
+    if color is None:
+        color = 255
+    if is_rgb:
+        if isinstance(color, int):
+            return (color, color, color)
+        return tuple(color)
+    if isinstance(color, (tuple, list)):
+        # grayscale from RGB, the same weights as the camera
+        r, g, b = color
+        return int(((r * 38) + (g * 75) + (b * 15)) >> 7)
+    return int(color)
+
+
+class Image(object):
+
+    def __init__(self, source, copy_to_fb=False):
+        if isinstance(source, str):
+            source = load_image(source)
+        self._pixels = np.ascontiguousarray(source, dtype=np.uint8)
+        self._lab = None
+
+    @property
+    def _is_rgb(self):
+        return self._pixels.ndim == 3
+
+    def _set_pixels(self, pixels):
+        self._pixels = pixels
+        self._lab = None
+
+    def _channels(self, roi=None):
+        # grayscale values, or LAB for RGB images, inside the `roi`
+        if self._is_rgb:
+            if self._lab is None:
+                self._lab = _rgb_to_lab(self._pixels)
+            channels = self._lab
+        else:
+            channels = self._pixels
+        if roi:
+            x, y, w, h = self._clip_roi(roi)
+            channels = channels[y:y + h, x:x + w]
+        return channels
+
+    def _clip_roi(self, roi):
+        x, y, w, h = [int(v) for v in roi]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x + w, self.width())
+        y1 = min(y + h, self.height())
+        return (x0, y0, max(x1 - x0, 0), max(y1 - y0, 0))
+
+    def _channel_counts(self, thresholds=None, invert=False, roi=None,
+                        bins=None):
+        channels = self._channels(roi)
+        mask = None
+        if thresholds:
+            mask = _threshold_mask(channels, thresholds, invert)
+        if not self._is_rgb:
+            values = channels if mask is None else channels[mask]
+            counts = np.bincount(values.ravel(), minlength=256)
+            if bins and bins != 256:
+                counts = np.add.reduceat(
+                    counts, np.linspace(0, 256, bins, endpoint=False).astype(int))
+            return [counts], [0]
+        if mask is not None:
+            channels = channels[mask]
+        channels = channels.reshape(-1, 3)
+        return [
+            np.bincount(channels[:, 0], minlength=101),
+            np.bincount(channels[:, 1] + 128, minlength=256),
+            np.bincount(channels[:, 2] + 128, minlength=256)
+        ], [0, -128, -128]
+
+    def to_ndarray(self):
+        # host only, the image's pixels (not a copy)
+        return self._pixels
+
+    def width(self):
+        return self._pixels.shape[1]
+
+    def height(self):
+        return self._pixels.shape[0]
+
+    def size(self):
+        return self._pixels.size * (2 if self._is_rgb else 1)
+
+    def format(self):
+        return RGB565 if self._is_rgb else GRAYSCALE
+
+    def copy(self, roi=None, copy_to_fb=False):
+        pixels = self._pixels
+        if roi:
+            x, y, w, h = self._clip_roi(roi)
+            pixels = pixels[y:y + h, x:x + w]
+        return Image(pixels.copy())
+
+    def save(self, path, roi=None):
+        save_image(path, self.copy(roi=roi).to_ndarray())
+        return self
+
+    def get_pixel(self, x, y):
+        value = self._pixels[y, x]
+        if self._is_rgb:
+            return tuple(int(v) for v in value)
+        return int(value)
+
+    def set_pixel(self, x, y, color):
+        self._pixels[y, x] = _color_value(color, self._is_rgb)
+        self._lab = None
+        return self
+
+    def crop(self, roi=None, copy=False, copy_to_fb=False, **kwargs):
+        pixels = self._pixels
+        if roi:
+            x, y, w, h = self._clip_roi(roi)
+            pixels = pixels[y:y + h, x:x + w]
+        if copy:
+            return Image(pixels.copy())
+        self._set_pixels(np.ascontiguousarray(pixels))
+        return self
+
+    def to_grayscale(self, copy=False):
+        if not self._is_rgb:
+            return self.copy() if copy else self
+        rgb = self._pixels.astype(np.uint16)
+        gray = ((rgb[..., 0] * 38) + (rgb[..., 1] * 75) + (rgb[..., 2] * 15)) >> 7
+        gray = gray.astype(np.uint8)
+        if copy:
+            return Image(gray)
+        self._set_pixels(gray)
+        return self
+
+    def lens_corr(self, strength=1.8, zoom=1.0, x_corr=0.0, y_corr=0.0):
+        height, width = self._pixels.shape[:2]
+        src_y, src_x = get_lens_corr_map(
+            height, width, strength, zoom, x_corr, y_corr)
+        self._set_pixels(self._pixels[src_y, src_x])
+        return self
+
+    def rotation_corr(self, x_rotation=0.0, y_rotation=0.0, z_rotation=0.0,
+                      x_translation=0.0, y_translation=0.0, zoom=1.0,
+                      **kwargs):
+        height, width = self._pixels.shape[:2]
+        turns = (z_rotation / 90.0) % 4
+        if zoom == 1.0 and turns == int(turns) and (
+                height == width or int(turns) % 2 == 0):
+            self._set_pixels(np.ascontiguousarray(
+                np.rot90(self._pixels, k=int(turns))))
+            return self
+        key = (height, width, z_rotation, zoom)
+        if key not in _rotation_maps:
+            angle = math.radians(z_rotation)
+            ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+            xs -= width / 2.0
+            ys -= height / 2.0
+            cos, sin = math.cos(angle), math.sin(angle)
+            src_x = ((xs * cos) + (ys * sin)) / zoom + (width / 2.0)
+            src_y = ((ys * cos) - (xs * sin)) / zoom + (height / 2.0)
+            src_x = np.round(src_x).astype(np.intp)
+            src_y = np.round(src_y).astype(np.intp)
+            outside = (src_x < 0) | (src_x >= width) | (src_y < 0) | (
+                src_y >= height)
+            _rotation_maps[key] = (
+                np.clip(src_y, 0, height - 1), np.clip(src_x, 0, width - 1),
+                outside)
+        src_y, src_x, outside = _rotation_maps[key]
+        pixels = self._pixels[src_y, src_x]
+        pixels[outside] = 0
+        self._set_pixels(pixels)
+        return self
+
+    def get_statistics(self, thresholds=None, invert=False, roi=None,
+                       bins=None, threshold=None, **kwargs):
+        # `threshold` is accepted as a misspelling of `thresholds`, which
+        # is how the camera scripts call it
+        counts, offsets = self._channel_counts(
+            thresholds or threshold, invert, roi)
+        return Statistics(counts, offsets)
+
+    def get_histogram(self, thresholds=None, invert=False, roi=None,
+                      bins=None, threshold=None, **kwargs):
+        counts, offsets = self._channel_counts(
+            thresholds or threshold, invert, roi, bins)
+        return Histogram(counts, offsets)
+
+    def binary(self, thresholds, invert=False, zero=False, mask=None,
+               **kwargs):
+        matched = _threshold_mask(self._channels(), thresholds, invert)
+        if zero:
+            pixels = self._pixels.copy()
+            pixels[matched] = 0
+        elif self._is_rgb:
+            pixels = np.where(matched[..., None], 255, 0).astype(np.uint8)
+            pixels = np.repeat(pixels, 3, axis=2)
+        else:
+            pixels = np.where(matched, 255, 0).astype(np.uint8)
+        self._set_pixels(pixels)
+        return self
+
+    def find_blobs(self, thresholds, invert=False, roi=None, x_stride=2,
+                   y_stride=1, area_threshold=10, pixels_threshold=10,
+                   merge=False, margin=0, **kwargs):
+        x0, y0 = 0, 0
+        if roi:
+            x0, y0, _, _ = self._clip_roi(roi)
+        channels = self._channels(roi)
+        blobs = []
+        for t_idx, t in enumerate(thresholds):
+            mask = _threshold_mask(channels, [t], invert)
+            rows, starts, ends, labels = _label_runs(mask)
+            if not len(labels):
+                continue
+            roots, idxs = np.unique(labels, return_inverse=True)
+            lengths = ends - starts
+            count = len(roots)
+            pixels = np.bincount(idxs, weights=lengths, minlength=count)
+            sum_x = np.bincount(
+                idxs, weights=lengths * (starts + ends - 1) / 2.0,
+                minlength=count)
+            sum_y = np.bincount(idxs, weights=lengths * rows, minlength=count)
+            min_x = np.full(count, np.iinfo(np.int64).max)
+            max_x = np.zeros(count, dtype=np.int64)
+            min_y = np.full(count, np.iinfo(np.int64).max)
+            max_y = np.zeros(count, dtype=np.int64)
+            np.minimum.at(min_x, idxs, starts)
+            np.maximum.at(max_x, idxs, ends)
+            np.minimum.at(min_y, idxs, rows)
+            np.maximum.at(max_y, idxs, rows + 1)
+            for i in range(count):
+                w = int(max_x[i] - min_x[i])
+                h = int(max_y[i] - min_y[i])
+                if pixels[i] < pixels_threshold or w * h < area_threshold:
+                    continue
+                blobs.append(Blob(
+                    min_x[i] + x0, min_y[i] + y0, w, h, pixels[i],
+                    (sum_x[i] / pixels[i]) + x0, (sum_y[i] / pixels[i]) + y0,
+                    1 << t_idx))
+        if merge:
+            blobs = _merge_blobs(blobs, margin)
+        return blobs
+
+    def draw_rectangle(self, x, y=None, w=None, h=None, color=None,
+                       thickness=1, fill=False):
+        if y is None:
+            x, y, w, h = x
+        value = _color_value(color, self._is_rgb)
+        x0, y0, cw, ch = self._clip_roi((x, y, w, h))
+        if fill:
+            self._pixels[y0:y0 + ch, x0:x0 + cw] = value
+        else:
+            t = max(int(thickness), 1)
+            self._pixels[y0:y0 + min(t, ch), x0:x0 + cw] = value
+            self._pixels[max(y0 + ch - t, y0):y0 + ch, x0:x0 + cw] = value
+            self._pixels[y0:y0 + ch, x0:x0 + min(t, cw)] = value
+            self._pixels[y0:y0 + ch, max(x0 + cw - t, x0):x0 + cw] = value
+        self._lab = None
+        return self
+
+    def draw_line(self, x0, y0=None, x1=None, y1=None, color=None,
+                  thickness=1):
+        if y0 is None:
+            x0, y0, x1, y1 = x0
+        value = _color_value(color, self._is_rgb)
+        steps = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+        xs = np.round(np.linspace(x0, x1, steps)).astype(int)
+        ys = np.round(np.linspace(y0, y1, steps)).astype(int)
+        half = max(int(thickness), 1) // 2
+        for dy in range(-half, half + 1):
+            for dx in range(-half, half + 1):
+                px, py = xs + dx, ys + dy
+                inside = (px >= 0) & (px < self.width()) & (py >= 0) & (
+                    py < self.height())
+                self._pixels[py[inside], px[inside]] = value
+        self._lab = None
+        return self
+
+    def draw_circle(self, x, y=None, radius=None, color=None, thickness=1,
+                    fill=False):
+        if y is None:
+            x, y, radius = x
+        value = _color_value(color, self._is_rgb)
+        ys, xs = np.ogrid[0:self.height(), 0:self.width()]
+        dist = np.sqrt(((xs - x) ** 2) + ((ys - y) ** 2))
+        if fill:
+            mask = dist <= radius
+        else:
+            mask = (dist <= radius) & (dist > radius - max(thickness, 1))
+        self._pixels[mask] = value
+        self._lab = None
+        return self
+
+    def draw_cross(self, x, y=None, color=None, size=5, thickness=1):
+        if y is None:
+            x, y = x
+        self.draw_line(x - size, y, x + size, y, color, thickness)
+        self.draw_line(x, y - size, x, y + size, color, thickness)
+        return self
+
+    def draw_string(self, x, y, text, color=None, scale=1, **kwargs):
+        return self # no font on the host
@@ -0,0 +1,57 @@
+import sys
+import time
+
+
+# Emulates the parts of OpenMV's `pyb` module used by the camera scripts.
+# Requests from the host (like b'BIN' or b'EVENTS') can be queued with
+# `send_to_camera()`, and whatever the camera writes goes to stdout, the
+# same as its `print()` output.
+
+_requests = []
+
+
+def send_to_camera(data):
+    # host only
+    _requests.append(bytes(data))
+
+
+class USB_VCP(object):
+
+    def any(self):
+        return bool(_requests)
+
+    def read(self, nbytes=None):
+        if not _requests:
+            return None
+        data = b''.join(_requests)
+        del _requests[:]
+        return data
+
+    def write(self, data):
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+        return len(data)
+
+    def isconnected(self):
+        return True
+
+
+class LED(object):
+
+    def __init__(self, idx):
+        self.idx = idx
+        self.is_on = False
+
+    def on(self):
+        self.is_on = True
+
+    def off(self):
+        self.is_on = False
+
+    def toggle(self):
+        self.is_on = not self.is_on
+
+
+def delay(ms):
+    time.sleep(ms / 1000.0)
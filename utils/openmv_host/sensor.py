@@ -0,0 +1,164 @@
+import numpy as np
+
+from . import image
+from .frames import FrameSource
+
+
+# Emulates OpenMV's `sensor` module, taking pictures from a `FrameSource`
+# set with `set_source()` instead of a camera. Frames are resized (nearest
+# neighbor) to the frame size, converted to the pixel format, then
+# windowed and mirrored, like the camera does. Image settings (contrast,
+# gain, exposure, ...) are accepted and ignored.
+
+GRAYSCALE = image.GRAYSCALE
+RGB565 = image.RGB565
+
+QQQVGA = 'qqqvga'
+QQVGA = 'qqvga'
+QVGA = 'qvga'
+VGA = 'vga'
+HQVGA = 'hqvga'
+B64X64 = 'b64x64'
+B128X128 = 'b128x128'
+
+FRAME_SIZES = {
+    QQQVGA: (80, 60),
+    QQVGA: (160, 120),
+    QVGA: (320, 240),
+    VGA: (640, 480),
+    HQVGA: (240, 160),
+    B64X64: (64, 64),
+    B128X128: (128, 128)
+}
+
+_state = {}
+
+
+def reset():
+    source = _state.get('source')
+    _state.clear()
+    _state.update({
+        'source': source,
+        'pixformat': GRAYSCALE,
+        'framesize': QVGA,
+        'window': None,
+        'hmirror': False,
+        'vflip': False
+    })
+
+
+def set_source(source, **kwargs):
+    # host only, a `FrameSource`, or anything `FrameSource()` can play
+    if not isinstance(source, FrameSource):
+        source = FrameSource(source, **kwargs)
+    _state['source'] = source
+    return source
+
+
+def get_source():
+    return _state.get('source')
+
+
+def set_pixformat(pixformat):
+    _state['pixformat'] = pixformat
+
+
+def get_pixformat():
+    return _state['pixformat']
+
+
+def set_framesize(framesize):
+    _state['framesize'] = framesize
+    _state['window'] = None
+
+
+def get_framesize():
+    return _state['framesize']
+
+
+def set_windowing(roi):
+    if len(roi) == 2:
+        w, h = roi
+        frame_w, frame_h = FRAME_SIZES[_state['framesize']]
+        roi = ((frame_w - w) // 2, (frame_h - h) // 2, w, h)
+    _state['window'] = tuple(int(v) for v in roi)
+
+
+def get_windowing():
+    if _state['window']:
+        return _state['window']
+    frame_w, frame_h = FRAME_SIZES[_state['framesize']]
+    return (0, 0, frame_w, frame_h)
+
+
+def set_hmirror(enable):
+    _state['hmirror'] = bool(enable)
+
+
+def set_vflip(enable):
+    _state['vflip'] = bool(enable)
+
+
+def width():
+    return get_windowing()[2]
+
+
+def height():
+    return get_windowing()[3]
+
+
+def skip_frames(n=None, time=None):
+    # on the host there's nothing to settle, so only skip counted frames
+    for i in range(n or 0):
+        snapshot()
+
+
+def _to_pixformat(pixels):
+    if _state['pixformat'] == GRAYSCALE:
+        if pixels.ndim == 3:
+            return image.Image(pixels).to_grayscale().to_ndarray()
+        return pixels
+    if pixels.ndim == 2:
+        pixels = np.repeat(pixels[..., None], 3, axis=2)
+    # the precision RGB565 keeps
+    return pixels & np.array([0xf8, 0xfc, 0xf8], dtype=np.uint8)
+
+
+def _resize(pixels, size):
+    w, h = size
+    if pixels.shape[1] == w and pixels.shape[0] == h:
+        return pixels
+    ys = (np.arange(h) * pixels.shape[0]) // h
+    xs = (np.arange(w) * pixels.shape[1]) // w
+    return pixels[ys[:, None], xs[None, :]]
+
+
+def snapshot():
+    source = _state.get('source')
+    if source is None:
+        raise RuntimeError('No frames to take, call `sensor.set_source()`')
+    pixels = _resize(source.next_frame(), FRAME_SIZES[_state['framesize']])
+    pixels = _to_pixformat(pixels)
+    x, y, w, h = get_windowing()
+    pixels = pixels[y:y + h, x:x + w]
+    if _state['hmirror']:
+        pixels = pixels[:, ::-1]
+    if _state['vflip']:
+        pixels = pixels[::-1]
+    return image.Image(pixels)
+
+
+def _ignored(*args, **kwargs):
+    pass
+
+
+set_contrast = _ignored
+set_brightness = _ignored
+set_saturation = _ignored
+set_gainceiling = _ignored
+set_quality = _ignored
+set_auto_gain = _ignored
+set_auto_exposure = _ignored
+set_auto_whitebal = _ignored
+
+reset()
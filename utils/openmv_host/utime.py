@@ -0,0 +1,42 @@
+import time
+
+
+# Emulates MicroPython's `utime`, counting from when it was imported. Like
+# the camera, ticks wrap around, so use `ticks_diff()` to compare them.
+
+TICKS_PERIOD = 1 << 30
+
+_start = time.monotonic()
+
+
+def ticks_ms():
+    return int((time.monotonic() - _start) * 1000) % TICKS_PERIOD
+
+
+def ticks_us():
+    return int((time.monotonic() - _start) * 1000000) % TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(ticks_a, ticks_b):
+    half = TICKS_PERIOD // 2
+    return ((ticks_a - ticks_b + half) % TICKS_PERIOD) - half
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000.0)
+
+
+def sleep_us(us):
+    time.sleep(us / 1000000.0)
+
+
+def time_ns():
+    return time.time_ns()
@@ -0,0 +1,153 @@
+import copy
+import threading
+import time
+
+
+def is_frame_fresh(frame, captured_after):
+    # frames stamped with a 'capture_time' before `captured_after` are stale
+    if captured_after is None or not isinstance(frame, dict):
+        return True
+    return frame.get('capture_time', captured_after) >= captured_after
+
+
+class FrameMailbox(object):
+    # Holds only the newest frame from a camera. A reader thread publishes
+    # frames, and any number of other threads read the newest one, block
+    # for a newer one, or block until a frame matches a predicate.
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_id = 0
+        self._frame_time = None
+        self._waiters = []
+        self._error = None
+
+    @property
+    def frame_id(self):
+        # number of frames published so far
+        with self._cond:
+            return self._frame_id
+
+    @property
+    def frame_time(self):
+        # host time.monotonic() of when the newest frame was published
+        with self._cond:
+            return self._frame_time
+
+    @property
+    def error(self):
+        with self._cond:
+            return self._error
+
+    def latest(self):
+        with self._cond:
+            return copy.deepcopy(self._frame)
+
+    def publish(self, frame):
+        with self._cond:
+            self._frame = frame
+            self._frame_id += 1
+            self._frame_time = time.monotonic()
+            # test every frame for `wait_for()`, so no transition is missed
+            for w in self._waiters:
+                self._check_waiter(w, frame)
+            self._cond.notify_all()
+
+    def fail(self, error):
+        # wakes up every reader, and makes them raise `error`
+        with self._cond:
+            self._error = error
+            self._cond.notify_all()
+
+    def clear_error(self):
+        with self._cond:
+            self._error = None
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def read(self, newer_than=None, captured_after=None, timeout=None):
+        # returns a copy of the newest frame once it is newer than the
+        # `newer_than` frame_id, or None after `timeout` seconds
+        if newer_than is None:
+            newer_than = 0
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._frame_id > newer_than and is_frame_fresh(
+                        self._frame, captured_after):
+                    # copy, so callers can edit their frame without
+                    # changing what the next reader gets
+                    return copy.deepcopy(self._frame)
+                if self._error:
+                    raise self._error
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _check_waiter(self, waiter, frame):
+        if waiter['done'] or not is_frame_fresh(frame, waiter['captured_after']):
+            return
+        try:
+            if waiter['predicate'](frame):
+                waiter['result'] = copy.deepcopy(frame)
+                waiter['done'] = True
+        except Exception as e:
+            waiter['error'] = e
+            waiter['done'] = True
+
+    def wait_for(self, predicate, timeout=None, captured_after=None,
+                 no_data_timeout=None):
+        # returns a copy of the first frame where `predicate(frame)` is True,
+        # or None after `timeout` seconds, and raises if no frames at all
+        # are published for `no_data_timeout` seconds
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        waiter = {
+            'predicate': predicate,
+            'captured_after': captured_after,
+            'done': False,
+            'result': None,
+            'error': None
+        }
+        with self._cond:
+            # the newest frame might already be a match
+            if self._frame is not None:
+                self._check_waiter(waiter, self._frame)
+            self._waiters.append(waiter)
+            try:
+                last_id = self._frame_id
+                last_frame = time.monotonic()
+                while not waiter['done']:
+                    if self._error:
+                        raise self._error
+                    now = time.monotonic()
+                    if self._frame_id != last_id:
+                        last_id = self._frame_id
+                        last_frame = now
+                    elif no_data_timeout and now - last_frame > no_data_timeout:
+                        raise RuntimeError('Camera returned no data')
+                    if deadline is not None and now >= deadline:
+                        return None
+                    wait = None
+                    if deadline is not None:
+                        wait = deadline - now
+                    if no_data_timeout:
+                        no_data_wait = last_frame + no_data_timeout - now
+                        if wait is None or no_data_wait < wait:
+                            wait = no_data_wait
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(waiter)
+        if waiter['error']:
+            raise waiter['error']
+        return waiter['result']
@@ -0,0 +1,234 @@
+import os
+import selectors
+import threading
+
+import serial
+
+from .openmv_clock import CameraClock
+from .openmv_mailbox import FrameMailbox
+from .openmv_port import OPENMV_PORT_DEFAULT_BAUDRATE
+from .openmv_port import OPENMV_PORT_DEFAULT_TIMEOUT_SEC
+from .openmv_port import OPENMV_PORT_DEFAULT_RETRIES
+from .openmv_port import OPENMV_PORT_DEFAULT_PROTOCOL
+from .openmv_port import OPENMV_PORT_PROTOCOLS
+from .openmv_protocol import FrameDecoder
+from .openmv_protocol import OPENMV_PROTOCOL_BINARY_REQUEST
+from .openmv_protocol import OPENMV_PROTOCOL_EVENTS_REQUEST
+from .openmv_recorder import OpenMVRecorder
+
+
+OPENMV_MUX_READ_SIZE = 4096
+OPENMV_MUX_SELECT_TIMEOUT_SEC = 0.5
+
+
+class MuxCamera(object):
+    # one camera inside an `OpenMVMultiplexer`, with the same reading
+    # interface as a streaming `OpenMVPort`
+
+    def __init__(self, name, port, **kwargs):
+        self.name = name
+        self.port = port
+        self.baudrate = kwargs.get('baudrate', OPENMV_PORT_DEFAULT_BAUDRATE)
+        self.timeout = kwargs.get('timeout', OPENMV_PORT_DEFAULT_TIMEOUT_SEC)
+        self._verbose = kwargs.get('verbose', False)
+        self._protocol = kwargs.get('protocol', OPENMV_PORT_DEFAULT_PROTOCOL)
+        if self._protocol not in OPENMV_PORT_PROTOCOLS:
+            raise ValueError('Unknown protocol: {0}'.format(self._protocol))
+        self._events = kwargs.get('events', False)
+        self._recorder = kwargs.get('recorder')
+        if not self._recorder and kwargs.get('record_path'):
+            self._recorder = OpenMVRecorder(kwargs['record_path'])
+        self._serial = None
+        # JSON lines and binary frames are both understood
+        self._decoder = FrameDecoder()
+        self._clock = CameraClock()
+        self._mailbox = FrameMailbox()
+
+    @property
+    def is_open(self):
+        return self._serial is not None
+
+    @property
+    def frame_id(self):
+        return self._mailbox.frame_id
+
+    @property
+    def frame_time(self):
+        return self._mailbox.frame_time
+
+    def fileno(self):
+        return self._serial.fileno()
+
+    def open(self):
+        if self.is_open:
+            return
+        self._serial = serial.Serial(
+            port=self.port, baudrate=self.baudrate, timeout=0)
+        os.set_blocking(self._serial.fileno(), False)
+        self._serial.reset_input_buffer()
+        self._decoder.clear()
+        self._mailbox.clear_error()
+        if self._protocol == 'binary':
+            self._serial.write(OPENMV_PROTOCOL_BINARY_REQUEST)
+        if self._events:
+            self._serial.write(OPENMV_PROTOCOL_EVENTS_REQUEST)
+
+    def close(self):
+        if not self.is_open:
+            return
+        self._serial.close()
+        self._serial = None
+        self._mailbox.fail(RuntimeError('Camera port was closed'))
+
+    def on_readable(self):
+        # called from the multiplexer thread, must never block
+        try:
+            data = os.read(self._serial.fileno(), OPENMV_MUX_READ_SIZE)
+        except BlockingIOError:
+            return True
+        except OSError as e:
+            self._mailbox.fail(e)
+            return False
+        if not data:
+            # a readable port with nothing to read was disconnected
+            self._mailbox.fail(serial.SerialException('Camera was disconnected'))
+            return False
+        if self._verbose:
+            print(self.name, data)
+        self._decoder.feed(data)
+        for frame in self._decoder.frames():
+            if self._recorder:
+                self._recorder.write_frame(frame)
+            self._mailbox.publish(self._clock.stamp(frame))
+        return True
+
+    def latest(self):
+        # the newest frame without waiting, or None if nothing arrived yet
+        return self._mailbox.latest()
+
+    def read_json(self, retries=OPENMV_PORT_DEFAULT_RETRIES, newer_than=None,
+                  captured_after=None):
+        while True:
+            data = self._mailbox.read(
+                newer_than=newer_than, captured_after=captured_after,
+                timeout=self.timeout)
+            if data is not None:
+                return data
+            if retries <= 0:
+                raise RuntimeError('Camera returned no data')
+            if self._verbose:
+                print('OpenMV {0} retrying read: {1}'.format(self.name, retries))
+            retries -= 1
+
+    def wait_for(self, predicate, timeout=None, captured_after=None,
+                 retries=OPENMV_PORT_DEFAULT_RETRIES):
+        no_data_timeout = None
+        if self.timeout is not None:
+            no_data_timeout = self.timeout * (retries + 1)
+        return self._mailbox.wait_for(
+            predicate, timeout=timeout, captured_after=captured_after,
+            no_data_timeout=no_data_timeout)
+
+
+class OpenMVMultiplexer(object):
+    # Reads any number of cameras from a single thread with `selectors`.
+    # Each camera assembles its own frames as bytes arrive, so one slow
+    # camera never delays the others.
+
+    def __init__(self, verbose=False):
+        self._verbose = verbose
+        self._cameras = {}
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._stop = threading.Event()
+        # writing to this pipe wakes up the selector to (un)register ports
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    def __getitem__(self, name):
+        return self._cameras[name]
+
+    def __iter__(self):
+        return iter(list(self._cameras.values()))
+
+    @property
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def add_camera(self, name, port, **kwargs):
+        if name in self._cameras:
+            raise ValueError('Camera already added: {0}'.format(name))
+        kwargs.setdefault('verbose', self._verbose)
+        camera = MuxCamera(name, port, **kwargs)
+        camera.open()
+        self._cameras[name] = camera
+        self._queue_change(('add', camera))
+        return camera
+
+    def remove_camera(self, name):
+        camera = self._cameras.pop(name)
+        self._queue_change(('remove', camera))
+
+    def _queue_change(self, change):
+        with self._lock:
+            self._pending.append(change)
+        if self.is_running:
+            os.write(self._wakeup_w, b'\0')
+        else:
+            self._apply_changes()
+
+    def _apply_changes(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        for action, camera in pending:
+            if action == 'add':
+                self._selector.register(
+                    camera.fileno(), selectors.EVENT_READ, camera)
+            else:
+                try:
+                    self._selector.unregister(camera.fileno())
+                except KeyError:
+                    pass # already dropped after a read error
+                camera.close()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name='OpenMVMultiplexer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self._stop.set()
+        os.write(self._wakeup_w, b'\0')
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop()
+        for name in list(self._cameras.keys()):
+            self.remove_camera(name)
+        self._selector.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(OPENMV_MUX_SELECT_TIMEOUT_SEC):
+                if key.data is None:
+                    try:
+                        os.read(self._wakeup_r, OPENMV_MUX_READ_SIZE)
+                    except BlockingIOError:
+                        pass
+                    continue
+                if not key.data.on_readable():
+                    # the device went away, stop watching it
+                    self._selector.unregister(key.fd)
+            self._apply_changes()
@@ -1,19 +1,29 @@
 import json
+import threading
 import time
 
 import serial
-from serial.tools.list_ports import comports
+
+from .openmv_clock import CameraClock
+from .openmv_discovery import discover_camera_port
+from .openmv_mailbox import FrameMailbox, is_frame_fresh
+from .openmv_protocol import FrameDecoder, OPENMV_PROTOCOL_BINARY_REQUEST
+from .openmv_protocol import OPENMV_PROTOCOL_EVENTS_REQUEST
+from .openmv_recorder import OpenMVRecorder
+from .openmv_stats import OpenMVPortStats
 
 
 OPENMV_PORT_DEFAULT_BAUDRATE = 115200
 OPENMV_PORT_DEFAULT_TIMEOUT_SEC = 2
 OPENMV_PORT_DEFAULT_RETRIES = 3
 OPENMV_PORT_DEFAULT_MIN_DATA_LENGTH = 10
+OPENMV_PORT_DEFAULT_PROTOCOL = 'json'
+OPENMV_PORT_PROTOCOLS = ('json', 'binary')
 
 
-def find_camera_port():
-    # TODO: smart way to discover OpenMV serial ports
-    return '/dev/tty.usbmodem0000000000111'
+def find_camera_port(**kwargs):
+    # filters by USB VID/PID, probes for a valid frame, caches the result
+    return discover_camera_port(**kwargs)
 
 
 class OpenMVPort(serial.Serial):
@@ -22,19 +32,271 @@ class OpenMVPort(serial.Serial):
         self._min_data_length = kwargs.get(
             'min_data_length', OPENMV_PORT_DEFAULT_MIN_DATA_LENGTH)
         self._verbose = kwargs.get('verbose', False)
+        # 'binary' asks the camera for binary frames when the port opens,
+        # but still understands JSON lines if the camera ignores the request
+        self._protocol = kwargs.get('protocol', OPENMV_PORT_DEFAULT_PROTOCOL)
+        if self._protocol not in OPENMV_PORT_PROTOCOLS:
+            raise ValueError('Unknown protocol: {0}'.format(self._protocol))
+        self._decoder = None
+        if self._protocol == 'binary':
+            self._decoder = FrameDecoder()
+        # ask the camera to only send changes (plus a heartbeat), best used
+        # together with `stream=True` and `wait_for()`
+        self._events = kwargs.get('events', False)
+        # tee every received frame into a timestamped log, for replaying;
+        # one opened from `record_path` is closed along with the port
+        self._recorder = kwargs.get('recorder')
+        self._owns_recorder = False
+        if not self._recorder and kwargs.get('record_path'):
+            self._recorder = OpenMVRecorder(kwargs['record_path'])
+            self._owns_recorder = True
+        # counters and timing histograms, optionally printed periodically
+        self.stats = kwargs.get('stats') or OpenMVPortStats(
+            dump_interval=kwargs.get('stats_interval'))
+        # estimates when each frame was captured, in host time.monotonic()
+        self._clock = CameraClock()
+        # streaming mode, a background thread owns the port and keeps
+        # only the newest decoded frame around for `read_json()`
+        self._stream = kwargs.get('stream', False)
+        self._stream_thread = None
+        self._stream_stop = threading.Event()
+        self._mailbox = FrameMailbox()
         # init PySerial before giving it port so it doesn't auto-open
         super().__init__()
-        self.port = kwargs.get('port', find_camera_port())
+        # without a port, call `find_port()` before reading
+        self.port = kwargs.get('port')
         self.baudrate = kwargs.get('baudrate', OPENMV_PORT_DEFAULT_BAUDRATE)
+        # None waits for frames forever, the same as PySerial
         self.timeout = kwargs.get('timeout', OPENMV_PORT_DEFAULT_TIMEOUT_SEC)
 
-    def read_json(self, retries=OPENMV_PORT_DEFAULT_RETRIES):
+    def find_port(self, **kwargs):
+        # probes the USB serial ports for a camera, which can take a couple
+        # of seconds, raising RuntimeError if there isn't one
+        self.port = find_camera_port(verbose=self._verbose, **kwargs)
+        return self.port
+
+    @property
+    def frame_id(self):
+        # number of frames received since streaming started
+        return self._mailbox.frame_id
+
+    @property
+    def frame_time(self):
+        # host time.monotonic() of when the newest frame was received
+        return self._mailbox.frame_time
+
+    @property
+    def is_streaming(self):
+        return bool(self._stream_thread and self._stream_thread.is_alive())
+
+    def start_stream(self):
+        if self.is_streaming:
+            return
+        if not self.is_open:
+            self.open()
+        self.reset_input_buffer()
+        if self._decoder:
+            self._decoder.clear()
+        self._stream_stop.clear()
+        self._mailbox.clear_error()
+        self._stream_thread = threading.Thread(
+            target=self._stream_loop, name='OpenMVPort-reader', daemon=True)
+        self._stream_thread.start()
+
+    def stop_stream(self):
+        if self._stream_thread:
+            self._stream_stop.set()
+            if self._stream_thread is not threading.current_thread():
+                # with `timeout=None` the reader could wait forever for data
+                if self.is_open:
+                    self.cancel_read()
+                self._stream_thread.join()
+            self._stream_thread = None
+        self._mailbox.notify()
+
+    def open(self):
+        if not self.port:
+            raise serial.SerialException(
+                'No camera port, pass port= or call find_port() first')
+        with self.stats.timer('open'):
+            super().open()
+        self.stats.count('opens')
+        if self._decoder:
+            self._decoder.clear()
+            self.write(OPENMV_PROTOCOL_BINARY_REQUEST)
+        if self._events:
+            self.write(OPENMV_PROTOCOL_EVENTS_REQUEST)
+
+    def close(self):
+        self.stop_stream()
+        self._close_port()
+        if self._owns_recorder:
+            self._recorder.close()
+            self._recorder = None
+            self._owns_recorder = False
+
+    def _close_port(self):
+        # between reads, without `stay_open`, keeping the recorder going
+        if not self.is_open:
+            return
+        with self.stats.timer('close'):
+            super().close()
+        self.stats.count('closes')
+
+    def _drain_input(self):
+        with self.stats.timer('drain'):
+            if self._decoder:
+                # drop every complete frame, but keep a partial one
+                while self.in_waiting > self._min_data_length:
+                    data = self.read(self.in_waiting)
+                    self.stats.count('bytes_discarded', len(data))
+                    self._decoder.feed(data)
+                    for frame in self._decoder.frames():
+                        self.stats.count('lines_discarded')
+                        if self._recorder:
+                            self._recorder.write_frame(frame)
+                return
+            while self.in_waiting > self._min_data_length:
+                line = self.readline() # reset_input_buffer() doesn't always work...
+                self.stats.count('lines_discarded')
+                self.stats.count('bytes_discarded', len(line))
+                if self._recorder:
+                    self._recorder.write_line(line)
+
+    def _read_frame(self):
+        # returns the next decoded frame, None if nothing arrived before the
+        # timeout, or raises a JSONDecodeError for a corrupted JSON line
+        if self._decoder:
+            with self.stats.timer('decode'):
+                frame = self._decoder.next_frame()
+            while frame is None:
+                with self.stats.timer('read_wait'):
+                    data = self.read(max(1, self.in_waiting))
+                if not data:
+                    self.stats.count('timeouts')
+                    return None
+                self.stats.count('bytes_received', len(data))
+                if self._verbose:
+                    print(data)
+                with self.stats.timer('decode'):
+                    self._decoder.feed(data)
+                    frame = self._decoder.next_frame()
+            self.stats.count('frames')
+            if self._recorder:
+                self._recorder.write_frame(frame)
+            return self._clock.stamp(frame)
+        with self.stats.timer('read_wait'):
+            data = self.readline()
+        if not data:
+            self.stats.count('timeouts')
+            return None
+        self.stats.count('bytes_received', len(data))
+        if self._verbose:
+            print(data)
+        if self._recorder:
+            self._recorder.write_line(data)
+        try:
+            with self.stats.timer('decode'):
+                data = json.loads(data)
+        except json.decoder.JSONDecodeError:
+            self.stats.count('decode_errors')
+            raise
+        self.stats.count('frames')
+        return self._clock.stamp(data)
+
+    def _stream_loop(self):
+        while not self._stream_stop.is_set():
+            try:
+                data = self._read_frame()
+            except json.decoder.JSONDecodeError:
+                continue # partial line, wait for the next one
+            except (serial.SerialException, OSError) as e:
+                # hand the error over to whoever is reading frames
+                self._mailbox.fail(e)
+                return
+            if data is not None:
+                self._mailbox.publish(data)
+
+    def _read_json_from_stream(self, newer_than, captured_after, retries):
+        if not self.is_streaming:
+            self.start_stream()
+        data = self._mailbox.read(
+            newer_than=newer_than, captured_after=captured_after,
+            timeout=self.timeout)
+        if data is not None:
+            return data
+        self.stats.count('timeouts')
+        if retries > 0:
+            self.stats.count('retries')
+            if self._verbose:
+                print('OpenMV retrying read:', retries)
+            return self._read_json_from_stream(
+                newer_than, captured_after, retries - 1)
+        raise RuntimeError('Camera returned no data')
+
+    def wait_for(self, predicate, timeout=None, captured_after=None,
+                 retries=OPENMV_PORT_DEFAULT_RETRIES):
+        # blocks until a frame for which `predicate(frame)` is True arrives,
+        # and returns it, or returns None after `timeout` seconds
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        if self._stream:
+            if not self.is_streaming:
+                self.start_stream()
+            no_data_timeout = None
+            if self.timeout is not None:
+                no_data_timeout = self.timeout * (retries + 1)
+            return self._mailbox.wait_for(
+                predicate, timeout=timeout, captured_after=captured_after,
+                no_data_timeout=no_data_timeout)
+        if not self.is_open:
+            self.open()
+        # drop old data once, then test every frame after it in order
+        self._drain_input()
+        misses = 0
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    data = self._read_frame()
+                except json.decoder.JSONDecodeError:
+                    continue
+                if data is None:
+                    misses += 1
+                    if misses > retries:
+                        raise RuntimeError('Camera returned no data')
+                    continue
+                misses = 0
+                if is_frame_fresh(data, captured_after) and predicate(data):
+                    return data
+            return None
+        finally:
+            if not self._stay_open:
+                self._close_port()
+
+    def read_json(self, retries=OPENMV_PORT_DEFAULT_RETRIES, newer_than=None,
+                  captured_after=None):
+        # `captured_after` is a host time.monotonic(), frames the camera
+        # captured before it are skipped
+        with self.stats.timer('read_json'):
+            data = self._read_json(retries, newer_than, captured_after)
+        self.stats.maybe_dump()
+        return data
+
+    def _read_json(self, retries, newer_than, captured_after):
+
+        # streaming mode returns from the latest-frame mailbox, optionally
+        # blocking until a frame newer than the `newer_than` frame_id arrives
+        if self._stream:
+            return self._read_json_from_stream(
+                newer_than, captured_after, retries)
 
         def attempt_retry(exception):
             if retries > 0:
+                self.stats.count('retries')
                 if self._verbose:
                     print('OpenMV retrying read:', retries)
-                return self.read_json(retries=retries - 1)
+                return self._read_json(retries - 1, newer_than, captured_after)
             else:
                 raise exception
 
@@ -43,26 +305,30 @@ class OpenMVPort(serial.Serial):
             self.open()
 
         # clear the input buffer of previously sent data
-        while self.in_waiting > self._min_data_length:
-            self.readline() # reset_input_buffer() doesn't always work...
-
-        # read the next line
-        data = self.readline()
-        # retry if there's no data
-        if not data:
-            return attempt_retry(RuntimeError('Camera returned no data'))
-        if self._verbose:
-            print(data)
+        self._drain_input()
 
-        # parse the json
-        try:
-            data = json.loads(data)
-        except json.decoder.JSONDecodeError as e:
-            return attempt_retry(e)
+        # read and parse the next frame, skipping ones captured too early
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                data = self._read_frame()
+            except json.decoder.JSONDecodeError as e:
+                return attempt_retry(e)
+            # retry if there's no data
+            if data is None:
+                return attempt_retry(RuntimeError('Camera returned no data'))
+            if is_frame_fresh(data, captured_after):
+                break
+            self.stats.count('stale_frames')
+            if deadline is not None and time.monotonic() > deadline:
+                return attempt_retry(
+                    RuntimeError('Camera returned no new enough data'))
 
         # close the port if required
         if not self._stay_open:
-            self.close()
+            self._close_port()
 
         # return data
         return data
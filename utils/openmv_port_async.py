@@ -0,0 +1,170 @@
+import asyncio
+import os
+
+import serial
+
+from .openmv_port import find_camera_port
+from .openmv_port import OPENMV_PORT_DEFAULT_BAUDRATE
+from .openmv_port import OPENMV_PORT_DEFAULT_TIMEOUT_SEC
+from .openmv_port import OPENMV_PORT_DEFAULT_RETRIES
+from .openmv_port import OPENMV_PORT_DEFAULT_PROTOCOL
+from .openmv_port import OPENMV_PORT_PROTOCOLS
+from .openmv_protocol import FrameDecoder, OPENMV_PROTOCOL_BINARY_REQUEST
+
+
+OPENMV_PORT_ASYNC_READ_SIZE = 4096
+OPENMV_PORT_ASYNC_FRAME_QUEUE_SIZE = 16
+
+
+class AsyncOpenMVPort(object):
+    def __init__(self, **kwargs):
+        self._verbose = kwargs.get('verbose', False)
+        # without a port, call `find_port()` before opening
+        self.port = kwargs.get('port')
+        self.baudrate = kwargs.get('baudrate', OPENMV_PORT_DEFAULT_BAUDRATE)
+        self.timeout = kwargs.get('timeout', OPENMV_PORT_DEFAULT_TIMEOUT_SEC)
+        self._protocol = kwargs.get('protocol', OPENMV_PORT_DEFAULT_PROTOCOL)
+        if self._protocol not in OPENMV_PORT_PROTOCOLS:
+            raise ValueError('Unknown protocol: {0}'.format(self._protocol))
+        self._serial = None
+        self._loop = None
+        # handles JSON lines as well as binary frames
+        self._decoder = FrameDecoder()
+        self._waiters = []
+        self._queues = set()
+        self._error = None
+
+    @property
+    def is_open(self):
+        return self._serial is not None
+
+    async def find_port(self, **kwargs):
+        # probing blocks for a couple of seconds, so it's done off the loop
+        loop = asyncio.get_running_loop()
+        self.port = await loop.run_in_executor(
+            None, lambda: find_camera_port(verbose=self._verbose, **kwargs))
+        return self.port
+
+    async def open(self):
+        if self.is_open:
+            return
+        if not self.port:
+            raise serial.SerialException(
+                'No camera port, pass port= or call find_port() first')
+        self._loop = asyncio.get_running_loop()
+        # PySerial only configures the port (baudrate, raw mode, etc.),
+        # reading happens on the file-descriptor from inside the event loop
+        self._serial = serial.Serial(
+            port=self.port, baudrate=self.baudrate, timeout=0)
+        os.set_blocking(self._serial.fileno(), False)
+        self._serial.reset_input_buffer()
+        self._decoder.clear()
+        self._error = None
+        self._loop.add_reader(self._serial.fileno(), self._on_readable)
+        if self._protocol == 'binary':
+            self._serial.write(OPENMV_PROTOCOL_BINARY_REQUEST)
+
+    def close(self):
+        if not self.is_open:
+            return
+        self._loop.remove_reader(self._serial.fileno())
+        self._serial.close()
+        self._serial = None
+        self._fail(RuntimeError('Camera port was closed'))
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def _fail(self, exception):
+        self._error = exception
+        for fut in self._waiters:
+            if not fut.done():
+                fut.set_exception(exception)
+        self._waiters = []
+        for q in self._queues:
+            self._put_nowait(q, exception)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._serial.fileno(), OPENMV_PORT_ASYNC_READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._loop.remove_reader(self._serial.fileno())
+            self._fail(e)
+            return
+        if not data:
+            # a readable port with nothing to read was disconnected, and
+            # would otherwise wake the loop up again straight away
+            self._loop.remove_reader(self._serial.fileno())
+            self._fail(serial.SerialException('Camera was disconnected'))
+            return
+        if self._verbose:
+            print(data)
+        self._decoder.feed(data)
+        for frame in self._decoder.frames():
+            self._publish_frame(frame)
+
+    def _publish_frame(self, data):
+        for fut in self._waiters:
+            if not fut.done():
+                fut.set_result(data)
+        self._waiters = []
+        for q in self._queues:
+            self._put_nowait(q, data)
+
+    def _put_nowait(self, q, item):
+        # slow consumers only ever lose their oldest frames
+        if q.full():
+            q.get_nowait()
+        q.put_nowait(item)
+
+    async def _next_frame(self):
+        if self._error:
+            raise self._error
+        fut = self._loop.create_future()
+        self._waiters.append(fut)
+        try:
+            return await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError('Camera returned no data')
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+
+    async def read_json(self, retries=OPENMV_PORT_DEFAULT_RETRIES):
+        # make sure the port is open
+        if not self.is_open:
+            await self.open()
+        # previously sent lines were already consumed by the reader
+        # callback, so the next frame is always a fresh one
+        while True:
+            try:
+                return await self._next_frame()
+            except RuntimeError:
+                if retries <= 0 or self._error:
+                    raise
+                if self._verbose:
+                    print('OpenMV retrying read:', retries)
+                retries -= 1
+
+    async def frames(self, max_queued=OPENMV_PORT_ASYNC_FRAME_QUEUE_SIZE):
+        if not self.is_open:
+            await self.open()
+        q = asyncio.Queue(maxsize=max_queued)
+        self._queues.add(q)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(q.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    raise RuntimeError('Camera returned no data')
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self._queues.discard(q)
@@ -0,0 +1,203 @@
+import binascii
+import json
+import struct
+
+
+# Binary frames sent by the OpenMV scripts once the host asks for them:
+#
+#   | sync (2) | type (1) | length (1) | payload (length) | crc16 (2) |
+#
+# The CRC is CRC-16/XMODEM (poly 0x1021, init 0) over type, length and
+# payload. Everything is little-endian. The encoders in
+# `tictactoe_openmv.py` and `basketball_openmv.py` must match this file.
+
+OPENMV_PROTOCOL_SYNC = b'\xa5\x5a'
+OPENMV_PROTOCOL_BINARY_REQUEST = b'\nBIN\n'
+OPENMV_PROTOCOL_JSON_REQUEST = b'\nJSON\n'
+# only send frames when the state changes, plus a periodic heartbeat
+OPENMV_PROTOCOL_EVENTS_REQUEST = b'\nEVENTS\n'
+OPENMV_PROTOCOL_FRAMES_REQUEST = b'\nFRAMES\n'
+OPENMV_PROTOCOL_MAX_LINE_LENGTH = 4096
+
+OPENMV_PROTOCOL_TYPE_TICTACTOE = 1
+OPENMV_PROTOCOL_TYPE_BALL = 2
+
+OPENMV_PROTOCOL_FLAG_EMPTY = 1 << 0
+OPENMV_PROTOCOL_FLAG_MOVING = 1 << 1
+OPENMV_PROTOCOL_FLAG_REGIONS = 1 << 2
+
+# the tic-tac-toe payload's bitmap has room for a 4x4 board
+OPENMV_PROTOCOL_MAX_REGIONS = 16
+OPENMV_PROTOCOL_POSITION_SCALE = 10000
+
+_header = struct.Struct('<2sBB')
+_crc = struct.Struct('<H')
+# flags, number of regions, then a bit per region
+_tictactoe_payload = struct.Struct('<BBH')
+_ball_payload = struct.Struct('<BHH')
+# optional frame sequence number and camera `utime.ticks_ms()` at capture,
+# appended after the payload of any frame type
+_stamp = struct.Struct('<II')
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0)
+
+
+def _decode_stamp(data, buf, offset, length, payload_size):
+    if length >= payload_size + _stamp.size:
+        data['seq'], data['time'] = _stamp.unpack_from(
+            buf, offset + payload_size)
+    return data
+
+
+def _decode_tictactoe(buf, offset, length):
+    flags, num_regions, bitmap = _tictactoe_payload.unpack_from(buf, offset)
+    regions = []
+    if flags & OPENMV_PROTOCOL_FLAG_REGIONS:
+        regions = [bool(bitmap & (1 << i)) for i in range(num_regions)]
+    data = {
+        'empty': bool(flags & OPENMV_PROTOCOL_FLAG_EMPTY),
+        'moving': bool(flags & OPENMV_PROTOCOL_FLAG_MOVING),
+        'regions': regions
+    }
+    return _decode_stamp(data, buf, offset, length, _tictactoe_payload.size)
+
+
+def _decode_ball(buf, offset, length):
+    flags, x, y = _ball_payload.unpack_from(buf, offset)
+    data = {
+        'empty': bool(flags & OPENMV_PROTOCOL_FLAG_EMPTY),
+        'position': {
+            'x': x / OPENMV_PROTOCOL_POSITION_SCALE,
+            'y': y / OPENMV_PROTOCOL_POSITION_SCALE
+        },
+        'moving': bool(flags & OPENMV_PROTOCOL_FLAG_MOVING)
+    }
+    return _decode_stamp(data, buf, offset, length, _ball_payload.size)
+
+
+_payload_decoders = {
+    OPENMV_PROTOCOL_TYPE_TICTACTOE: (_tictactoe_payload.size, _decode_tictactoe),
+    OPENMV_PROTOCOL_TYPE_BALL: (_ball_payload.size, _decode_ball)
+}
+
+
+def encode_stamp(data):
+    if 'seq' not in data or 'time' not in data:
+        return b''
+    return _stamp.pack(data['seq'], data['time'])
+
+
+def encode_frame(frame_type, payload):
+    body = bytes([frame_type, len(payload)]) + payload
+    return OPENMV_PROTOCOL_SYNC + body + _crc.pack(crc16(body))
+
+
+def encode_tictactoe(data):
+    flags = 0
+    if data['empty']:
+        flags |= OPENMV_PROTOCOL_FLAG_EMPTY
+    if data['moving']:
+        flags |= OPENMV_PROTOCOL_FLAG_MOVING
+    regions = data['regions'] or []
+    if len(regions) > OPENMV_PROTOCOL_MAX_REGIONS:
+        raise ValueError('Binary frames only fit {0} regions, got {1}'.format(
+            OPENMV_PROTOCOL_MAX_REGIONS, len(regions)))
+    bitmap = 0
+    if regions:
+        flags |= OPENMV_PROTOCOL_FLAG_REGIONS
+        for i, filled in enumerate(regions):
+            if filled:
+                bitmap |= 1 << i
+    payload = _tictactoe_payload.pack(flags, len(regions), bitmap)
+    payload += encode_stamp(data)
+    return encode_frame(OPENMV_PROTOCOL_TYPE_TICTACTOE, payload)
+
+
+def encode_ball(data):
+    flags = 0
+    if data['empty']:
+        flags |= OPENMV_PROTOCOL_FLAG_EMPTY
+    if data['moving']:
+        flags |= OPENMV_PROTOCOL_FLAG_MOVING
+    payload = _ball_payload.pack(
+        flags,
+        int(round(data['position']['x'] * OPENMV_PROTOCOL_POSITION_SCALE)),
+        int(round(data['position']['y'] * OPENMV_PROTOCOL_POSITION_SCALE)))
+    payload += encode_stamp(data)
+    return encode_frame(OPENMV_PROTOCOL_TYPE_BALL, payload)
+
+
+class FrameDecoder(object):
+    # accepts a byte stream holding both JSON lines and binary frames,
+    # so the host keeps working while the camera switches protocols
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.crc_errors = 0
+
+    def clear(self):
+        self._buffer.clear()
+
+    def feed(self, data):
+        self._buffer += data
+
+    def frames(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def next_frame(self):
+        buf = self._buffer
+        while buf:
+            sync_idx = buf.find(OPENMV_PROTOCOL_SYNC)
+            line_idx = buf.find(b'\n', 0, sync_idx if sync_idx >= 0 else len(buf))
+            if line_idx >= 0:
+                # a full JSON line comes before the next binary frame
+                try:
+                    data = json.loads(buf[:line_idx + 1])
+                except ValueError:
+                    data = None
+                del buf[:line_idx + 1]
+                if data is not None:
+                    return data
+                continue
+            if sync_idx < 0:
+                # maybe a partial JSON line, or a partial sync header
+                if len(buf) > OPENMV_PROTOCOL_MAX_LINE_LENGTH:
+                    del buf[:-1]
+                return None
+            if sync_idx > 0:
+                del buf[:sync_idx]
+            frame = self._decode_binary()
+            if frame is not False:
+                return frame
+        return None
+
+    def _decode_binary(self):
+        # returns the decoded frame, None if more data is needed, or
+        # False after dropping the sync bytes of an invalid frame
+        buf = self._buffer
+        if len(buf) < _header.size:
+            return None
+        _, frame_type, length = _header.unpack_from(buf)
+        total = _header.size + length + _crc.size
+        if len(buf) < total:
+            return None
+        with memoryview(buf) as view:
+            with view[len(OPENMV_PROTOCOL_SYNC):_header.size + length] as body:
+                crc_ok = crc16(body) == _crc.unpack_from(buf, total - _crc.size)[0]
+        decoder = _payload_decoders.get(frame_type)
+        if not crc_ok or not decoder or length < decoder[0]:
+            self.crc_errors += 1
+            frame = False
+        else:
+            frame = decoder[1](buf, _header.size, length)
+        if frame is False:
+            del buf[:len(OPENMV_PROTOCOL_SYNC)]
+        else:
+            del buf[:total]
+        return frame
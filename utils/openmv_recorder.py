@@ -0,0 +1,52 @@
+import json
+import threading
+import time
+
+
+# Recordings are text files, one received frame per line:
+#
+#   <seconds since recording started>\t<frame as JSON>
+#
+# so they can be read, trimmed and edited by hand. Lines dropped by the
+# drain loop in `OpenMVPort.read_json()` are stamped when they are drained,
+# so record with `stream=True` to keep the camera's real frame timing.
+
+
+class OpenMVRecorder(object):
+    def __init__(self, path, mode='w'):
+        self.path = path
+        self._file = open(path, mode)
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def write_line(self, line):
+        if isinstance(line, (bytes, bytearray)):
+            line = line.decode('utf-8', 'replace')
+        line = line.strip()
+        if not line:
+            return
+        elapsed = time.monotonic() - self._start
+        with self._lock:
+            self._file.write('{0:.6f}\t{1}\n'.format(elapsed, line))
+            self._file.flush()
+
+    def write_frame(self, data):
+        self.write_line(json.dumps(data))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_recording(path):
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            timestamp, _, text = line.partition('\t')
+            try:
+                frames.append((float(timestamp), json.loads(text)))
+            except ValueError:
+                continue # the camera sent a corrupted line
+    return frames
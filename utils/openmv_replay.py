@@ -0,0 +1,163 @@
+import bisect
+import copy
+import time
+
+from .openmv_port import OPENMV_PORT_DEFAULT_RETRIES
+from .openmv_port import OPENMV_PORT_DEFAULT_TIMEOUT_SEC
+from .openmv_recorder import load_recording
+
+
+class OpenMVReplayPort(object):
+    # drop-in stand-in for `OpenMVPort`, that plays back a recording
+    #   speed=1.0 plays in real time, speed=N plays N times faster,
+    #   speed=None returns every recorded frame as fast as possible
+
+    def __init__(self, path=None, **kwargs):
+        self._frames = kwargs.get('frames') or load_recording(path)
+        if not self._frames:
+            raise RuntimeError('Recording has no frames: {0}'.format(path))
+        self._times = [t for t, _ in self._frames]
+        self._speed = kwargs.get('speed', 1.0)
+        self._loop = kwargs.get('loop', False)
+        self._stream = kwargs.get('stream', False)
+        self._verbose = kwargs.get('verbose', False)
+        self.port = path
+        self.timeout = kwargs.get('timeout', OPENMV_PORT_DEFAULT_TIMEOUT_SEC)
+        self.is_open = False
+        self._start = None
+        self._index = 0
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def rewind(self):
+        self._start = None
+        self._index = 0
+
+    @property
+    def frame_id(self):
+        # number of frames that have arrived since playback started
+        if not self._speed:
+            return self._index
+        return bisect.bisect_right(self._times, self._log_time())
+
+    @property
+    def duration(self):
+        return self._times[-1] - self._times[0]
+
+    @property
+    def _loop_period(self):
+        # pad one frame period, so the last and first frames don't overlap
+        return self.duration + (self.duration / len(self._times))
+
+    def _log_time(self, host_time=None):
+        # position of playback inside the recording, in recorded seconds
+        if self._start is None:
+            self._start = time.monotonic()
+        if host_time is None:
+            host_time = time.monotonic()
+        elapsed = (host_time - self._start) * self._speed
+        if self._loop and self._loop_period:
+            elapsed = elapsed % self._loop_period
+        return self._times[0] + elapsed
+
+    def _host_time(self, idx):
+        # when the frame at `idx` arrives, in host time.monotonic()
+        elapsed = self._times[idx] - self._times[0]
+        if self._loop and self._loop_period:
+            played = (time.monotonic() - self._start) * self._speed
+            elapsed += (played // self._loop_period) * self._loop_period
+        return self._start + (elapsed / self._speed)
+
+    def _read_next(self):
+        if self._index >= len(self._frames):
+            if not self._loop:
+                raise RuntimeError('Camera returned no data')
+            self._index = 0
+        data = self._frames[self._index][1]
+        self._index += 1
+        return data
+
+    def _wait_for_index(self, idx):
+        # sleep until the frame at `idx` would have arrived from the camera
+        wait = (self._times[idx] - self._log_time()) / self._speed
+        if self.timeout is not None and wait > self.timeout:
+            time.sleep(self.timeout)
+            raise RuntimeError('Camera returned no data')
+        if wait > 0:
+            time.sleep(wait)
+
+    def _read_realtime(self, newer_than, captured_after):
+        now = self._log_time()
+        idx = bisect.bisect_right(self._times, now)
+        if self._stream and idx > 0:
+            # the newest frame that has already arrived
+            idx -= 1
+        if newer_than is not None and idx < newer_than:
+            idx = newer_than
+        if captured_after is not None:
+            idx = max(idx, bisect.bisect_left(
+                self._times, self._log_time(captured_after)))
+        if idx >= len(self._frames):
+            if not self._loop:
+                raise RuntimeError('Camera returned no data')
+            # wait for playback to wrap around to the first frame
+            wrap = self._times[0] + self._loop_period - self._log_time()
+            time.sleep(max(wrap, 0) / self._speed)
+            idx = 0
+        self._wait_for_index(idx)
+        self._index = idx + 1
+        data = copy.deepcopy(self._frames[idx][1])
+        data['capture_time'] = self._host_time(idx)
+        return data
+
+    def _read_fast(self, newer_than, captured_after):
+        # skip the frames up to the `newer_than` frame_id, like a camera
+        # that kept sending while the caller was busy
+        if newer_than is not None and self._index < newer_than:
+            if newer_than >= len(self._frames) and not self._loop:
+                raise RuntimeError('Camera returned no data')
+            self._index = newer_than % len(self._frames)
+        # frames arrive as they're read, so one captured after
+        # `captured_after` is the first one read once it has passed
+        if captured_after is not None:
+            wait = captured_after - time.monotonic()
+            if self.timeout is not None and wait > self.timeout:
+                time.sleep(self.timeout)
+                raise RuntimeError('Camera returned no new enough data')
+            if wait > 0:
+                time.sleep(wait)
+        # copy, so callers can edit their frame like with a real camera
+        data = copy.deepcopy(self._read_next())
+        data['capture_time'] = time.monotonic()
+        return data
+
+    def read_json(self, retries=OPENMV_PORT_DEFAULT_RETRIES, newer_than=None,
+                  captured_after=None):
+        if not self.is_open:
+            self.open()
+        if self._speed:
+            data = self._read_realtime(newer_than, captured_after)
+        else:
+            data = self._read_fast(newer_than, captured_after)
+        if self._verbose:
+            print(data)
+        return data
+
+    def wait_for(self, predicate, timeout=None, captured_after=None,
+                 retries=OPENMV_PORT_DEFAULT_RETRIES):
+        # same as `OpenMVPort.wait_for()`, testing every recorded frame
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        newer_than = None
+        while deadline is None or time.monotonic() < deadline:
+            data = self.read_json(
+                newer_than=newer_than, captured_after=captured_after)
+            if predicate(data):
+                return data
+            newer_than = self._index
+        return None
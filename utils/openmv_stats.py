@@ -0,0 +1,165 @@
+import bisect
+import threading
+import time
+
+
+# bucket upper edges in seconds, from 10us up to 10sec
+OPENMV_STATS_DEFAULT_BUCKETS = [
+    0.00001, 0.00002, 0.00005,
+    0.0001, 0.0002, 0.0005,
+    0.001, 0.002, 0.005,
+    0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5,
+    1.0, 2.0, 5.0,
+    10.0
+]
+
+OPENMV_STATS_COUNTERS = (
+    'frames',            # decoded frames returned from the port
+    'bytes_received',    # bytes read while looking for a frame
+    'lines_discarded',   # stale lines (or binary frames) dropped by draining
+    'bytes_discarded',   # stale bytes dropped by draining
+    'decode_errors',     # corrupted lines that failed to parse
+    'stale_frames',      # frames skipped for being captured too early
+    'retries',           # times `read_json()` tried again
+    'timeouts',          # reads that returned no data before the timeout
+    'opens',
+    'closes'
+)
+
+OPENMV_STATS_TIMERS = (
+    'read_wait',         # waiting on the port for the next line/frame
+    'decode',            # parsing JSON, or decoding binary frames
+    'drain',             # dropping previously sent data
+    'open',
+    'close',
+    'read_json'          # the whole `read_json()` call, including retries
+)
+
+
+class Histogram(object):
+    def __init__(self, buckets=OPENMV_STATS_DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.reset()
+
+    def reset(self):
+        # the final count is for values larger than the largest bucket
+        self.counts = [0 for i in range(len(self.buckets) + 1)]
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, perc):
+        # upper edge of the bucket holding the percentile, capped by max
+        if not self.count:
+            return None
+        target = perc * self.count
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if running >= target and c:
+                if i >= len(self.buckets):
+                    return self.max
+                return min(self.buckets[i], self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95)
+        }
+
+
+class OpenMVPortStats(object):
+    def __init__(self, dump_interval=None, printer=print):
+        self._lock = threading.Lock()
+        self._dump_interval = dump_interval
+        self._printer = printer
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {name: 0 for name in OPENMV_STATS_COUNTERS}
+            self.timers = {name: Histogram() for name in OPENMV_STATS_TIMERS}
+            self._last_dump = time.monotonic()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            if name not in self.timers:
+                self.timers[name] = Histogram()
+            self.timers[name].add(seconds)
+
+    def timer(self, name):
+        return _StatsTimer(self, name)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': {n: h.as_dict() for n, h in self.timers.items()}
+            }
+
+    def format(self):
+        data = self.as_dict()
+        lines = ['OpenMV stats:']
+        for name, value in data['counters'].items():
+            lines.append('  {0:<16} {1}'.format(name, value))
+        for name, t in data['timers'].items():
+            if not t['count']:
+                continue
+            lines.append(
+                '  {0:<16} n={1} total={2:.3f}s mean={3:.2f}ms '
+                'p50={4:.2f}ms p95={5:.2f}ms max={6:.2f}ms'.format(
+                    name, t['count'], t['total'], t['mean'] * 1000,
+                    t['p50'] * 1000, t['p95'] * 1000, t['max'] * 1000))
+        return '\n'.join(lines)
+
+    def maybe_dump(self):
+        # print the stats every `dump_interval` seconds, if enabled
+        if not self._dump_interval:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_dump < self._dump_interval:
+                return
+            self._last_dump = now
+        self._printer(self.format())
+
+
+class _StatsTimer(object):
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._stats.add_time(self._name, time.perf_counter() - self._start)
@@ -0,0 +1,125 @@
+import collections
+import os
+import pty
+import re
+import threading
+import time
+import tty
+
+
+UARM_LOOPBACK_DEFAULT_BUFFER_SIZE = 4
+UARM_LOOPBACK_DEFAULT_COMMAND_TIME_SEC = 0.01
+
+_command_regex = re.compile(r'^#(\d+)\s+(.*)$')
+
+
+class UArmLoopback(object):
+    # Pretends to be the uArm's firmware on a pseudo-terminal, for testing
+    # `UArmMotionQueue` (or anything else talking to the arm) without one.
+    # Commands are acknowledged with "$<id> ok" once they fit in the
+    # firmware's buffer, and each one takes `command_time` seconds to run.
+    # While the buffer is full nothing more is read or acknowledged, just
+    # like the real firmware. Replies arrive `reply_delay` seconds after
+    # being sent, to act like the latency of the USB link.
+
+    def __init__(self, buffer_size=UARM_LOOPBACK_DEFAULT_BUFFER_SIZE,
+                 command_time=UARM_LOOPBACK_DEFAULT_COMMAND_TIME_SEC,
+                 reply_delay=0, fail_on=None, verbose=False):
+        self.buffer_size = buffer_size
+        self.command_time = command_time
+        self.reply_delay = reply_delay
+        # commands matching this regex are replied to with an error
+        self._fail_regex = re.compile(fail_on) if fail_on else None
+        self._verbose = verbose
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.commands = []
+        self.max_buffered = 0
+        self._buffer = collections.deque()
+        self._replies = collections.deque()
+        self._replies_cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._loop, name='UArmLoopback', daemon=True)
+        self._thread.start()
+        self._reply_thread = threading.Thread(
+            target=self._reply_loop, name='UArmLoopbackReplies', daemon=True)
+        self._reply_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._stop.set()
+        # wake up both threads, then close both ends
+        os.write(self._slave, b'\n')
+        self._thread.join()
+        with self._replies_cond:
+            self._replies_cond.notify_all()
+        self._reply_thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _run_buffer(self, now):
+        # drop commands from the buffer once they've finished running
+        while self._buffer and self._buffer[0] <= now:
+            self._buffer.popleft()
+
+    def _handle(self, line):
+        match = _command_regex.match(line)
+        if not match:
+            return
+        cmd_id, command = match.group(1), match.group(2)
+        now = time.monotonic()
+        self._run_buffer(now)
+        if len(self._buffer) >= self.buffer_size:
+            # wait for the oldest command to finish, to make room
+            time.sleep(max(self._buffer[0] - now, 0))
+            now = time.monotonic()
+            self._run_buffer(now)
+        start = self._buffer[-1] if self._buffer else now
+        self._buffer.append(max(start, now) + self.command_time)
+        self.max_buffered = max(self.max_buffered, len(self._buffer))
+        self.commands.append(command)
+        reply = 'ok'
+        if self._fail_regex and self._fail_regex.search(command):
+            reply = 'E22'
+        if self._verbose:
+            print('loopback', line, '->', reply)
+        with self._replies_cond:
+            self._replies.append((
+                time.monotonic() + self.reply_delay,
+                '${0} {1}\n'.format(cmd_id, reply).encode()))
+            self._replies_cond.notify_all()
+
+    def _reply_loop(self):
+        while not self._stop.is_set():
+            with self._replies_cond:
+                if not self._replies:
+                    self._replies_cond.wait()
+                    continue
+                send_time, data = self._replies[0]
+                wait = send_time - time.monotonic()
+                if wait > 0:
+                    self._replies_cond.wait(wait)
+                    continue
+                self._replies.popleft()
+            os.write(self._master, data)
+
+    def _loop(self):
+        data = b''
+        while not self._stop.is_set():
+            try:
+                chunk = os.read(self._master, 1024)
+            except OSError:
+                return
+            data += chunk
+            while b'\n' in data:
+                line, data = data.split(b'\n', 1)
+                if self._stop.is_set():
+                    return
+                self._handle(line.decode().strip())
@@ -0,0 +1,264 @@
+import collections
+import re
+import threading
+import time
+
+import serial
+
+from .openmv_stats import Histogram
+
+
+UARM_QUEUE_DEFAULT_BAUDRATE = 115200
+UARM_QUEUE_DEFAULT_IN_FLIGHT = 4
+UARM_QUEUE_DEFAULT_TIMEOUT_SEC = 5
+UARM_QUEUE_READ_TIMEOUT_SEC = 0.1
+
+# replies look like "$12 ok" or "$12 E22", for the command sent as "#12 ..."
+_reply_regex = re.compile(r'^\$(\d+)\s+(\S+)(.*)$')
+
+
+def is_ok_reply(reply):
+    # replies from the wrapper's `send_cmd_async()` callback, which might be
+    # the reply's text or a list of its words
+    if isinstance(reply, (list, tuple)):
+        reply = reply[0] if reply else ''
+    if isinstance(reply, bytes):
+        reply = reply.decode('utf-8', errors='replace')
+    return str(reply).strip().lower().startswith('ok')
+
+
+class UArmMotionQueue(object):
+    # Streams motion commands to the uArm's firmware, keeping up to
+    # `in_flight` commands in its buffer instead of waiting for each one to
+    # be acknowledged before sending the next.
+    #
+    # Commands go out through the uArm wrapper's own connection (its
+    # `send_cmd_async()`, which numbers them and calls back with the reply),
+    # so they stay in order with anything else the wrapper sends, and only
+    # the wrapper reads from the port.
+    #
+    # enqueue()          - add a command, flushing once `in_flight` are waiting
+    # flush()            - send every waiting command, blocking while the
+    #                      firmware's buffer is full (back-pressure)
+    # drain()            - flush, then block until every command is acknowledged
+    # wait_for_arrival() - drain, then wait for the arm to finish moving
+
+    def __init__(self, bot, in_flight=UARM_QUEUE_DEFAULT_IN_FLIGHT,
+                 timeout=UARM_QUEUE_DEFAULT_TIMEOUT_SEC, verbose=False,
+                 feed_per_speed=None):
+        if in_flight < 1:
+            raise ValueError('Need at least 1 command in flight')
+        # a connected uArm wrapper, or anything else with its
+        # `send_cmd_async(msg, callback=...)`, like a `UArmCommandPort`
+        self._bot = bot
+        self.in_flight = in_flight
+        self.timeout = timeout
+        self._verbose = verbose
+        # speeds are in the units of the wrapper's `bot.speed()`, and how
+        # those become the firmware's feed rate (F) is up to the wrapper, so
+        # by default they're set with `bot.speed()`; with `feed_per_speed`
+        # moves carry their own F = speed * feed_per_speed instead
+        self.feed_per_speed = feed_per_speed
+        self._cond = threading.Condition()
+        # keeps commands in order when they're sent from several threads
+        self._send_lock = threading.Lock()
+        self._waiting = collections.deque()
+        self._sent = collections.OrderedDict()
+        self._next_id = 1
+        self._error = None
+        # the last absolute position sent, for relative moves
+        self.position = None
+        self.counters = {
+            'sent': 0, 'acked': 0, 'full_waits': 0, 'max_in_flight': 0,
+            'out_of_order': 0
+        }
+        self.ack_times = Histogram()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.drain()
+
+    @property
+    def num_in_flight(self):
+        with self._cond:
+            return len(self._sent)
+
+    @property
+    def num_waiting(self):
+        with self._cond:
+            return len(self._waiting)
+
+    def _on_reply(self, cmd_id, reply):
+        with self._cond:
+            if cmd_id not in self._sent:
+                return
+            if next(iter(self._sent)) != cmd_id:
+                # the firmware runs its buffer in order
+                self.counters['out_of_order'] += 1
+            command, sent_time = self._sent.pop(cmd_id)
+            self.counters['acked'] += 1
+            self.ack_times.add(time.monotonic() - sent_time)
+            if self._verbose:
+                print('uArm <-', cmd_id, reply)
+            if not is_ok_reply(reply):
+                self._error = RuntimeError(
+                    'uArm command "{0}" failed: {1}'.format(command, reply))
+            self._cond.notify_all()
+
+    def _check_error(self):
+        if self._error:
+            error = self._error
+            self._error = None
+            raise error
+
+    def _wait(self, is_done):
+        # wait (with the lock held) until `is_done()`, raising if no
+        # commands are acknowledged for `timeout` seconds
+        last_acked = self.counters['acked']
+        deadline = time.monotonic() + self.timeout
+        while not is_done():
+            self._check_error()
+            if self.counters['acked'] != last_acked:
+                last_acked = self.counters['acked']
+                deadline = time.monotonic() + self.timeout
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(
+                    'uArm did not acknowledge commands: {0}'.format(
+                        list(self._sent.values())))
+            self._cond.wait(remaining)
+        self._check_error()
+
+    def enqueue(self, command):
+        # returns the queue's id for the command
+        with self._cond:
+            self._check_error()
+            cmd_id = self._next_id
+            self._next_id += 1
+            self._waiting.append((cmd_id, command))
+            full = len(self._waiting) >= self.in_flight
+        if full:
+            self.flush()
+        return cmd_id
+
+    def flush(self):
+        with self._send_lock:
+            while True:
+                with self._cond:
+                    if not self._waiting:
+                        return
+                    if len(self._sent) >= self.in_flight:
+                        self.counters['full_waits'] += 1
+                        self._wait(lambda: len(self._sent) < self.in_flight)
+                    cmd_id, command = self._waiting.popleft()
+                    self._sent[cmd_id] = (command, time.monotonic())
+                    self.counters['sent'] += 1
+                    self.counters['max_in_flight'] = max(
+                        self.counters['max_in_flight'], len(self._sent))
+                if self._verbose:
+                    print('uArm ->', cmd_id, command)
+                # sent without holding `_cond`, since the wrapper's thread
+                # needs it to hand over replies
+                self._bot.send_cmd_async(
+                    command,
+                    callback=lambda reply, i=cmd_id: self._on_reply(i, reply))
+
+    def drain(self):
+        self.flush()
+        with self._cond:
+            self._wait(lambda: not self._sent)
+
+    def wait_for_arrival(self):
+        # acknowledgements only mean the firmware has buffered the moves, so
+        # wait for the arm to finish them, then read where it ended up
+        self.drain()
+        self._bot.wait_for_arrival()
+        self._bot.update_position()
+        self.position = dict(self._bot.position)
+
+    def _format_move(self, gcode, pos, speed):
+        command = gcode
+        for ax in 'xyz':
+            if pos.get(ax) is not None:
+                command += ' {0}{1:.2f}'.format(ax.upper(), pos[ax])
+        if speed and self.feed_per_speed:
+            command += ' F{0:.0f}'.format(speed * self.feed_per_speed)
+        elif speed:
+            # the wrapper sends it, after the moves queued before this one
+            self.flush()
+            self._bot.speed(speed)
+        return command
+
+    def move_to(self, x=None, y=None, z=None, speed=None):
+        # `speed` is in `bot.speed()` units, or None to keep the last speed
+        pos = {'x': x, 'y': y, 'z': z}
+        if self.position is not None:
+            for ax in 'xyz':
+                if pos[ax] is None:
+                    pos[ax] = self.position[ax]
+            self.position = pos
+        elif None not in pos.values():
+            self.position = pos
+        return self.enqueue(self._format_move('G0', pos, speed))
+
+    def move_relative(self, x=None, y=None, z=None, speed=None):
+        pos = {'x': x, 'y': y, 'z': z}
+        if self.position is not None:
+            for ax in 'xyz':
+                if pos[ax] is not None:
+                    self.position[ax] += pos[ax]
+        return self.enqueue(self._format_move('G2204', pos, speed))
+
+
+class UArmCommandPort(object):
+    # Sends numbered commands ("#12 G0 ...") on a serial port and calls back
+    # with each "$12 ok" reply, the same as the wrapper's `send_cmd_async()`.
+    # Only for a port nothing else is reading, like a `UArmLoopback`'s; with
+    # a connected arm, give the queue the wrapper itself.
+
+    def __init__(self, port, baudrate=UARM_QUEUE_DEFAULT_BAUDRATE):
+        self._serial = serial.Serial(
+            port=port, baudrate=baudrate, timeout=UARM_QUEUE_READ_TIMEOUT_SEC)
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_id = 1
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._read_loop, name='UArmCommandPort', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._serial.close()
+
+    def send_cmd_async(self, msg, callback=None):
+        with self._lock:
+            cmd_id = self._next_id
+            self._next_id += 1
+            if callback:
+                self._callbacks[cmd_id] = callback
+        self._serial.write('#{0} {1}\n'.format(cmd_id, msg).encode())
+        return cmd_id
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            try:
+                line = self._serial.readline()
+            except (OSError, serial.SerialException):
+                return
+            match = _reply_regex.match(line.decode('utf-8', 'replace').strip())
+            if not match:
+                continue # position reports, etc.
+            with self._lock:
+                callback = self._callbacks.pop(int(match.group(1)), None)
+            if callback:
+                callback(match.group(2))